@@ -0,0 +1,79 @@
+"""CPU benchmark of the NLSMBDerivatives modes.
+
+Times one ``derivatives(x, y)`` call plus the backward pass of a loss built
+from its outputs, i.e. the part of a training step that the mode changes, for
+the [128]*6 FNN and the 5x[16]*6 PFNN of the forward scripts:
+
+    python benchmarks/derivative_modes.py --points 20000 --repeat 5
+
+The printed deviation is the largest difference from the ``"reverse"``
+(``dde.grad``) derivatives.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("DDEBACKEND", "pytorch")
+import deepxde as dde
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from nlsmb import NLSMBDerivatives
+
+NETS = {
+    "FNN [128]*6": lambda: dde.nn.FNN([2] + [128] * 6 + [5], "tanh", "Glorot normal"),
+    "PFNN 5x[16]*6": lambda: dde.nn.PFNN(
+        [2] + [[16] * 5] * 6 + [5], "tanh", "Glorot normal"
+    ),
+}
+
+
+def step(net, derivatives, x):
+    net.zero_grad()
+    y = net(x)
+    y_z, y_t, E_ss = derivatives(x, y)
+    # A loss that depends on all the derivatives, like the residual
+    loss = (y_z**2).mean() + (y_t**2).mean() + (E_ss**2).mean()
+    loss.backward()
+    return y_z, y_t, E_ss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--second", type=int, default=1, choices=(0, 1))
+    parser.add_argument("--modes", nargs="+", default=list(NLSMBDerivatives.modes))
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    print(
+        f"{args.points} points, torch {torch.__version__}, "
+        f"{torch.get_num_threads()} threads"
+    )
+    print(
+        f"{'network':<16}{'mode':<10}{'best (s)':>10}{'mean (s)':>10}{'deviation':>12}"
+    )
+    for name, make in NETS.items():
+        net = make()
+        x = torch.rand(args.points, 2, requires_grad=True)
+        reference = step(net, NLSMBDerivatives(net, args.second, "reverse"), x)
+        for mode in args.modes:
+            derivatives = NLSMBDerivatives(net, args.second, mode)
+            out = step(net, derivatives, x)  # Warm-up
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                step(net, derivatives, x)
+                times.append(time.perf_counter() - start)
+            deviation = max((a - b).abs().max().item() for a, b in zip(out, reference))
+            print(
+                f"{name:<16}{mode:<10}{min(times):>10.3f}"
+                f"{sum(times) / len(times):>10.3f}{deviation:>12.1e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
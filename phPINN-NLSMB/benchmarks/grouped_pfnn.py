@@ -0,0 +1,120 @@
+"""CPU benchmark of a PFNN with stacked sub-network weights against dde.nn.PFNN.
+
+``dde.nn.PFNN([2] + [[16] * 5] * 6 + [5])`` runs its five sub-networks one
+after the other, 30 small matmuls and as many activations per forward pass.
+``StackedPFNN`` below keeps the weights of each parallel layer stacked as
+``(groups, in, out)`` parameters and runs the layer as one batched matmul, one
+bias add and one activation.  Both networks get the same weights.  Times the
+forward pass, forward plus backward, and the residual derivatives plus
+backward in the NLSMBDerivatives modes that work for any network:
+
+    python benchmarks/grouped_pfnn.py --points 200 2000 20000 --repeat 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("DDEBACKEND", "pytorch")
+import deepxde as dde
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from nlsmb import NLSMBDerivatives
+
+LAYERS = [2] + [[16] * 5] * 6 + [5]
+
+
+class StackedPFNN(dde.nn.NN):
+    """The parallel layers of ``pfnn`` as stacked ``(groups, in, out)`` weights."""
+
+    def __init__(self, pfnn):
+        super().__init__()
+        self.activation = pfnn.activation
+        self.weights = torch.nn.ParameterList()
+        self.biases = torch.nn.ParameterList()
+        for layer in pfnn.layers:
+            # Every layer of the benchmarked PFNN is parallel
+            weight = torch.stack([f.weight.detach().T for f in layer])
+            bias = torch.stack([f.bias.detach() for f in layer])[:, None]
+            self.weights.append(torch.nn.Parameter(weight.clone()))
+            self.biases.append(torch.nn.Parameter(bias.clone()))
+
+    def forward(self, inputs):
+        # The shared input (N, in) broadcasts against the groups
+        x = inputs
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            x = torch.baddbmm(bias, x.expand(len(weight), -1, -1), weight)
+            if i < len(self.weights) - 1:
+                x = self.activation(x)
+        x = x.transpose(0, 1).reshape(x.shape[1], -1)
+        if self._output_transform is not None:
+            x = self._output_transform(inputs, x)
+        return x
+
+
+def best(f, repeat):
+    f()  # Warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def passes(net, x, modes):
+    def forward():
+        with torch.no_grad():
+            net(x)
+
+    def backward():
+        net.zero_grad()
+        net(x).square().sum().backward()
+
+    def residual(mode):
+        derivatives = NLSMBDerivatives(net, mode=mode)
+
+        def run():
+            net.zero_grad()
+            xg = x.detach().requires_grad_(True)
+            sum(v.square().sum() for v in derivatives(xg, net(xg))).backward()
+
+        return run
+
+    return {
+        "forward": forward,
+        "forward+backward": backward,
+        **{f"residual {mode}": residual(mode) for mode in modes},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, nargs="+", default=[2000, 20000])
+    parser.add_argument("--repeat", type=int, default=5)
+    # The fused Taylor sweep only covers the deepxde networks
+    parser.add_argument("--modes", nargs="+", default=["jvp", "reverse"])
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    pfnn = dde.nn.PFNN(LAYERS, "tanh", "Glorot normal")
+    stacked = StackedPFNN(pfnn)
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads")
+    print(
+        f"{'points':>7}  {'pass':<20}{'PFNN (ms)':>10}{'stacked (ms)':>14}{'speedup':>9}"
+    )
+    for n in args.points:
+        x = torch.rand(n, 2)
+        with torch.no_grad():
+            deviation = (pfnn(x) - stacked(x)).abs().max().item()
+        timed = [passes(net, x, args.modes) for net in (pfnn, stacked)]
+        for name in timed[0]:
+            a, b = (best(t[name], args.repeat) for t in timed)
+            print(f"{n:>7}  {name:<20}{a * 1e3:>10.1f}{b * 1e3:>14.1f}{a / b:>8.2f}x")
+        print(f"{n:>7}  max output deviation {deviation:.1e}")
+
+
+if __name__ == "__main__":
+    main()
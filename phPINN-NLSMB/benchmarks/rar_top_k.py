@@ -0,0 +1,74 @@
+"""CPU benchmark of the RAR candidate search.
+
+Compares the one-shot search of the scripts, ``model.predict`` on all
+candidates followed by ``np.argsort``, with the block-wise ``residual_top_k``
+for the 5x[16]*6 PFNN and the fused derivatives.  Every measurement runs in a
+fresh process, whose peak resident memory is printed with the time:
+
+    python benchmarks/rar_top_k.py --points 100000 400000 --k 100
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+os.environ.setdefault("DDEBACKEND", "pytorch")
+import deepxde as dde
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from nlsmb import NLSMBDerivatives, residual_top_k
+
+
+def search(method, n, k, chunk_size):
+    dde.config.set_random_seed(0)
+    geomtime = dde.geometry.GeometryXTime(
+        dde.geometry.Interval(-5, 5), dde.geometry.TimeDomain(-5, 5)
+    )
+    data = dde.data.TimePDE(geomtime, None, [], num_domain=100, num_test=100)
+    net = dde.nn.PFNN([2] + [[16] * 5] * 6 + [5], "tanh", "Glorot normal")
+    derivatives = NLSMBDerivatives(net)
+
+    def pde(x, y):
+        y_z, y_t, _ = derivatives(x, y)
+        # Five components of the first derivatives, like the NLS-MB residual
+        return [y_t[:, i : i + 1] + y_z[:, i : i + 1] for i in range(5)]
+
+    model = dde.Model(data, net)
+    model.compile("adam", lr=0.001)
+    start = time.perf_counter()
+    if method == "one-shot":
+        XTrar = geomtime.random_points(n)
+        f = model.predict(XTrar, operator=pde)
+        err_eq = np.sum(np.absolute(np.array(f)), axis=0).flatten()
+        XTrar[np.argsort(err_eq)[-k:]]
+    else:
+        residual_top_k(
+            model, pde, geomtime.random_points, k, num_points=n, chunk_size=chunk_size
+        )
+    elapsed = time.perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, nargs="+", default=[100000, 400000])
+    parser.add_argument("--k", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=2**14)
+    parser.add_argument("--methods", nargs="+", default=["one-shot", "streaming"])
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'points':>9}  {'method':<11}{'time (s)':>10}{'peak RSS (MiB)':>16}")
+    for n in args.points:
+        for method in args.methods:
+            with context.Pool(1) as pool:
+                elapsed, rss = pool.apply(search, (method, n, args.k, args.chunk_size))
+            print(f"{n:>9}  {method:<11}{elapsed:>10.2f}{rss:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
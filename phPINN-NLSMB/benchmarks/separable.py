@@ -0,0 +1,85 @@
+"""CPU benchmark of SeparableNet against the networks of the forward scripts.
+
+Times the prediction on the ``nx * nt`` evaluation grid and the fused residual
+derivatives plus backward on ``train_distribution="uniform"`` collocation
+points (a tensor-product grid):
+
+    python benchmarks/separable.py --grid 512 --points 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("DDEBACKEND", "pytorch")
+import deepxde as dde
+import numpy as np
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from nlsmb import NLSMBDerivatives, SeparableNet
+
+NETS = {
+    "FNN [64]*6": lambda: dde.nn.FNN([2] + [64] * 6 + [5], "tanh", "Glorot normal"),
+    "PFNN 5x[16]*6": lambda: dde.nn.PFNN(
+        [2] + [[16] * 5] * 6 + [5], "tanh", "Glorot normal"
+    ),
+    "separable": lambda: SeparableNet([64] * 4, 5, 32, "tanh", "Glorot normal"),
+}
+
+
+def best(f, repeat):
+    f()  # Warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--grid", type=int, default=512)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    z = np.linspace(-5, 5, args.grid)
+    t = np.linspace(-5, 5, args.grid)
+    Z, T = np.meshgrid(z, t)
+    X_star = torch.as_tensor(np.hstack((Z.flatten()[:, None], T.flatten()[:, None])))
+    X_star = X_star.to(torch.get_default_dtype())
+    geomtime = dde.geometry.GeometryXTime(
+        dde.geometry.Interval(-5, 5), dde.geometry.TimeDomain(-5, 5)
+    )
+    x = torch.as_tensor(geomtime.uniform_points(args.points, boundary=False))
+    x = x.to(torch.get_default_dtype())
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads")
+    print(f"{args.grid}x{args.grid} grid prediction, {len(x)} grid collocation points")
+    print(f"{'network':<16}{'predict (ms)':>14}{'residual (ms)':>15}")
+    for name, make in NETS.items():
+        net = make()
+        if isinstance(net, SeparableNet):
+            predict = lambda: net.predict_grid(z, t)
+        else:
+
+            def predict():
+                with torch.no_grad():
+                    net(X_star)
+
+        derivatives = NLSMBDerivatives(net)
+
+        def residual():
+            net.zero_grad()
+            xg = x.detach().requires_grad_(True)
+            sum(v.square().sum() for v in derivatives(xg, net(xg))).backward()
+
+        a, b = best(predict, args.repeat), best(residual, args.repeat)
+        print(f"{name:<16}{a * 1e3:>14.1f}{b * 1e3:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
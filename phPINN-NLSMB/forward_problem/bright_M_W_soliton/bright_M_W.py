@@ -1,6 +1,7 @@
 """Backend supported: tensorflow.compat.v1, tensorflow, pytorch, paddle"""
 
 import os
+import sys
 import time
 
 os.environ["DDEBACKEND"] = "paddle"
@@ -16,6 +17,20 @@ import hydra
 import numpy as np
 from omegaconf import DictConfig
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from nlsmb import (
+    AnchorSet,
+    AsyncResampler,
+    MiniBatch,
+    NLSMBDerivatives,
+    ObservationBC,
+    collocation_batches,
+    exact_grid,
+    residual_top_k,
+    restore_model,
+    save_model,
+)
+
 if dde.backend.backend_name == "paddle":
     import paddle
 
@@ -42,6 +57,46 @@ else:
     concat = tf.concat
 
 
+z_lower = -1
+z_upper = 1
+t_lower = 0
+t_upper = 1
+nx = 512
+nt = 512
+
+
+def solution(XT):
+    x = XT[:, 0:1]
+    t = XT[:, 1:2]
+    Eu_true = 2 * cos(2 * t) / cosh(2 * t + 6 * x)
+    Ev_true = -2 * sin(2 * t) / cosh(2 * t + 6 * x)
+    pu_true = (
+        (exp(-2 * t - 6 * x) - exp(2 * t + 6 * x))
+        * cos(2 * t)
+        / cosh(2 * t + 6 * x) ** 2
+    )
+    pv_true = (
+        -(exp(-2 * t - 6 * x) - exp(2 * t + 6 * x))
+        * sin(2 * t)
+        / cosh(2 * t + 6 * x) ** 2
+    )
+    eta_true = (cosh(2 * t + 6 * x) ** 2 - 2) / cosh(2 * t + 6 * x) ** 2
+    return Eu_true, Ev_true, pu_true, pv_true, eta_true
+
+
+def fields(x, t):
+    X, T = np.meshgrid(x, t)
+    XT = np.hstack((X.flatten()[:, None], T.flatten()[:, None]))
+    Eu, Ev, pu, pv, eta = solution(XT)
+    return [Eu + 1j * Ev, pu + 1j * pv, eta]
+
+
+def load_grid(cfg=None):
+    """网格和精确解，缓存在 $NLSMB_CACHE_DIR 里；多进程扫参时它在 /dev/shm，
+    启动器在分派任务前调用一次，所有任务共享一份"""
+    return exact_grid("bright_M_W", fields, z_lower, z_upper, t_lower, t_upper, nx, nt)
+
+
 @hydra.main(version_base=None, config_path="./conf", config_name="亮MW.yaml")
 def main(cfg: DictConfig):
     start_time = time.time()
@@ -49,17 +104,6 @@ def main(cfg: DictConfig):
         dde.config.set_default_float("float64")
     folder_name = cfg.output_dir
     I = 1j
-    z_lower = -1
-    z_upper = 1
-    t_lower = 0
-    t_upper = 1
-    nx = 512
-    nt = 512
-    x = np.linspace(z_lower, z_upper, nx)[:, None]
-    t = np.linspace(t_lower, t_upper, nt)[:, None]
-    X, T = np.meshgrid(x, t)
-    X_star = np.hstack((X.flatten()[:, None], T.flatten()[:, None]))
-
     space_domain = dde.geometry.Interval(z_lower, z_upper)
     time_domain = dde.geometry.TimeDomain(t_lower, t_upper)
     geomtime = dde.geometry.GeometryXTime(space_domain, time_domain)
@@ -70,13 +114,15 @@ def main(cfg: DictConfig):
         pu = y[:, 2:3]
         pv = y[:, 3:4]
         eta = y[:, 4:5]
-        pu_t = dde.grad.jacobian(y, x, i=2, j=1)
-        pv_t = dde.grad.jacobian(y, x, i=3, j=1)
-        eta_t = dde.grad.jacobian(y, x, i=4, j=1)
-        Eu_z = dde.grad.jacobian(y, x, i=0, j=0)
-        Ev_z = dde.grad.jacobian(y, x, i=1, j=0)
-        Eu_tt = dde.grad.hessian(y, x, component=0, i=1, j=1)
-        Ev_tt = dde.grad.hessian(y, x, component=1, i=1, j=1)
+        # 所有一阶导和 E 的二阶导在一次前向展开里算出
+        y_z, y_t, E_tt = derivatives(x, y)
+        pu_t = y_t[:, 2:3]
+        pv_t = y_t[:, 3:4]
+        eta_t = y_t[:, 4:5]
+        Eu_z = y_z[:, 0:1]
+        Ev_z = y_z[:, 1:2]
+        Eu_tt = E_tt[:, 0:1]
+        Ev_tt = E_tt[:, 1:2]
         alpha_1 = 0.5
         alpha_2 = -1
         omega_0 = -1
@@ -87,25 +133,11 @@ def main(cfg: DictConfig):
         f3 = 2 * pv * Ev + 2 * pu * Eu + eta_t
         return [f1_u, f1_v, f2_u, f2_v, f3]
 
-    def solution(XT):
-        x = XT[:, 0:1]
-        t = XT[:, 1:2]
-        Eu_true = 2 * cos(2 * t) / cosh(2 * t + 6 * x)
-        Ev_true = -2 * sin(2 * t) / cosh(2 * t + 6 * x)
-        pu_true = (
-            (exp(-2 * t - 6 * x) - exp(2 * t + 6 * x))
-            * cos(2 * t)
-            / cosh(2 * t + 6 * x) ** 2
-        )
-        pv_true = (
-            -(exp(-2 * t - 6 * x) - exp(2 * t + 6 * x))
-            * sin(2 * t)
-            / cosh(2 * t + 6 * x) ** 2
-        )
-        eta_true = (cosh(2 * t + 6 * x) ** 2 - 2) / cosh(2 * t + 6 * x) ** 2
-        return Eu_true, Ev_true, pu_true, pv_true, eta_true
-
-    Eu_true, Ev_true, pu_true, pv_true, eta_true = solution(X_star)
+    grid = load_grid(cfg)
+    x = grid.x[:, None]
+    t = grid.t[:, None]
+    X, T = grid.X, grid.T
+    X_star = grid.X_star
 
     def output_transform(XT, y):
         Eu = y[:, 0:1]
@@ -163,29 +195,28 @@ def main(cfg: DictConfig):
     # idx = np.random.choice(X_star.shape[0], 10000, replace=False)
     # # X_u_train = X_star[idx, :]  # (2000,2)
     Eu_train, Ev_train, pu_train, pv_train, eta_train = solution(X_u_train)
-    observe_y = dde.icbc.PointSetBC(X_u_train, Eu_train, component=0)
-    observe_y1 = dde.icbc.PointSetBC(X_u_train, Ev_train, component=1)
-    observe_y2 = dde.icbc.PointSetBC(X_u_train, pu_train, component=2)
-    observe_y3 = dde.icbc.PointSetBC(X_u_train, pv_train, component=3)
-    observe_y4 = dde.icbc.PointSetBC(X_u_train, eta_train, component=4)
-    PFNN = False
+    # 五个分量在同一组观测点上，合成一个条件，观测点只进网络一次
+    observe_y = ObservationBC(
+        X_u_train, [Eu_train, Ev_train, pu_train, pv_train, eta_train]
+    )
+    PFNN = cfg.PFNN
     net = (
         dde.nn.PFNN(
-            [2] + [[16] * 5] * 6 + [5],
+            [2] + [[cfg.hidden_size // 4] * 5] * cfg.num_layers + [5],
             f"{cfg.activate}",
             "Glorot normal",
         )
         if PFNN
-        else dde.nn.FNN([2] + [64] * 6 + [5], f"{cfg.activate}", "Glorot normal")
+        else dde.nn.FNN(
+            [2] + [cfg.hidden_size] * cfg.num_layers + [5],
+            f"{cfg.activate}",
+            "Glorot normal",
+        )
     )
     hard_constraint = cfg.hard_constraint
     if hard_constraint:
         net.apply_output_transform(output_transform)
-    ic_bcs = (
-        []
-        if hard_constraint
-        else [observe_y, observe_y1, observe_y2, observe_y3, observe_y4]
-    )
+    ic_bcs = [] if hard_constraint else [observe_y]
     data = dde.data.TimePDE(
         geomtime,
         pde,
@@ -193,43 +224,65 @@ def main(cfg: DictConfig):
         num_domain=cfg.num_domain,
         solution=lambda XT: np.hstack((solution(XT))),
     )
+    derivatives = NLSMBDerivatives(net, mode=cfg.derivatives)
     model = dde.Model(data, net)
-    resampler = dde.callbacks.PDEPointResampler(period=5000)
-    loss_weights = [1, 1, 1, 1, 1] + np.full(len(ic_bcs), 100).tolist()
+    # 后台线程准备下一组配点，重采样时只交换数组
+    resampler = AsyncResampler(period=5000)
+    # 小批量训练：Adam 每步从配点池里取 batch_size 个点，池子每轮重新打乱；L-BFGS 仍是全批量
+    sampler = (
+        MiniBatch(
+            collocation_batches(
+                lambda: geomtime.random_points(cfg.pool_size), cfg.batch_size
+            )
+        )
+        if cfg.minibatch
+        else resampler
+    )
+    loss_weights = [1, 1, 1, 1, 1] + np.full(len(ic_bcs), cfg.bc_weight).tolist()
     iterations = cfg.adam
     model.compile(
         "adam",
-        lr=0.001,
+        lr=cfg.lr,
         loss="MSE",
         metrics=["l2 relative error"],
-        decay=("inverse time", iterations // 3, 0.5),
+        # 逐级减半搜索时按总预算构造衰减，各级接起来与一次训满相同
+        decay=("inverse time", (cfg.schedule or iterations) // 3, 0.5),
         loss_weights=loss_weights,
     )
+    if cfg.checkpoint:
+        # 逐级减半搜索时从上一级的检查点接着训练，步数和学习率衰减也接着
+        restore_model(model, cfg.checkpoint)
     losshistory, train_state = model.train(
         iterations=iterations,
         display_every=100,
         model_save_path=folder_name + "/",
-        callbacks=[resampler],
+        callbacks=[sampler],
     )
+    # Adam 结束时的检查点，搜索的下一级从这里接着训练
+    checkpoint = save_model(model, folder_name + "/adam")
     RAR = cfg.RAR
     if RAR:
+        # RAR 锚点：离已有锚点不到 0.01 的点不加，最多 300 个，超出时去掉残差最小的
+        anchors = AnchorSet(model, pde, min_distance=0.01, max_anchors=300)
+        # 下一轮的候选点由 resampler 的后台线程抽取，与本轮训练重叠
+        candidates = resampler.submit(geomtime.random_points, 100000)
         for i in range(5):  # 一下添加几个点，总共这些次
-            XTrar = geomtime.random_points(100000)
-            f = model.predict(XTrar, operator=pde)
-            err_eq = np.absolute(np.array(f))
-            err_eq = np.sum(err_eq, axis=0).flatten()
-            err = np.mean(err_eq)
+            XTrar = candidates.result()
+            candidates = resampler.submit(geomtime.random_points, 100000)
+            # 分块求残差，只保留最大的 100 个，内存不随候选点数增长
+            X_new, err, res_new = residual_top_k(
+                model, pde, XTrar, 100, return_residuals=True
+            )
             print("Mean residual: %.3e" % (err))
-            x_ids = np.argsort(err_eq)[-100:]
-            print("Adding new point:", XTrar[x_ids], "\n")
-            data.add_anchors(XTrar[x_ids])
+            print("Adding new point:", X_new, "\n")
+            anchors.add(X_new, res_new)
             early_stopping = dde.callbacks.EarlyStopping(min_delta=1e-4, patience=2000)
             losshistory, train_state = model.train(
                 iterations=50,
                 display_every=100,
                 disregard_previous_best=True,
                 model_save_path=f"{folder_name}/",
-                callbacks=[early_stopping, resampler],
+                callbacks=[early_stopping, sampler],
             )
     LBFGS = cfg.LBFGS
     if LBFGS:
@@ -250,9 +303,9 @@ def main(cfg: DictConfig):
             display_every=100, model_save_path=folder_name + "/", callbacks=[resampler]
         )
     elapsed = time.time() - start_time
-    Eh_true = np.sqrt(Eu_true**2 + Ev_true**2).flatten()
-    ph_true = np.sqrt(pu_true**2 + pv_true**2).flatten()
-    etah_true = np.abs(eta_true).flatten()
+    Eh_true = np.abs(grid["E"]).flatten()
+    ph_true = np.abs(grid["p"]).flatten()
+    etah_true = np.abs(grid["eta"]).flatten()
     prediction = model.predict(X_star)
     Eu_pred = prediction[:, 0]
     Ev_pred = prediction[:, 1]
@@ -405,6 +458,14 @@ def main(cfg: DictConfig):
             "etaExact_h": etaExact_h,
         },
     )
+    # 多进程扫参时由启动器汇总成一张表
+    return {
+        "E_L2": float(E_L2_relative_error),
+        "p_L2": float(p_L2_relative_error),
+        "eta_L2": float(eta_L2_relative_error),
+        "elapsed": elapsed,
+        "checkpoint": checkpoint,
+    }
 
 
 if __name__ == "__main__":
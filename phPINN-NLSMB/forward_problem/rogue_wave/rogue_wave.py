@@ -1,6 +1,7 @@
 """Backend supported: tensorflow.compat.v1, tensorflow, pytorch, paddle"""
 
 import os
+import sys
 
 os.environ["DDEBACKEND"] = "pytorch"
 import time
@@ -11,9 +12,49 @@ from numpy import exp, cos, sin, log, tanh, cosh, real, imag, sinh, sqrt, arctan
 from scipy import io
 import matplotlib
 
-time_string = time.strftime("%Y年%m月%d日%H时%M分%S秒", time.localtime())
-folder_name = f"output_{time_string}"
-os.makedirs(folder_name, exist_ok=True)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from nlsmb import (
+    AdamLBFGS,
+    AdaptiveWeights,
+    AnchorSet,
+    AsyncResampler,
+    DataParallel,
+    DomainDecomposition,
+    EnsembleBC,
+    EnsembleFNN,
+    MiniBatch,
+    NLSMBDerivatives,
+    ObservationBC,
+    RADResampler,
+    RunCache,
+    SeparableNet,
+    TimeMarching,
+    collocation_batches,
+    compare_weightings,
+    ensemble_report,
+    evaluate_chunked,
+    exact_grid,
+    l2_relative_error,
+    residual_top_k,
+)
+
+seed = 42
+dde.config.set_random_seed(seed)
+# 运行缓存：脚本源码、后端、精度和随机种子都没变时不再训练，直接打印上次的结果；
+# regenerate 为 True 时读取上次保存的模型和预测，只重新计算误差、画图并保存 .mat
+use_cache = True
+regenerate = False
+run_cache = RunCache("rogue_wave", [__file__], seed=seed)
+cached = use_cache and run_cache.folder is not None
+if cached:
+    folder_name = run_cache.folder
+    if not regenerate:
+        run_cache.report()
+        sys.exit()
+else:
+    time_string = time.strftime("%Y年%m月%d日%H时%M分%S秒", time.localtime())
+    folder_name = f"output_{time_string}"
+    os.makedirs(folder_name, exist_ok=True)
 start_time = time.time()
 if dde.backend.backend_name == "paddle":
     import paddle
@@ -45,10 +86,6 @@ t_lower = -3
 t_upper = 3
 nx = 512
 nt = 512
-x = np.linspace(z_lower, z_upper, nx)
-t = np.linspace(t_lower, t_upper, nt)
-X, T = np.meshgrid(x, t)
-X_star = np.hstack((X.flatten()[:, None], T.flatten()[:, None]))
 
 
 space_domain = dde.geometry.Interval(z_lower, z_upper)
@@ -63,15 +100,17 @@ def pde(x, y):
     pv = y[:, 3:4]
     eta = y[:, 4:5]
 
-    pu_t = dde.grad.jacobian(y, x, i=2, j=1)
-    pv_t = dde.grad.jacobian(y, x, i=3, j=1)
-    eta_t = dde.grad.jacobian(y, x, i=4, j=1)
+    # 所有一阶导和 E 的二阶导在一次前向展开里算出
+    y_z, y_t, E_tt = derivatives(x, y)
+    pu_t = y_t[:, 2:3]
+    pv_t = y_t[:, 3:4]
+    eta_t = y_t[:, 4:5]
 
-    Eu_z = dde.grad.jacobian(y, x, i=0, j=0)
-    Ev_z = dde.grad.jacobian(y, x, i=1, j=0)
+    Eu_z = y_z[:, 0:1]
+    Ev_z = y_z[:, 1:2]
 
-    Eu_tt = dde.grad.hessian(y, x, component=0, i=1, j=1)
-    Ev_tt = dde.grad.hessian(y, x, component=1, i=1, j=1)
+    Eu_tt = E_tt[:, 0:1]
+    Ev_tt = E_tt[:, 1:2]
 
     alpha_1 = 0.5
     alpha_2 = -1
@@ -125,7 +164,25 @@ def solution(XT):
     return real(EExact), imag(EExact), real(pExact), imag(pExact), etaExact
 
 
-Eu_true, Ev_true, pu_true, pv_true, eta_true = solution(X_star)
+def exact_fields(x, t):
+    X, T = np.meshgrid(x, t)
+    Eu, Ev, pu, pv, eta = solution(
+        np.hstack((X.flatten()[:, None], T.flatten()[:, None]))
+    )
+    return Eu + I * Ev, pu + I * pv, eta
+
+
+grid = exact_grid(
+    "rogue_wave", exact_fields, z_lower, z_upper, t_lower, t_upper, nx, nt
+)  # 网格和精确解缓存在磁盘上，区域和分辨率不变时直接读取
+x, t = grid.x, grid.t
+X, T = grid.X, grid.T
+X_star = grid.X_star
+Eu_true = np.real(grid["E"]).reshape(-1, 1)
+Ev_true = np.imag(grid["E"]).reshape(-1, 1)
+pu_true = np.real(grid["p"]).reshape(-1, 1)
+pv_true = np.imag(grid["p"]).reshape(-1, 1)
+eta_true = np.real(grid["eta"]).reshape(-1, 1)
 
 
 def output_transform(XT, y):
@@ -211,11 +268,10 @@ X_u_train = X_star[icbc_idx]
 
 Eu_train, Ev_train, pu_train, pv_train, eta_train = solution(X_u_train)
 
-observe_y = dde.icbc.PointSetBC(X_u_train, Eu_train, component=0)
-observe_y1 = dde.icbc.PointSetBC(X_u_train, Ev_train, component=1)
-observe_y2 = dde.icbc.PointSetBC(X_u_train, pu_train, component=2)
-observe_y3 = dde.icbc.PointSetBC(X_u_train, pv_train, component=3)
-observe_y4 = dde.icbc.PointSetBC(X_u_train, eta_train, component=4)
+# 五个分量在同一组观测点上，合成一个条件，观测点只进网络一次
+observe_y = ObservationBC(
+    X_u_train, [Eu_train, Ev_train, pu_train, pv_train, eta_train]
+)
 # Network architecture
 PFNN = True
 net = (
@@ -227,58 +283,232 @@ net = (
     if PFNN
     else dde.nn.FNN([2] + [64] * 6 + [5], "tanh", "Glorot normal")
 )
+# z、t 各用一个网络，输出为两者特征按秩相乘求和；
+# 配点取网格，网格上的预测和导数只需 nx + nt 次网络计算
+separable = False
+if separable:
+    net = SeparableNet([64] * 4, 5, 32, "tanh", "Glorot normal")
+# 集成：ensemble 个不同种子初始化的 FNN 堆叠成批量矩阵乘，在同一组配点上一起训练；
+# 报告每个成员和成员平均的 L2 误差，并画成员间的标准差图。0 为不用
+ensemble = 0
+if ensemble and separable:
+    raise ValueError("ensemble and separable both replace net, turn on one")
+if ensemble:
+    net = EnsembleFNN([2] + [64] * 6 + [5], "tanh", "Glorot normal", ensemble, seed)
 
 hard_constraint = True
 if hard_constraint:
     net.apply_output_transform(output_transform)
-ic_bcs = (
-    []
-    if hard_constraint
-    else [observe_y, observe_y1, observe_y2, observe_y3, observe_y4]
-)
+ic_bcs = [] if hard_constraint else [observe_y]
+if ensemble:
+    # 每个成员的残差和观测误差各占一列
+    pde = net.operator(pde)
+    ic_bcs = [EnsembleBC(bc, ensemble) for bc in ic_bcs]
 data = dde.data.TimePDE(
     geomtime,
     pde,
     ic_bcs=ic_bcs,
     num_domain=20000,
-    solution=lambda XT: np.hstack((solution(XT))),
+    solution=lambda XT: np.tile(np.hstack((solution(XT))), max(ensemble, 1)),
+    train_distribution="uniform" if separable else "Hammersley",
 )
 
+# 导数的算法："fused" 一次 Taylor 展开前向，"jvp" 嵌套前向模式，"reverse" 即 dde.grad
+derivative_mode = "fused"
+# 集成网络的导数只能用 dde.grad 求
+derivatives = NLSMBDerivatives(None if ensemble else net, mode=derivative_mode)
 model = dde.Model(data, net)
 
-resampler = dde.callbacks.PDEPointResampler(period=5000)
+# 后台线程准备下一组配点，重采样时只交换数组
+resampler = AsyncResampler(period=5000)
+# 小批量训练：Adam 每步从 40 万个点的配点池里取 4096 个，池子每轮重新打乱；L-BFGS 仍是全批量
+minibatch = False
+# RAD：每 2000 步按 |f|/mean|f| + 1 的密度从 10 万个候选点里重抽全部配点，每次只重算四分之一候选点的残差
+RAD = False
+if minibatch and RAD:
+    raise ValueError(
+        "minibatch and RAD both replace the collocation points, turn on one"
+    )
+
+
+# Adam 阶段的采样回调；compare_weighting 每种权重各用一个新的
+def new_sampler():
+    if minibatch:
+        return MiniBatch(
+            collocation_batches(lambda: geomtime.random_points(400000), 4096)
+        )
+    if RAD:
+        return RADResampler(pde, geomtime.random_points(100000), period=2000)
+    return AsyncResampler(period=5000)
+
+
+sampler = new_sampler() if minibatch or RAD else resampler
 loss_weights = [1, 1, 1, 1, 1] + np.full(len(ic_bcs), 100).tolist()
 iterations = 3
-model.compile(
-    "adam",
-    lr=0.001,
-    loss="MSE",
-    metrics=["l2 relative error"],
-    decay=("inverse time", iterations // 3, 0.5),
-    loss_weights=loss_weights,
-)
+# 时间推进：把 [t_lower, t_upper] 分成 4 段依次训练，每段从上一段的网络开始，初值取上一段的预测，
+# 段内残差按时间因果加权；预测时按 t 用各段的网络拼接
+time_marching = False
+# 区域分解（XPINN）：z、t 各分两段，四个子区域各用一个网络、各在一个进程里训练，
+# 每 100 步经共享内存交换界面上的预测；预测时按子区域拼接
+decomposition = False
+# 自动切换：最多 iterations 步 Adam，平滑后的损失和梯度范数在 2000 步内都降不到 1% 时转 L-BFGS，
+# L-BFGS 的平滑损失在 1000 步内降不到 0.1% 时停止，最后打印比固定步数省下的时间
+auto_switch = False
+# 自适应损失权重："grad_norm"、"annealing" 或 "ntk"，每 100 步按各项损失的梯度重设 loss_weights；None 为固定权重
+adaptive_weights = None
+# 比较固定权重和三种自适应权重：从同一个初始网络各训练最多 iterations 步 Adam，打印达到 L2 误差 0.05 的步数和时间后退出
+compare_weighting = False
+# 数据并行：data_parallel 个进程各算 1/data_parallel 的配点和观测点上的损失，梯度经 gloo 全归约，
+# Adam 之后接着全批量一致的 L-BFGS。0 为不用
+data_parallel = 0
+# 以上训练方式只能开一个，也不能与自适应权重或后面的 RAR、L-BFGS 同开；其中时间推进和
+# 区域分解各自建数据、分段预测，也不能与前面的采样方式、separable、ensemble 同开
+training_modes = {
+    "time_marching": time_marching,
+    "decomposition": decomposition,
+    "auto_switch": auto_switch,
+    "compare_weighting": compare_weighting,
+    "data_parallel": data_parallel,
+}
+training_mode = [name for name, on in training_modes.items() if on]
+if len(training_mode) > 1:
+    raise ValueError(f"Turn on only one of {', '.join(training_mode)}")
+training_mode = training_mode[0] if training_mode else None
+if adaptive_weights and training_mode:
+    raise ValueError(
+        "adaptive_weights only weights the plain Adam training, "
+        f"turn off {training_mode}"
+    )
+if training_mode in ("time_marching", "decomposition") and (
+    minibatch or RAD or separable or ensemble
+):
+    raise ValueError(
+        f"{training_mode} builds its own data and predicts piecewise, "
+        "turn off minibatch, RAD, separable and ensemble"
+    )
+if cached:
+    # 读取缓存的模型，不再训练
+    if run_cache.checkpoint is not None:
+        model.compile("adam", lr=0.001, loss_weights=loss_weights)
+        model.restore(run_cache.checkpoint)
+elif compare_weighting:
+    compare_weightings(
+        model, 0.05, iterations, loss_weights, callbacks=lambda: [new_sampler()]
+    )
+    sys.exit()
+elif time_marching:
+    marching = TimeMarching(
+        net,
+        pde,
+        space_domain,
+        time_domain,
+        4,
+        observe_y if ic_bcs else None,
+        num_domain=20000 // 4,
+        causal=1.0,
+        train_distribution="Hammersley",
+    )
+    losshistory, train_state = marching.train(
+        iterations // 4, loss_weights, display_every=100
+    )
+elif decomposition:
+    subdomains = DomainDecomposition(
+        net,
+        pde,
+        (z_lower, z_upper),
+        (t_lower, t_upper),
+        2,
+        2,
+        observe_y if ic_bcs else None,
+        num_domain=20000 // 4,
+        train_distribution="Hammersley",
+    )
+    losshistory, train_state = subdomains.train(
+        iterations, loss_weights, display_every=100
+    )
+elif auto_switch:
+    dde.optimizers.config.set_LBFGS_options(
+        maxcor=50,
+        ftol=1.0 * np.finfo(float).eps,
+        gtol=1e-08,
+        maxiter=100,
+        maxfun=None,
+        maxls=50,
+    )
+    switch = AdamLBFGS(model, max_adam=iterations, patience=2000, tol=1e-2)
+    losshistory, train_state = switch.train(
+        lr=0.001,
+        loss_weights=loss_weights,
+        decay=("inverse time", iterations // 3, 0.5),
+        callbacks=[sampler],
+        lbfgs_callbacks=[resampler],
+        display_every=100,
+        model_save_path=f"{folder_name}/",
+        metrics=["l2 relative error"],
+    )
+elif data_parallel:
+    dde.optimizers.config.set_LBFGS_options(
+        maxcor=50,
+        ftol=1.0 * np.finfo(float).eps,
+        gtol=1e-08,
+        maxiter=100,
+        maxfun=None,
+        maxls=50,
+    )
+    parallel = DataParallel(model, data_parallel)
+    losshistory, train_state = parallel.train(
+        iterations,
+        loss_weights,
+        decay=("inverse time", iterations // 3, 0.5),
+        lbfgs=True,
+        metrics=["l2 relative error"],
+        display_every=100,
+        callbacks=[sampler],
+        lbfgs_callbacks=[resampler],
+    )
+else:
+    model.compile(
+        "adam",
+        lr=0.001,
+        loss="MSE",
+        metrics=["l2 relative error"],
+        decay=("inverse time", iterations // 3, 0.5),
+        loss_weights=loss_weights,
+    )
 
-# model.restore("output_dir/-350.pt")
+    # model.restore("output_dir/-350.pt")
 
-losshistory, train_state = model.train(
-    iterations=iterations,
-    display_every=100,
-    model_save_path=f"{folder_name}/",
-    callbacks=[resampler],
-)
+    weighting = [AdaptiveWeights(adaptive_weights)] if adaptive_weights else []
+    losshistory, train_state = model.train(
+        iterations=iterations,
+        display_every=100,
+        model_save_path=f"{folder_name}/",
+        callbacks=[sampler] + weighting,
+    )
+    if adaptive_weights:
+        # 后面的 RAR 和 L-BFGS 沿用学到的权重
+        loss_weights = model.loss_weights
 
 RAR = False
-if RAR:
+if RAR and training_mode:
+    raise ValueError(
+        f"RAR follows the Adam training of model, turn off {training_mode}"
+    )
+if RAR and not cached:
+    # RAR 锚点：离已有锚点不到 0.01 的点不加，最多 300 个，超出时去掉残差最小的
+    anchors = AnchorSet(model, pde, min_distance=0.01, max_anchors=300)
+    # 下一轮的候选点由 resampler 的后台线程抽取，与本轮训练重叠
+    candidates = resampler.submit(geomtime.random_points, 100000)
     for i in range(5):  # 一下添加几个点，总共这些次
-        XTrar = geomtime.random_points(100000)
-        f = model.predict(XTrar, operator=pde)
-        err_eq = np.absolute(np.array(f))
-        err_eq = np.sum(err_eq, axis=0).flatten()
-        err = np.mean(err_eq)
+        XTrar = candidates.result()
+        candidates = resampler.submit(geomtime.random_points, 100000)
+        # 分块求残差，只保留最大的 100 个，内存不随候选点数增长
+        X_new, err, res_new = residual_top_k(
+            model, pde, XTrar, 100, return_residuals=True
+        )
         print("Mean residual: %.3e" % (err))
-        x_ids = np.argsort(err_eq)[-100:]
-        print("Adding new point:", XTrar[x_ids], "\n")
-        data.add_anchors(XTrar[x_ids])
+        print("Adding new point:", X_new, "\n")
+        anchors.add(X_new, res_new)
         early_stopping = dde.callbacks.EarlyStopping(min_delta=1e-4, patience=2000)
         # model.compile("adam", lr=0.0001)
 
@@ -287,11 +517,15 @@ if RAR:
             display_every=100,
             disregard_previous_best=True,
             model_save_path=f"{folder_name}/",
-            callbacks=[early_stopping, resampler],
+            callbacks=[early_stopping, sampler],
         )
 
 LBFGS = False
-if LBFGS:
+if LBFGS and training_mode:
+    raise ValueError(
+        f"L-BFGS follows the Adam training of model, turn off {training_mode}"
+    )
+if LBFGS and not cached:
     dde.optimizers.config.set_LBFGS_options(
         maxcor=50,
         ftol=1.0 * np.finfo(float).eps,
@@ -309,14 +543,25 @@ if LBFGS:
         display_every=100, model_save_path=f"{folder_name}/", callbacks=[resampler]
     )
 
-elapsed = time.time() - start_time
+elapsed = run_cache.elapsed if cached else time.time() - start_time
 
 # 精确解
 Eh_true = np.sqrt(Eu_true**2 + Ev_true**2).flatten()
 ph_true = np.sqrt(pu_true**2 + pv_true**2).flatten()
 etah_true = np.abs(eta_true).flatten()
 # 预测解
-prediction = model.predict(X_star)
+if cached:
+    prediction = run_cache.prediction()
+elif separable:
+    prediction = net.predict_grid(x, t)
+elif time_marching:
+    prediction = evaluate_chunked(marching.predict, X_star, chunk_size=65536)
+elif decomposition:
+    prediction = evaluate_chunked(subdomains.predict, X_star, chunk_size=65536)
+else:
+    prediction = evaluate_chunked(
+        model.predict, X_star, chunk_size=65536
+    )  # 分块预测，大网格时内存有上限
 Eu_pred = prediction[:, 0]
 Ev_pred = prediction[:, 1]
 Eh_pred = np.sqrt(Eu_pred**2 + Ev_pred**2)
@@ -325,9 +570,24 @@ pv_pred = prediction[:, 3]
 ph_pred = np.sqrt(pu_pred**2 + pv_pred**2)
 etau_pred = prediction[:, 4]
 etah_pred = np.abs(etau_pred)
-E_L2_relative_error = dde.metrics.l2_relative_error(Eh_true, Eh_pred)
-p_L2_relative_error = dde.metrics.l2_relative_error(ph_true, ph_pred)
-eta_L2_relative_error = dde.metrics.l2_relative_error(etah_true, etah_pred)
+if ensemble:
+    # 各成员的 |E|、|p|、|eta|；下面的误差和图用成员平均
+    members = prediction.reshape(len(prediction), ensemble, 5).transpose(1, 0, 2)
+    members = np.stack(
+        [
+            np.hypot(members[..., 0], members[..., 1]),
+            np.hypot(members[..., 2], members[..., 3]),
+            np.abs(members[..., 4]),
+        ],
+        -1,
+    )
+    ensemble_mean, ensemble_std = ensemble_report(
+        members, np.stack([Eh_true, ph_true, etah_true], 1), ["E", "p", "eta"]
+    )
+    Eh_pred, ph_pred, etah_pred = ensemble_mean.T
+E_L2_relative_error = l2_relative_error(Eh_true, Eh_pred)
+p_L2_relative_error = l2_relative_error(ph_true, ph_pred)
+eta_L2_relative_error = l2_relative_error(etah_true, etah_pred)
 print("E L2 relative error: %e" % E_L2_relative_error)
 print("p L2 relative error: %e" % p_L2_relative_error)
 print("eta L2 relative error: %e" % eta_L2_relative_error)
@@ -346,7 +606,10 @@ elevation = 20
 azimuth = -40
 dpi = 300
 
-dde.saveplot(losshistory, train_state, issave=True, isplot=True, output_dir=folder_name)
+if not cached:
+    dde.saveplot(
+        losshistory, train_state, issave=True, isplot=True, output_dir=folder_name
+    )
 
 
 def plot_compare(H_exact, H_pred, tt0, tt1, name):
@@ -464,9 +727,17 @@ plot2d(
     "Absolute error",
     cmap="viridis",
 )
+if ensemble:
+    # 不确定性：成员间的标准差
+    plot2d(
+        *(std.reshape(nt, nx) for std in ensemble_std.T),
+        "Ensemble standard deviation",
+        cmap="viridis",
+    )
 
+mat_path = f"{folder_name}/预测结果_{os.path.basename(os.getcwd())}.mat"
 io.savemat(
-    f"{folder_name}/预测结果_{os.path.basename(os.getcwd())}.mat",
+    mat_path,
     {
         "x": x,
         "t": t,
@@ -483,4 +754,13 @@ io.savemat(
         "etaExact_h": etaExact_h,
     },
 )
+if not cached:
+    # 时间推进和区域分解的预测不来自一个模型，只缓存预测
+    run_cache.store(
+        folder_name,
+        prediction,
+        mat_path,
+        elapsed,
+        model=None if time_marching or decomposition else model,
+    )
 # plt.show()
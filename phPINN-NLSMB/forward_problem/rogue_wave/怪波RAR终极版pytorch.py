@@ -1,6 +1,7 @@
 """Backend supported: tensorflow.compat.v1, tensorflow, pytorch, paddle"""
 
 import os
+import sys
 import time
 
 os.environ["DDEBACKEND"] = "pytorch"
@@ -11,6 +12,17 @@ from numpy import exp, cos, sin, log, tanh, cosh, real, imag, sinh, sqrt, arctan
 from scipy import io
 import matplotlib
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from nlsmb import (
+    AnchorSet,
+    AsyncResampler,
+    MiniBatch,
+    NLSMBDerivatives,
+    ObservationBC,
+    collocation_batches,
+    residual_top_k,
+)
+
 time_string = time.strftime("%Y年%m月%d日%H时%M分%S秒", time.localtime())
 folder_name = f"output_{time_string}"
 os.makedirs(folder_name, exist_ok=True)
@@ -136,25 +148,24 @@ def pde(x, y):  # 这里x其实是x和t，y其实是u和v
     pv = y[:, 3:4]
     eta = y[:, 4:5]
 
-    # In 'jacobian', i is the output component and j is the input component
-    Eu_t = dde.grad.jacobian(y, x, i=0, j=1)  # 一阶导用jacobian，二阶导用hessian
-    Ev_t = dde.grad.jacobian(y, x, i=1, j=1)
+    # 所有一阶导和 E 的二阶导在一次前向展开里算出
+    y_z, y_t, E_zz = derivatives(x, y)
+    Eu_t = y_t[:, 0:1]
+    Ev_t = y_t[:, 1:2]
     # pu_t = dde.grad.jacobian(y, x, i=2, j=1)  # 一阶导用jacobian，二阶导用hessian
     # pv_t = dde.grad.jacobian(y, x, i=3, j=1)
     # eta_t = dde.grad.jacobian(y, x, i=4, j=1)
     #
     # Eu_z = dde.grad.jacobian(y, x, i=0, j=0)  # 一阶导用jacobian，二阶导用hessian
     # Ev_z = dde.grad.jacobian(y, x, i=1, j=0)
-    pu_z = dde.grad.jacobian(y, x, i=2, j=0)  # 一阶导用jacobian，二阶导用hessian
-    pv_z = dde.grad.jacobian(y, x, i=3, j=0)
-    eta_z = dde.grad.jacobian(y, x, i=4, j=0)
+    pu_z = y_z[:, 2:3]
+    pv_z = y_z[:, 3:4]
+    eta_z = y_z[:, 4:5]
 
-    # In 'hessian', i and j are both input components. (The Hessian could be in principle something like d^2y/dxdt, d^2y/d^2x etc)
-    # The output component is selected by "component"
     # Eu_tt = dde.grad.hessian(y, x, component=0, i=1, j=1)
     # Ev_tt = dde.grad.hessian(y, x, component=1, i=1, j=1)
-    Eu_zz = dde.grad.hessian(y, x, component=0, i=0, j=0)
-    Ev_zz = dde.grad.hessian(y, x, component=1, i=0, j=0)
+    Eu_zz = E_zz[:, 0:1]
+    Ev_zz = E_zz[:, 1:2]
 
     f1_u = 0.5 * Eu_zz + Eu * (Eu**2 + Ev**2) + 2 * pv - Ev_t
     f1_v = 0.5 * Ev_zz + Ev * (Eu**2 + Ev**2) - 2 * pu + Eu_t
@@ -317,11 +328,10 @@ X_u_train = X_star[icbc_idx]
 
 Eu_train, Ev_train, pu_train, pv_train, eta_train = solution(X_u_train)
 
-observe_y = dde.icbc.PointSetBC(X_u_train, Eu_train, component=0)
-observe_y1 = dde.icbc.PointSetBC(X_u_train, Ev_train, component=1)
-observe_y2 = dde.icbc.PointSetBC(X_u_train, pu_train, component=2)
-observe_y3 = dde.icbc.PointSetBC(X_u_train, pv_train, component=3)
-observe_y4 = dde.icbc.PointSetBC(X_u_train, eta_train, component=4)
+# 五个分量在同一组观测点上，合成一个条件，观测点只进网络一次
+observe_y = ObservationBC(
+    X_u_train, [Eu_train, Ev_train, pu_train, pv_train, eta_train]
+)
 # Network architecture
 PFNN = True
 net = (
@@ -346,11 +356,7 @@ net = (
 hard_constraint = False
 if hard_constraint:
     net.apply_output_transform(output_transform)
-ic_bcs = (
-    []
-    if hard_constraint
-    else [observe_y, observe_y1, observe_y2, observe_y3, observe_y4]
-)
+ic_bcs = [] if hard_constraint else [observe_y]
 
 data = dde.data.TimePDE(
     geomtime,
@@ -360,9 +366,20 @@ data = dde.data.TimePDE(
     solution=lambda XT: np.hstack((solution(XT))),
 )
 
+# 导数的算法："fused" 一次 Taylor 展开前向，"jvp" 嵌套前向模式，"reverse" 即 dde.grad
+derivative_mode = "fused"
+derivatives = NLSMBDerivatives(net, second=0, mode=derivative_mode)
 model = dde.Model(data, net)
 
-resampler = dde.callbacks.PDEPointResampler(period=5000)
+# 后台线程准备下一组配点，重采样时只交换数组
+resampler = AsyncResampler(period=5000)
+# 小批量训练：Adam 每步从 40 万个点的配点池里取 4096 个，池子每轮重新打乱；L-BFGS 仍是全批量
+minibatch = False
+sampler = (
+    MiniBatch(collocation_batches(lambda: geomtime.random_points(400000), 4096))
+    if minibatch
+    else resampler
+)
 loss_weights = [1, 1, 1, 1, 1] + np.full(len(ic_bcs), 100).tolist()
 iterations = 3
 model.compile(
@@ -377,21 +394,25 @@ losshistory, train_state = model.train(
     iterations=iterations,
     display_every=100,
     model_save_path=folder_name + "/",
-    callbacks=[resampler],
+    callbacks=[sampler],
 )
 
 RAR = True
 if RAR:
+    # RAR 锚点：离已有锚点不到 0.01 的点不加，最多 300 个，超出时去掉残差最小的
+    anchors = AnchorSet(model, pde, min_distance=0.01, max_anchors=300)
+    # 下一轮的候选点由 resampler 的后台线程抽取，与本轮训练重叠
+    candidates = resampler.submit(geomtime.random_points, 100000)
     for i in range(5):  # 一下添加几个点，总共这些次
-        XTrar = geomtime.random_points(100000)
-        f = model.predict(XTrar, operator=pde)
-        err_eq = np.absolute(np.array(f))
-        err_eq = np.sum(err_eq, axis=0).flatten()
-        err = np.mean(err_eq)
+        XTrar = candidates.result()
+        candidates = resampler.submit(geomtime.random_points, 100000)
+        # 分块求残差，只保留最大的 100 个，内存不随候选点数增长
+        X_new, err, res_new = residual_top_k(
+            model, pde, XTrar, 100, return_residuals=True
+        )
         print("Mean residual: %.3e" % (err))
-        x_ids = np.argsort(err_eq)[-100:]
-        print("Adding new point:", XTrar[x_ids], "\n")
-        data.add_anchors(XTrar[x_ids])
+        print("Adding new point:", X_new, "\n")
+        anchors.add(X_new, res_new)
         early_stopping = dde.callbacks.EarlyStopping(min_delta=1e-4, patience=2000)
         # model.compile("adam", lr=0.0001)
 
@@ -400,7 +421,7 @@ if RAR:
             display_every=100,
             disregard_previous_best=True,
             model_save_path=folder_name + "/",
-            callbacks=[early_stopping, resampler],
+            callbacks=[early_stopping, sampler],
         )
 
 LBFGS = True
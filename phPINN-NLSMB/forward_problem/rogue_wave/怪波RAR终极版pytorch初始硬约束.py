@@ -1,4 +1,5 @@
 import os
+import sys
 
 os.environ["DDEBACKEND"] = "pytorch"  # pytorch tensorflow.compat.v1
 import deepxde as dde
@@ -12,6 +13,20 @@ import torch
 from numpy import sin, cos, exp, cosh, real, imag
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.."))
+from nlsmb import (
+    AsyncResampler,
+    Checkpointer,
+    CollocationPruner,
+    HardConstraint,
+    MiniBatch,
+    NLSMBDerivatives,
+    ObservationBC,
+    RunCache,
+    collocation_batches,
+    default_cache_dir,
+)
+
 start_time = time.time()
 
 
@@ -156,25 +171,24 @@ def pde(x, y):  # 这里x其实是x和t，y其实是u和v
     pv = y[:, 3:4]
     eta = y[:, 4:5]
 
-    # In 'jacobian', i is the output component and j is the input component
-    Eu_t = dde.grad.jacobian(y, x, i=0, j=1)  # 一阶导用jacobian，二阶导用hessian
-    Ev_t = dde.grad.jacobian(y, x, i=1, j=1)
+    # 所有一阶导和 E 的二阶导在一次前向展开里算出
+    y_z, y_t, E_zz = derivatives(x, y)
+    Eu_t = y_t[:, 0:1]
+    Ev_t = y_t[:, 1:2]
     # pu_t = dde.grad.jacobian(y, x, i=2, j=1)  # 一阶导用jacobian，二阶导用hessian
     # pv_t = dde.grad.jacobian(y, x, i=3, j=1)
     # eta_t = dde.grad.jacobian(y, x, i=4, j=1)
     #
     # Eu_z = dde.grad.jacobian(y, x, i=0, j=0)  # 一阶导用jacobian，二阶导用hessian
     # Ev_z = dde.grad.jacobian(y, x, i=1, j=0)
-    pu_z = dde.grad.jacobian(y, x, i=2, j=0)  # 一阶导用jacobian，二阶导用hessian
-    pv_z = dde.grad.jacobian(y, x, i=3, j=0)
-    eta_z = dde.grad.jacobian(y, x, i=4, j=0)
+    pu_z = y_z[:, 2:3]
+    pv_z = y_z[:, 3:4]
+    eta_z = y_z[:, 4:5]
 
-    # In 'hessian', i and j are both input components. (The Hessian could be in principle something like d^2y/dxdt, d^2y/d^2x etc)
-    # The output component is selected by "component"
     # Eu_tt = dde.grad.hessian(y, x, component=0, i=1, j=1)
     # Ev_tt = dde.grad.hessian(y, x, component=1, i=1, j=1)
-    Eu_zz = dde.grad.hessian(y, x, component=0, i=0, j=0)
-    Ev_zz = dde.grad.hessian(y, x, component=1, i=0, j=0)
+    Eu_zz = E_zz[:, 0:1]
+    Ev_zz = E_zz[:, 1:2]
 
     f1_u = 0.5 * Eu_zz + Eu * (Eu**2 + Ev**2) + 2 * pv - Ev_t
     f1_v = 0.5 * Ev_zz + Ev * (Eu**2 + Ev**2) - 2 * pu + Eu_t
@@ -185,14 +199,13 @@ def pde(x, y):  # 这里x其实是x和t，y其实是u和v
     return [f1_u, f1_v, f2_u, f2_v, f3]
 
 
-def output_transform(x, y):
-    Eu = y[:, 0]
-    Ev = y[:, 1]
-    pu = y[:, 2]
-    pv = y[:, 3]
-    eta = y[:, 4]
+def distance(x):
+    T = x[:, 1:2]
+    return 1 - torch.exp(t_lower - T)
+
+
+def exact(x):
     X = x[:, 0]
-    T = x[:, 1]
     T1 = t_lower
     I = 1j
     E_true = torch.exp(((3 * X) / 2 - (65 * T1) / 8) * I) * (
@@ -242,27 +255,23 @@ def output_transform(x, y):
     Ev_true = imag(E_true)
     pu_true = real(p_true)
     pv_true = imag(p_true)
-    aaa = (1 - torch.exp(t_lower - T)) * Eu + Eu_true
-    bbb = (1 - torch.exp(t_lower - T)) * Ev + Ev_true
-    ccc = (1 - torch.exp(t_lower - T)) * pu + pu_true
-    ddd = (1 - torch.exp(t_lower - T)) * pv + pv_true
-    eee = (1 - torch.exp(t_lower - T)) * eta + eta_true
 
-    return torch.stack([aaa, bbb, ccc, ddd, eee], dim=1)
+    return torch.stack([Eu_true, Ev_true, pu_true, pv_true, eta_true], dim=1)
+
+
+# 初始时刻的精确解和距离函数只依赖采样点，每组采样点只算一次，重采样后才重新计算
+output_transform = HardConstraint(distance, exact)
 
 
-observe_y = dde.icbc.PointSetBC(X_u_train, Eu_icbc, component=0)
-observe_y1 = dde.icbc.PointSetBC(X_u_train, Ev_icbc, component=1)
-observe_y2 = dde.icbc.PointSetBC(X_u_train, pu_icbc, component=2)
-observe_y3 = dde.icbc.PointSetBC(X_u_train, pv_icbc, component=3)
-observe_y4 = dde.icbc.PointSetBC(X_u_train, etau_icbc, component=4)
+# 五个分量在同一组观测点上，合成一个条件，观测点只进网络一次
+observe_y = ObservationBC(X_u_train, [Eu_icbc, Ev_icbc, pu_icbc, pv_icbc, etau_icbc])
 """初始条件就是t等于-5的时候"""
 # 初始条件满足init_cond_u或init_cond_v函数
 data = dde.data.TimePDE(
     geomtime,
     pde,
     # [],
-    [observe_y, observe_y1, observe_y2, observe_y3, observe_y4],
+    [observe_y],
     num_domain=25000,
     train_distribution="pseudo",
 )  # 在内部取10000个点，在边界取20个点，在初始取200个点,"pseudo" (pseudorandom)伪随机分布
@@ -272,21 +281,56 @@ net = dde.nn.FNN([2] + [128] * 6 + [5], "tanh", "Glorot normal")
 net.apply_output_transform(output_transform)
 
 
+# 导数的算法："fused" 一次 Taylor 展开前向，"jvp" 嵌套前向模式，"reverse" 即 dde.grad
+derivative_mode = "fused"
+derivatives = NLSMBDerivatives(net, second=0, mode=derivative_mode)
 model = dde.Model(data, net)
 
-resampler = dde.callbacks.PDEPointResampler(period=5000)
-
-model.compile(
-    "adam",
-    lr=0.001,
-    loss="MSE",
-    # decay=("inverse time", 5000, 0.5),
-    decay=("step", 5000, 0.7),
-    loss_weights=[1, 1, 1, 1, 1, 100, 100, 100, 100, 100],
+# 后台线程准备下一组配点，重采样时只交换数组
+resampler = AsyncResampler(period=5000)
+# 小批量训练：Adam 每步从 40 万个点的配点池里取 4096 个，池子每轮重新打乱；L-BFGS 仍是全批量
+minibatch = False
+sampler = (
+    MiniBatch(collocation_batches(lambda: geomtime.random_points(400000), 4096))
+    if minibatch
+    else resampler
 )
-losshistory, train_state = model.train(
-    iterations=30000, display_every=100, callbacks=[resampler]
+# 剪枝：每 1000 步按残差把最小的一半配点抽掉九成，16x16 网格的每格至少留 2 个点；L-BFGS 每步剪一次
+prune = False
+pruning = [CollocationPruner(pde, period=1000)] if prune else []
+
+# 断点续训：每 1000 步由后台线程把网络、优化器、学习率进度、随机数状态和配点写进缓存目录的
+# checkpoints/<key>/，没变的数组（如锚点）只存一份；中断后重新运行从最近的检查点接着训练，
+# 训练完成的检查点标为 done，再运行时从头开始；resume = False 则总是从头开始。
+# key 是本脚本、nlsmb 源码、deepxde 版本和后端的哈希，改了代码不会接着旧代码的检查点训练
+resume = True
+key = RunCache("怪波", [__file__], ignore=("resume",)).key
+checkpointer = Checkpointer(
+    os.path.join(default_cache_dir(), "checkpoints", key), period=1000, key=key
 )
+checkpoint = checkpointer.latest() if resume else None
+phase = None if checkpoint is None else checkpoint["state"]["phase"]
+if phase not in ("adam", "lbfgs"):
+    checkpointer.clear()
+    phase = None
+
+if phase != "lbfgs":
+    model.compile(
+        "adam",
+        lr=0.001,
+        loss="MSE",
+        # decay=("inverse time", 5000, 0.5),
+        decay=("step", 5000, 0.7),
+        loss_weights=[1, 1, 1, 1, 1, 100],
+    )
+    if phase == "adam":
+        checkpointer.restore(model, checkpoint)
+    checkpointer.state["phase"] = "adam"
+    losshistory, train_state = model.train(
+        iterations=30000 - model.train_state.step,
+        display_every=100,
+        callbacks=[sampler, checkpointer] + pruning,
+    )
 
 # dde.optimizers.config.set_LBFGS_options(
 #     maxcor=50,
@@ -300,10 +344,17 @@ model.compile(
     "L-BFGS",
     # loss_weights=[1, 1, 1, 1, 1, 100, 100, 100, 100, 100, 100, 100, 100, 100, 100]
 )
+if phase == "lbfgs":
+    checkpointer.restore(model, checkpoint)
+checkpointer.state["phase"] = "lbfgs"
 losshistory, train_state = model.train(
     display_every=100,
     # callbacks=[resampler]
+    callbacks=[checkpointer] + ([CollocationPruner(pde, period=1)] if prune else []),
 )
+checkpointer.state["phase"] = "done"
+checkpointer.save(wait=True)
+checkpointer.close()
 
 # XT = geomtime.random_points(100000)
 # err = 1
@@ -0,0 +1 @@
+"""Hydra launcher that runs the jobs of a multirun sweep in parallel processes."""
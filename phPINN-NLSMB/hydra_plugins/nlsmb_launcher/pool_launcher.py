@@ -0,0 +1,268 @@
+"""Process-pool launcher for ``--multirun`` sweeps.
+
+Hydra's basic launcher runs the jobs of a sweep one after another in the
+same process, and every job computes the same exact-solution grid again.
+``PoolLauncher`` runs up to ``processes`` jobs at a time, each in a forked
+process pinned to its own ``threads`` cores, so that the jobs do not fight
+over the cores with their intra-op threads.  It points ``$NLSMB_CACHE_DIR``
+at ``shared_dir`` (``/dev/shm`` by default), so the grid that
+``nlsmb.exact_grid`` caches there is computed by the first job and
+memory-mapped from shared memory by all the others.  So that the jobs of
+the first wave do not all compute the cold grid at once, ``warmup`` names a
+function of the app, e.g. ``__main__.load_grid``, that the launcher calls once
+with the config of the first job before it starts any.  A job that returns a
+dict, e.g. of its L2 errors and elapsed time, gets a row in
+``summary.csv`` in the sweep directory; a sweeper that launches several
+batches, e.g. the rungs of ``nlsmb_halving``, gets the rows of all of them.
+
+Select it in the config with::
+
+    defaults:
+      - override hydra/launcher: nlsmb_pool
+      - _self_
+"""
+
+import csv
+import logging
+import multiprocessing
+import os
+import pickle
+import queue as queues
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from hydra.core.config_store import ConfigStore
+from hydra.core.utils import (
+    JobReturn,
+    JobStatus,
+    configure_log,
+    filter_overrides,
+    run_job,
+    setup_globals,
+)
+from hydra.plugins.launcher import Launcher
+from hydra.utils import get_method
+from omegaconf import open_dict, read_write
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class PoolLauncherConf:
+    _target_: str = "hydra_plugins.nlsmb_launcher.pool_launcher.PoolLauncher"
+    # Jobs run at the same time, by default cores // threads
+    processes: Optional[int] = None
+    # Cores of every job, which is also its thread count
+    threads: int = 1
+    # Cache directory of the exact grids; under /dev/shm it is memory shared
+    # by all jobs
+    shared_dir: Optional[str] = "/dev/shm/nlsmb"
+    # A function called once in the launcher before the jobs are dispatched,
+    # such as __main__.load_grid, to compute the exact grids ahead
+    warmup: Optional[str] = None
+
+
+ConfigStore.instance().store(
+    group="hydra/launcher", name="nlsmb_pool", node=PoolLauncherConf, provider="nlsmb"
+)
+
+
+def pin(slot, threads):
+    """Pin the calling process to the ``threads`` cores of ``slot`` and limit
+    its BLAS/OpenMP, ``torch`` and ``paddle`` threads to as many.
+
+    The app has usually imported its backend before the launcher runs, and
+    the forked job inherits the thread pools of the loaded libraries, which
+    read the environment variables only when they are loaded.  The variables
+    are therefore set for the libraries the job loads later, and the pools
+    already loaded are limited at run time.
+    """
+    from threadpoolctl import threadpool_limits
+
+    cores = sorted(os.sched_getaffinity(0))
+    first = slot * threads % len(cores)
+    mine = cores[first : first + threads] or cores[:threads]
+    os.sched_setaffinity(0, mine)
+    n = len(mine)
+    for name in ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]:
+        os.environ[name] = str(n)
+    threadpool_limits(n)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(n)
+    if "paddle" in sys.modules:
+        # paddle.base is the name since 2.6, paddle.fluid before
+        paddle = sys.modules["paddle"]
+        core = getattr(getattr(paddle, "base", None) or paddle.fluid, "core")
+        core.set_num_threads(n)
+    return mine
+
+
+class PoolLauncher(Launcher):
+    """Run the jobs of a sweep in ``processes`` pinned processes at a time.
+
+    Every job runs in a fresh forked process, so that global state such as
+    ``dde.config.set_default_float`` does not leak from one job to the next.
+
+    Args:
+        processes: The number of jobs run at a time; defaults to the number of
+            usable cores divided by ``threads``.
+        threads: The number of cores, and threads, of every job.
+        shared_dir: Used as ``$NLSMB_CACHE_DIR`` unless that is set; ``None``
+            keeps the default cache directory.
+        warmup: The import path of a function ``warmup(cfg)``, called once
+            with the job config of the first job before any job is started,
+            e.g. to fill the grid cache in ``shared_dir``.
+    """
+
+    def __init__(
+        self, processes=None, threads=1, shared_dir="/dev/shm/nlsmb", warmup=None
+    ):
+        super().__init__()
+        self.threads = threads
+        self.processes = processes or max(1, len(os.sched_getaffinity(0)) // threads)
+        self.shared_dir = shared_dir
+        self.warmup = warmup
+        self._warm = False
+        self._rows = []
+        self.config = None
+        self.task_function = None
+        self.hydra_context = None
+
+    def setup(self, *, hydra_context, task_function, config):
+        self.config = config
+        self.hydra_context = hydra_context
+        self.task_function = task_function
+
+    def launch(self, job_overrides, initial_job_idx):
+        setup_globals()
+        configure_log(self.config.hydra.hydra_logging, self.config.hydra.verbose)
+        sweep_dir = Path(str(self.config.hydra.sweep.dir))
+        sweep_dir.mkdir(parents=True, exist_ok=True)
+        if self.shared_dir is not None and os.path.isdir(
+            os.path.dirname(self.shared_dir)
+        ):
+            os.environ.setdefault("NLSMB_CACHE_DIR", self.shared_dir)
+        if job_overrides:
+            self._warmup(job_overrides[0])
+        log.info(
+            f"Launching {len(job_overrides)} jobs in {self.processes} processes "
+            f"of {self.threads} threads"
+        )
+        context = multiprocessing.get_context("fork")
+        queue = context.Queue()
+        pending = [
+            (initial_job_idx + i, list(overrides))
+            for i, overrides in enumerate(job_overrides)
+        ]
+        pending.reverse()
+        free = list(range(self.processes))
+        running = {}
+        runs = {}
+        while pending or running:
+            while pending and free:
+                slot = free.pop(0)
+                idx, overrides = pending.pop()
+                log.info(f"\t#{idx} : {' '.join(filter_overrides(overrides))}")
+                process = context.Process(
+                    target=self._run, args=(slot, idx, overrides, queue)
+                )
+                process.start()
+                running[slot] = (idx, overrides, process)
+            try:
+                slot, idx, ret = queue.get(timeout=1)
+                running.pop(slot)[2].join()
+                free.append(slot)
+                runs[idx] = ret
+            except queues.Empty:
+                # A job killed by the system (e.g. out of memory) sends back no result
+                for slot, (idx, overrides, process) in list(running.items()):
+                    if process.exitcode:
+                        ret = JobReturn(overrides=overrides, status=JobStatus.FAILED)
+                        ret.return_value = RuntimeError(
+                            f"Job #{idx} died with exit code {process.exitcode}"
+                        )
+                        running.pop(slot)
+                        free.append(slot)
+                        runs[idx] = ret
+        configure_log(self.config.hydra.hydra_logging, self.config.hydra.verbose)
+        runs = [runs[idx] for idx in sorted(runs)]
+        self._summarize(runs, sweep_dir / "summary.csv")
+        return runs
+
+    def _warmup(self, overrides):
+        """Call ``warmup`` once per launcher, e.g. once for all rungs of a
+        successive-halving sweep."""
+        if self.warmup is None or self._warm:
+            return
+        log.info(f"Warming up with {self.warmup}")
+        sweep_config = self.hydra_context.config_loader.load_sweep_config(
+            self.config, list(overrides)
+        )
+        # The config run_job passes to the task, without the hydra node
+        with read_write(sweep_config), open_dict(sweep_config):
+            del sweep_config["hydra"]
+        get_method(self.warmup)(sweep_config)
+        self._warm = True
+
+    def _run(self, slot, idx, overrides, queue):
+        ret = JobReturn(overrides=overrides, status=JobStatus.FAILED)
+        try:
+            pin(slot, self.threads)
+            sweep_config = self.hydra_context.config_loader.load_sweep_config(
+                self.config, overrides
+            )
+            with open_dict(sweep_config):
+                sweep_config.hydra.job.id = idx
+                sweep_config.hydra.job.num = idx
+            ret = run_job(
+                hydra_context=self.hydra_context,
+                task_function=self.task_function,
+                config=sweep_config,
+                job_dir_key="hydra.sweep.dir",
+                job_subdir_key="hydra.sweep.subdir",
+            )
+        except BaseException as e:
+            ret.return_value = e
+        if ret.status == JobStatus.FAILED:
+            # The exception may hold unpicklable objects, send back its text
+            ret.return_value = RuntimeError(repr(ret._return_value))
+        try:
+            pickle.dumps(ret)
+        except Exception as e:
+            ret = JobReturn(overrides=overrides, status=JobStatus.FAILED)
+            ret.return_value = RuntimeError(f"Cannot send the job result: {e!r}")
+        queue.put((slot, idx, ret))
+
+    def _summarize(self, runs, path):
+        """Add one row per job to ``path``, which keeps the rows of the
+        earlier launches, and log the table of this launch."""
+        rows = []
+        for ret in runs:
+            row = {"job": " ".join(filter_overrides(ret.overrides))}
+            if ret.status == JobStatus.COMPLETED:
+                row["status"] = "completed"
+                if isinstance(ret._return_value, dict):
+                    row.update(ret._return_value)
+            else:
+                row["status"] = "failed"
+            rows.append(row)
+        self._rows += rows
+        # Launches may have different columns, so rewrite the whole file with all
+        # the rows every time
+        columns = []
+        for row in self._rows:
+            columns += [c for c in row if c not in columns]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, columns)
+            writer.writeheader()
+            writer.writerows(self._rows)
+
+        def cell(value):
+            return f"{value:.4e}" if isinstance(value, float) else str(value)
+
+        table = [columns] + [[cell(row.get(c, "")) for c in columns] for row in rows]
+        widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+        lines = ["  ".join(v.ljust(w) for v, w in zip(line, widths)) for line in table]
+        log.info(f"Summary ({path}):\n" + "\n".join(lines))
@@ -0,0 +1 @@
+"""Hydra sweeper that searches hyperparameters by successive halving."""
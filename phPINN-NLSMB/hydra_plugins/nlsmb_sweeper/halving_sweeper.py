@@ -0,0 +1,241 @@
+"""Successive-halving hyperparameter search for ``--multirun``.
+
+A grid sweep trains every configuration for the full budget, although most
+of them are clearly worse after a small part of it.  ``HalvingSweeper``
+trains all configurations for ``min_budget`` Adam iterations, ranks them by
+the ``metric`` their jobs return (the test L2 relative error of E by
+default), and promotes the best ``1 / eta`` of them to the next rung, whose
+budget is ``eta`` times larger, up to ``max_budget`` (Li et al., "A System
+for Massively Parallel Hyperparameter Tuning", the synchronous variant).  A
+promoted configuration is not trained again from scratch: its job gets the
+checkpoint returned by its previous rung as ``resume_key`` and only the
+missing iterations as ``budget_key``.  Every job also gets ``max_budget`` as
+``schedule_key``, the length of its learning rate schedule, so that a
+configuration trained over several rungs takes the same steps as one run of
+the full budget.  The jobs of a rung are run by the configured launcher,
+e.g. in parallel by ``nlsmb_pool``.
+
+The task function must return a dict with ``metric`` and ``"checkpoint"``,
+build its schedule from ``schedule_key``, and restore the checkpoint it is
+given with its step and schedule, as ``bright_M_W.py`` does with
+``nlsmb.save_model`` and ``nlsmb.restore_model``::
+
+    python bright_M_W.py --multirun hydra/sweeper=nlsmb_halving \\
+        hidden_size=32,64,128 num_layers=4,6 lr=0.001,0.003 activate=tanh,sin
+"""
+
+import csv
+import itertools
+import logging
+import math
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from hydra.core.config_store import ConfigStore
+from hydra.core.override_parser.overrides_parser import OverridesParser
+from hydra.core.utils import JobStatus
+from hydra.errors import HydraException
+from hydra.plugins.sweeper import Sweeper
+from omegaconf import OmegaConf
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class HalvingSweeperConf:
+    _target_: str = "hydra_plugins.nlsmb_sweeper.halving_sweeper.HalvingSweeper"
+    # Adam steps of every configuration in the first rung, times eta in each
+    # rung after it, up to max_budget
+    min_budget: int = 1000
+    max_budget: int = 27000
+    eta: int = 3
+    # Rank by this error in the return value of the jobs, lower is better
+    metric: str = "E_L2"
+    # Config keys of the training steps, the total steps of the learning rate
+    # decay and the checkpoint
+    budget_key: str = "adam"
+    schedule_key: str = "schedule"
+    resume_key: str = "checkpoint"
+    # Draw this many configurations of the grid at random, null for all
+    samples: Optional[int] = None
+    seed: int = 0
+    params: Dict[str, str] = field(default_factory=dict)
+
+
+ConfigStore.instance().store(
+    group="hydra/sweeper",
+    name="nlsmb_halving",
+    node=HalvingSweeperConf,
+    provider="nlsmb",
+)
+
+
+def rung_budgets(min_budget, max_budget, eta):
+    """The cumulative budgets of the rungs, ``min_budget * eta**r`` up to and
+    including ``max_budget``."""
+    budgets = [min_budget]
+    while budgets[-1] * eta < max_budget:
+        budgets.append(budgets[-1] * eta)
+    if budgets[-1] < max_budget:
+        budgets.append(max_budget)
+    return budgets
+
+
+class HalvingSweeper(Sweeper):
+    """Successive halving over the grid of the sweep overrides.
+
+    Args:
+        min_budget: The Adam iterations of every configuration in rung 0.
+        max_budget: The Adam iterations of the configurations of the last rung.
+        eta: The budget grows by ``eta`` and the configurations shrink by
+            ``eta`` from one rung to the next.
+        metric: The key of the job's return value to minimize.
+        budget_key: The config key of the number of Adam iterations.
+        schedule_key: The config key of the number of Adam iterations the
+            learning rate schedule is built for.
+        resume_key: The config key of the checkpoint to resume from.
+        samples: Search a random subset of this many configurations of the
+            grid instead of all of it.
+        seed: Seed of the subset.
+        params: Sweep overrides from the config, as in the basic sweeper.
+    """
+
+    def __init__(
+        self,
+        min_budget=1000,
+        max_budget=27000,
+        eta=3,
+        metric="E_L2",
+        budget_key="adam",
+        schedule_key="schedule",
+        resume_key="checkpoint",
+        samples=None,
+        seed=0,
+        params=None,
+    ):
+        super().__init__()
+        if eta < 2:
+            raise HydraException("eta must be at least 2")
+        self.budgets = rung_budgets(min_budget, max_budget, eta)
+        self.eta = eta
+        self.metric = metric
+        self.budget_key = budget_key
+        self.schedule_key = schedule_key
+        self.resume_key = resume_key
+        self.samples = samples
+        self.seed = seed
+        self.params = params or {}
+        self.config = None
+        self.launcher = None
+        self.hydra_context = None
+
+    def setup(self, *, hydra_context, task_function, config):
+        from hydra.core.plugins import Plugins
+
+        self.hydra_context = hydra_context
+        self.config = config
+        self.launcher = Plugins.instance().instantiate_launcher(
+            hydra_context=hydra_context, task_function=task_function, config=config
+        )
+
+    def configurations(self, arguments):
+        """The override lists of the configurations to search."""
+        parser = OverridesParser.create(config_loader=self.hydra_context.config_loader)
+        arguments = [f"{k}={v}" for k, v in self.params.items()] + list(arguments)
+        choices = []
+        for override in parser.parse_overrides(arguments):
+            key = override.get_key_element()
+            if key.lstrip("+~") in (
+                self.budget_key,
+                self.schedule_key,
+                self.resume_key,
+            ):
+                log.warning(f"Ignoring {key}: it is set by the sweeper")
+                continue
+            if override.is_sweep_override():
+                if not override.is_discrete_sweep():
+                    raise HydraException(
+                        f"{type(self).__name__} only supports discrete sweeps, "
+                        f"not {override.input_line}"
+                    )
+                choices.append([f"{key}={v}" for v in override.sweep_string_iterator()])
+            else:
+                choices.append([f"{key}={override.get_value_element_as_str()}"])
+        grid = [list(c) for c in itertools.product(*choices)]
+        if self.samples is not None and self.samples < len(grid):
+            grid = random.Random(self.seed).sample(grid, self.samples)
+        return grid
+
+    def sweep(self, arguments):
+        sweep_dir = Path(str(self.config.hydra.sweep.dir))
+        sweep_dir.mkdir(parents=True, exist_ok=True)
+        OmegaConf.save(self.config, sweep_dir / "multirun.yaml")
+        # Every surviving configuration: (overrides, checkpoint of the last rung)
+        alive = [(c, None) for c in self.configurations(arguments)]
+        log.info(
+            f"Successive halving of {len(alive)} configurations over budgets "
+            f"{self.budgets}"
+        )
+        history = []
+        returns = []
+        initial_job_idx = 0
+        done = 0
+        for rung, budget in enumerate(self.budgets):
+            batch = []
+            for overrides, checkpoint in alive:
+                job = overrides + [
+                    f"{self.budget_key}={budget - done}",
+                    f"{self.schedule_key}={self.budgets[-1]}",
+                ]
+                if checkpoint is not None:
+                    path = str(checkpoint).replace("\\", "\\\\").replace("'", "\\'")
+                    job.append(f"{self.resume_key}='{path}'")
+                batch.append(job)
+            self.validate_batch_is_legal(batch)
+            log.info(f"Rung {rung}: {len(batch)} configurations, budget {budget}")
+            results = self.launcher.launch(batch, initial_job_idx=initial_job_idx)
+            initial_job_idx += len(batch)
+            returns.append(results)
+            done = budget
+
+            scored = []
+            for (overrides, _), ret in zip(alive, results):
+                score, checkpoint = math.inf, None
+                if ret.status == JobStatus.COMPLETED and isinstance(
+                    ret._return_value, dict
+                ):
+                    score = float(ret._return_value.get(self.metric, math.inf))
+                    checkpoint = ret._return_value.get("checkpoint")
+                else:
+                    log.warning(f"Job failed: {' '.join(overrides)}")
+                history.append((rung, budget, " ".join(overrides), score))
+                scored.append((score, overrides, checkpoint))
+            scored.sort(key=lambda s: s[0])
+            keep = max(1, len(scored) // self.eta)
+            alive = [
+                (overrides, checkpoint)
+                for score, overrides, checkpoint in scored[:keep]
+                if math.isfinite(score) and checkpoint is not None
+            ]
+            self._write(history, sweep_dir / "halving.csv")
+            if not alive:
+                raise HydraException(f"All configurations of rung {rung} failed")
+            if rung + 1 < len(self.budgets):
+                log.info(
+                    f"Promoting {len(alive)} of {len(scored)}: best {self.metric} "
+                    f"{scored[0][0]:.4e} ({' '.join(scored[0][1])})"
+                )
+        best_score, best = scored[0][0], scored[0][1]
+        log.info(
+            f"Best configuration after {self.budgets[-1]} iterations: "
+            f"{' '.join(best)} ({self.metric} = {best_score:.4e})"
+        )
+        return returns
+
+    def _write(self, history, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["rung", "budget", "configuration", self.metric])
+            writer.writerows(history)
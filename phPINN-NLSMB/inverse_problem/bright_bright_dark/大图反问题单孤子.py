@@ -152,30 +152,9 @@ with open(file0, "r", encoding="utf-8") as dat_file:
             continue
         row = [field.strip() for field in line.split(" ")]
         c1 = float(row[0])
-        c2 = float(
-            float(row[1])
-            + float(row[2])
-            + float(row[3])
-            + float(row[4])
-            + float(row[5])
-            + float(row[6])
-            + float(row[7])
-            + float(row[8])
-            + float(row[9])
-            + float(row[10])
-        )
-        c3 = float(
-            float(row[11])
-            + float(row[12])
-            + float(row[13])
-            + float(row[14])
-            + float(row[15])
-            + float(row[16])
-            + float(row[17])
-            + float(row[18])
-            + float(row[19])
-            + float(row[20])
-        )
+        loss_len = (len(row) - 1) // 2
+        c2 = sum(float(v) for v in row[1 : 1 + loss_len])
+        c3 = sum(float(v) for v in row[1 + loss_len : 1 + loss_len + loss_len])
         iterations.append(c1)
         loss_train.append(c2)
         loss_test.append(c3)
@@ -191,30 +170,9 @@ with open(file1, "r", encoding="utf-8") as dat_file:
             continue
         row = [field.strip() for field in line.split(" ")]
         c1 = float(row[0])
-        c2 = float(
-            float(row[1])
-            + float(row[2])
-            + float(row[3])
-            + float(row[4])
-            + float(row[5])
-            + float(row[6])
-            + float(row[7])
-            + float(row[8])
-            + float(row[9])
-            + float(row[10])
-        )
-        c3 = float(
-            float(row[11])
-            + float(row[12])
-            + float(row[13])
-            + float(row[14])
-            + float(row[15])
-            + float(row[16])
-            + float(row[17])
-            + float(row[18])
-            + float(row[19])
-            + float(row[20])
-        )
+        loss_len = (len(row) - 1) // 2
+        c2 = sum(float(v) for v in row[1 : 1 + loss_len])
+        c3 = sum(float(v) for v in row[1 + loss_len : 1 + loss_len + loss_len])
         iterations.append(c1)
         loss_train.append(c2)
         loss_test.append(c3)
@@ -228,30 +186,9 @@ with open(file3, "r", encoding="utf-8") as dat_file:
             continue
         row = [field.strip() for field in line.split(" ")]
         c1 = float(row[0])
-        c2 = float(
-            float(row[1])
-            + float(row[2])
-            + float(row[3])
-            + float(row[4])
-            + float(row[5])
-            + float(row[6])
-            + float(row[7])
-            + float(row[8])
-            + float(row[9])
-            + float(row[10])
-        )
-        c3 = float(
-            float(row[11])
-            + float(row[12])
-            + float(row[13])
-            + float(row[14])
-            + float(row[15])
-            + float(row[16])
-            + float(row[17])
-            + float(row[18])
-            + float(row[19])
-            + float(row[20])
-        )
+        loss_len = (len(row) - 1) // 2
+        c2 = sum(float(v) for v in row[1 : 1 + loss_len])
+        c3 = sum(float(v) for v in row[1 + loss_len : 1 + loss_len + loss_len])
         iterations.append(c1)
         loss_train.append(c2)
         loss_test.append(c3)
@@ -265,30 +202,9 @@ with open(file5, "r", encoding="utf-8") as dat_file:
             continue
         row = [field.strip() for field in line.split(" ")]
         c1 = float(row[0])
-        c2 = float(
-            float(row[1])
-            + float(row[2])
-            + float(row[3])
-            + float(row[4])
-            + float(row[5])
-            + float(row[6])
-            + float(row[7])
-            + float(row[8])
-            + float(row[9])
-            + float(row[10])
-        )
-        c3 = float(
-            float(row[11])
-            + float(row[12])
-            + float(row[13])
-            + float(row[14])
-            + float(row[15])
-            + float(row[16])
-            + float(row[17])
-            + float(row[18])
-            + float(row[19])
-            + float(row[20])
-        )
+        loss_len = (len(row) - 1) // 2
+        c2 = sum(float(v) for v in row[1 : 1 + loss_len])
+        c3 = sum(float(v) for v in row[1 + loss_len : 1 + loss_len + loss_len])
         iterations.append(c1)
         loss_train.append(c2)
         loss_test.append(c3)
@@ -302,30 +218,9 @@ with open(file10, "r", encoding="utf-8") as dat_file:
             continue
         row = [field.strip() for field in line.split(" ")]
         c1 = float(row[0])
-        c2 = float(
-            float(row[1])
-            + float(row[2])
-            + float(row[3])
-            + float(row[4])
-            + float(row[5])
-            + float(row[6])
-            + float(row[7])
-            + float(row[8])
-            + float(row[9])
-            + float(row[10])
-        )
-        c3 = float(
-            float(row[11])
-            + float(row[12])
-            + float(row[13])
-            + float(row[14])
-            + float(row[15])
-            + float(row[16])
-            + float(row[17])
-            + float(row[18])
-            + float(row[19])
-            + float(row[20])
-        )
+        loss_len = (len(row) - 1) // 2
+        c2 = sum(float(v) for v in row[1 : 1 + loss_len])
+        c3 = sum(float(v) for v in row[1 + loss_len : 1 + loss_len + loss_len])
         iterations.append(c1)
         loss_train.append(c2)
         loss_test.append(c3)
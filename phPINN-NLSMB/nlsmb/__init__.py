@@ -0,0 +1,32 @@
+"""Shared building blocks for the phPINN NLS-MB scripts."""
+
+from .anchors import AnchorSet
+from .cases import TWO_SOLITONS
+from .checkpoint import Checkpointer, restore_model, save_model
+from .chunked import (
+    L2RelativeError,
+    TopK,
+    evaluate_chunked,
+    l2_relative_error,
+    open_output,
+    pde_residual,
+    residual_top_k,
+    rows_per_chunk,
+)
+from .closed_form import ClosedFormEngine, ExpSum, Rational
+from .decomposition import DomainDecomposition
+from .derivatives import NLSMBDerivatives
+from .ensemble import EnsembleBC, EnsembleFNN, ensemble_report
+from .grid_cache import ExactGrid, default_cache_dir, exact_grid, open_exact_grid
+from .hard_constraint import HardConstraint
+from .marching import CausalWeights, TimeMarching
+from .minibatch import MiniBatch, collocation_batches
+from .networks import SeparableNet
+from .observation import ObservationBC
+from .parallel import DataParallel
+from .pruning import CollocationPruner
+from .rad import RADResampler
+from .resampler import AsyncResampler
+from .run_cache import RunCache
+from .switching import AdamLBFGS, Plateau
+from .weighting import AdaptiveWeights, TimeToTarget, compare_weightings
@@ -0,0 +1,89 @@
+"""Bounded, deduplicated RAR anchor set.
+
+``data.add_anchors`` only appends: every RAR round adds its 100 points to the
+training set for good, and around a sharp peak such as that of the rogue
+wave many of them are almost the same point.  ``AnchorSet`` filters the new
+points against the existing anchors and each other with a KD-tree, keeps at
+most ``max_anchors`` of them, and when over budget drops those with the
+lowest residual.
+"""
+
+import deepxde as dde
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .chunked import pde_residual
+from .minibatch import _set_domain_points
+
+__all__ = ["AnchorSet"]
+
+
+class AnchorSet:
+    """The anchors of ``model.data``, managed in place of ``data.add_anchors``.
+
+    Args:
+        model: The ``dde.Model``.
+        operator: The PDE, ``operator(x, y)`` returns a list of residuals; the
+            residual of an anchor is ``sum_i |operator_i|`` as in RAR.
+        min_distance: New points closer than this to an anchor, or to a new
+            point of larger residual, are rejected.
+        max_anchors: The anchor budget.
+    """
+
+    def __init__(self, model, operator, min_distance=1e-2, max_anchors=300):
+        self.model = model
+        self.operator = operator
+        self.min_distance = min_distance
+        self.max_anchors = max_anchors
+        self.residuals = None
+
+    def add(self, X, residuals=None):
+        """Add the points ``X`` to the anchors; returns how many of them are kept.
+
+        The residuals of the current anchors are re-evaluated as well, so that
+        the eviction uses the residuals of the network being trained.
+
+        Args:
+            X: The new points.
+            residuals: The residuals of ``X`` if already known, e.g. from
+                ``residual_top_k(..., return_residuals=True)``; otherwise they
+                are evaluated.
+        """
+        data = self.model.data
+        old = data.anchors
+        X = np.asarray(X, dtype=dde.config.real(np))
+        if residuals is None:
+            res = pde_residual(self.model, self.operator, X)
+        else:
+            res = np.asarray(residuals, dtype=float).ravel()
+        order = np.argsort(-res)
+        X, res = X[order], res[order]
+
+        keep = np.ones(len(X), dtype=bool)
+        if old is not None:
+            distance, _ = cKDTree(old).query(X, distance_upper_bound=self.min_distance)
+            keep &= distance >= self.min_distance
+        # Greedy in decreasing residual: a kept point excludes the weaker points
+        # in its neighborhood
+        for i, neighbors in enumerate(
+            cKDTree(X).query_ball_point(X, self.min_distance)
+        ):
+            if keep[i]:
+                keep[[j for j in neighbors if j > i]] = False
+        X, res = X[keep], res[keep]
+        added = len(X)
+
+        if old is not None:
+            X = np.vstack((X, old))
+            res = np.concatenate((res, pde_residual(self.model, self.operator, old)))
+        if len(X) > self.max_anchors:
+            best = np.sort(np.argpartition(res, -self.max_anchors)[-self.max_anchors :])
+            added = int(np.sum(best < added))
+            X, res = X[best], res[best]
+        self.residuals = res
+
+        # add_anchors puts the anchors first in train_x_all
+        domain = data.train_x_all[0 if old is None else len(old) :]
+        data.anchors = X
+        _set_domain_points(data, domain)
+        return added
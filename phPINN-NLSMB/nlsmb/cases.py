@@ -0,0 +1,101 @@
+"""Closed-form exact solutions of the NLS-MB cases, compiled once."""
+
+from .closed_form import ClosedFormEngine, ExpSum, Rational
+
+__all__ = ["TWO_SOLITONS"]
+
+I = 1j
+
+
+def _two_solitons():
+    # Each term is (coef, rate_t, rate_z, shift) of coef * exp(rate_t * t + rate_z * z + shift)
+    e1 = (2 - I, -672 / 377 + 176 * I / 377, 2)
+    e2 = (2 + I, -(672 / 377 + 176 * I / 377), 2)
+    e3 = (2, -58 / 13, 2)
+    e4 = (2, 26 / 29, 2)
+    e5 = (4, -1344 / 377, 4)
+    f1 = (3 - I / 2, -(1513 / 377 + 73 * I / 116), 3)
+    f2 = (3 + I / 2, -(503 / 377 + 57 * I / 52), 3)
+    f3 = (1 + I / 2, -(29 / 13 + 57 * I / 52), 1)
+    f4 = (1 - I / 2, 13 / 29 - 73 * I / 116, 1)
+
+    denominator = ExpSum(
+        [
+            (48 + 64 * I, *e1),
+            (48 - 64 * I, *e2),
+            (100, *e3),
+            (100, *e4),
+            (1, *e5),
+        ],
+        400,
+    )
+    E = Rational(
+        [
+            ExpSum(
+                [
+                    (-(12 + 16 * I), *f1),
+                    (-12 + 16 * I, *f2),
+                    (400, *f3),
+                    (400, *f4),
+                ]
+            )
+        ],
+        [(denominator, 1)],
+    )
+    p = Rational(
+        [
+            ExpSum(
+                [
+                    (-14384 + 42688 * I, *e1),
+                    (20176 + 832 * I, *e2),
+                    (14500 + 34800 * I, *e3),
+                    (27300 + 26000 * I, *e4),
+                    (-135 + 352 * I, *e5),
+                ],
+                150800,
+            ),
+            ExpSum(
+                [
+                    (206 + 283 * I, *f1),
+                    (398 - 339 * I, *f2),
+                    (-5800 - 8700 * I, *f3),
+                    (-2600 - 6500 * I, *f4),
+                ]
+            ),
+        ],
+        [(denominator, 2)],
+        scale=16 / 142129,
+    )
+    eta = Rational(
+        [
+            ExpSum(
+                [
+                    (675584 + 2316288 * I, 4 + 2 * I, -(1344 / 377 + 352 * I / 377), 4),
+                    (-(3222400 + 6003200 * I), 4 - I, -334 / 377 + 176 * I / 377, 4),
+                    (9843200 + 14182400 * I, *e2),
+                    (-(4860800 + 4774400 * I), 4 - I, -2354 / 377 + 176 * I / 377, 4),
+                    (-(40928 + 13696 * I), 6 + I, -(2016 / 377 + 176 * I / 377), 6),
+                    (-4860800 + 4774400 * I, 4 + I, -(2354 / 377 + 176 * I / 377), 4),
+                    (-3222400 + 6003200 * I, 4 + I, -(334 / 377 + 176 * I / 377), 4),
+                    (675584 - 2316288 * I, 4 - 2 * I, -1344 / 377 + 352 * I / 377, 4),
+                    (9843200 - 14182400 * I, *e1),
+                    (-40928 + 13696 * I, 6 - I, -2016 / 377 + 176 * I / 377, 6),
+                    (-377, 8, -2688 / 377, 8),
+                    (6960000, *e3),
+                    (-13520000, *e4),
+                    (-3770000, 4, 52 / 29, 4),
+                    (-3770000, 4, -116 / 13, 4),
+                    (-13844800, *e5),
+                    (-33800, 6, -3026 / 377, 6),
+                    (17400, 6, -1006 / 377, 6),
+                ],
+                -60320000,
+            )
+        ],
+        [(denominator, 2)],
+        scale=1 / 377,
+    )
+    return ClosedFormEngine({"E": E, "p": p, "eta": eta})
+
+
+TWO_SOLITONS = _two_solitons()
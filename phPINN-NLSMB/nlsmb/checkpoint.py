@@ -0,0 +1,311 @@
+"""Resumable training state, written in the background and deduplicated.
+
+``model.train(model_save_path=...)`` only saves the network and optimizer,
+on the training thread, and a run killed during 30000 Adam steps and an
+L-BFGS phase of unbounded length starts again from scratch.  ``Checkpointer``
+snapshots everything a run needs to continue: the network, the optimizer
+state (Adam moments, L-BFGS history and iteration count), the learning rate
+schedule, the step, the loss history, the random number generators, the
+collocation and anchor points, and a free dict of the script's own state
+such as the training phase or the RAR round.
+
+Taking a snapshot only copies the arrays; a background thread hashes them
+and writes every array once, as ``objects/<sha1>.npy``, so that arrays that
+do not change between checkpoints, such as the anchors or the collocation
+points between two resamplings, are not written again.  A checkpoint is a
+small pickled manifest that refers to its arrays by hash.
+
+``save_model`` and ``restore_model`` are the light version for any backend:
+``model.save`` and ``model.restore`` plus the step and the learning rate
+schedule, so that a run continued from the saved model takes the same steps
+as one that was never interrupted.
+"""
+
+import glob
+import hashlib
+import os
+import pickle
+import random
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import deepxde as dde
+import numpy as np
+from deepxde.callbacks import Callback
+
+from .minibatch import _set_domain_points
+
+__all__ = ["Checkpointer", "restore_model", "save_model"]
+
+
+class _Tensor:
+    """A snapshot of a ``torch`` tensor, restored as a tensor."""
+
+    def __init__(self, array):
+        self.array = array
+
+
+class _Ref:
+    """A stored array in a manifest."""
+
+    def __init__(self, digest, tensor):
+        self.digest = digest
+        self.tensor = tensor
+
+
+def _map(tree, fn):
+    if isinstance(tree, dict):
+        return {k: _map(v, fn) for k, v in tree.items()}
+    if isinstance(tree, (list, tuple)):
+        return type(tree)(_map(v, fn) for v in tree)
+    return fn(tree)
+
+
+def _copy(value):
+    import torch
+
+    if isinstance(value, torch.Tensor):
+        return _Tensor(value.detach().cpu().numpy().copy())
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    return value
+
+
+class Checkpointer(Callback):
+    """Every ``period`` steps, write the training state to ``directory``.
+
+    ``latest`` returns the newest checkpoint and ``restore`` loads it into a
+    compiled model, after which ``model.train`` continues from its step.  A
+    checkpoint is also taken when training ends.  Snapshots are skipped while
+    the previous one is still being written.  PyTorch backend only.
+
+    Args:
+        directory: Where the manifests and arrays are stored.
+        period: Checkpoint every ``period`` steps; an L-BFGS epoch is
+            ``iter_per_step`` steps.
+        keep: The number of newest checkpoints kept; the arrays only they
+            refer to are deleted with them.
+        key: A hash of the code that trains, such as ``RunCache(...).key``,
+            saved with every checkpoint; ``restore`` refuses checkpoints of
+            another key.
+
+    Attributes:
+        state: A dict saved with every checkpoint, e.g. ``{"phase": "adam"}``.
+    """
+
+    def __init__(self, directory, period=1000, keep=2, key=None):
+        super().__init__()
+        if dde.backend.backend_name != "pytorch":
+            raise ValueError("Checkpointer needs the PyTorch backend")
+        self.directory = directory
+        self.period = period
+        self.keep = keep
+        self.key = key
+        self.state = {}
+        self.last_step = None
+        self._lbfgs_offset = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = None
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+
+    def on_train_begin(self):
+        # The L-BFGS loop of dde counts the n_iter of the optimizer from 0, so a
+        # restored n_iter would be added to the step again
+        self.model.train_state.step -= self._lbfgs_offset
+        self._lbfgs_offset = 0
+        if self.last_step is None:
+            self.last_step = self.model.train_state.step
+
+    def on_epoch_end(self):
+        if self.model.train_state.step - self.last_step >= self.period:
+            self.save()
+
+    def on_train_end(self):
+        self.save(wait=True)
+
+    def save(self, wait=False):
+        """Snapshot the training state and write it in the background; with
+        ``wait=False`` nothing is done while the previous write is running."""
+        if self._pending is not None and not self._pending.done() and not wait:
+            return
+        if self._pending is not None:
+            self._pending.result()
+        self.last_step = self.model.train_state.step
+        self._pending = self._executor.submit(self._write, self.snapshot())
+
+    def snapshot(self):
+        """The training state, with copies of all arrays."""
+        import torch
+
+        model = self.model
+        ts = model.train_state
+        history = model.losshistory
+        data = model.data
+        scheduler = getattr(model, "lr_scheduler", None)
+        snapshot = {
+            "step": ts.step,
+            "best": (ts.best_step, ts.best_loss_train, ts.best_loss_test),
+            "net": model.net.state_dict(),
+            "optimizer": model.opt.state_dict(),
+            "lr_scheduler": None if scheduler is None else scheduler.state_dict(),
+            # The loss history of one array per row as 2D arrays, rather than a
+            # file for every small array
+            "losshistory": (
+                np.asarray(history.steps),
+                np.asarray(history.loss_train),
+                np.asarray(history.loss_test),
+                np.asarray(history.metrics_test),
+            ),
+            "rng": (random.getstate(), np.random.get_state(), torch.get_rng_state()),
+            "train_x_all": data.train_x_all,
+            "anchors": data.anchors,
+            "state": self.state,
+            "key": self.key,
+        }
+        return _map(snapshot, _copy)
+
+    def _write(self, snapshot):
+        def store(value):
+            if not isinstance(value, (np.ndarray, _Tensor)):
+                return value
+            array = value.array if isinstance(value, _Tensor) else value
+            digest = hashlib.sha1(
+                f"{array.dtype.str}{array.shape}".encode() + array.tobytes()
+            ).hexdigest()
+            path = self._object(digest)
+            if not os.path.exists(path):
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    np.save(f, array)
+                os.replace(tmp, path)
+            return _Ref(digest, isinstance(value, _Tensor))
+
+        manifest = _map(snapshot, store)
+        path = os.path.join(self.directory, f"checkpoint-{snapshot['step']:09d}.pkl")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(manifest, f)
+        os.replace(tmp, path)
+        self._collect()
+
+    def _object(self, digest):
+        return os.path.join(self.directory, "objects", f"{digest}.npy")
+
+    def _manifests(self):
+        return sorted(glob.glob(os.path.join(self.directory, "checkpoint-*.pkl")))
+
+    def _collect(self):
+        """Delete all but the ``keep`` newest checkpoints and their arrays."""
+        manifests = self._manifests()
+        for path in manifests[: -self.keep]:
+            os.remove(path)
+        used = set()
+        for path in manifests[-self.keep :]:
+            with open(path, "rb") as f:
+                _map(
+                    pickle.load(f),
+                    lambda v: used.add(v.digest) if isinstance(v, _Ref) else None,
+                )
+        for path in glob.glob(os.path.join(self.directory, "objects", "*.npy")):
+            if os.path.basename(path)[:-4] not in used:
+                os.remove(path)
+
+    def latest(self):
+        """The newest checkpoint, or ``None`` if there is none."""
+        import torch
+
+        manifests = self._manifests()
+        if not manifests:
+            return None
+        with open(manifests[-1], "rb") as f:
+            manifest = pickle.load(f)
+
+        def load(value):
+            if not isinstance(value, _Ref):
+                return value
+            array = np.load(self._object(value.digest))
+            return torch.from_numpy(array) if value.tensor else array
+
+        return _map(manifest, load)
+
+    def restore(self, model, checkpoint):
+        """Load ``checkpoint`` into ``model``, which must be compiled with the
+        optimizer the checkpoint was taken with, and into ``self.state``."""
+        import torch
+
+        if checkpoint.get("key") != self.key:
+            raise ValueError(
+                f"The checkpoint was taken with key {checkpoint.get('key')}, "
+                f"not {self.key}"
+            )
+        model.net.load_state_dict(checkpoint["net"])
+        model.opt.load_state_dict(checkpoint["optimizer"])
+        if checkpoint["lr_scheduler"] is not None and model.lr_scheduler is not None:
+            model.lr_scheduler.load_state_dict(checkpoint["lr_scheduler"])
+        ts = model.train_state
+        ts.step = checkpoint["step"]
+        ts.best_step, ts.best_loss_train, ts.best_loss_test = checkpoint["best"]
+        history = model.losshistory
+        steps, loss_train, loss_test, metrics_test = checkpoint["losshistory"]
+        history.steps = steps.tolist()
+        history.loss_train = list(loss_train)
+        history.loss_test = list(loss_test)
+        history.metrics_test = list(metrics_test)
+        python, numpy, torch_rng = checkpoint["rng"]
+        random.setstate(python)
+        np.random.set_state(numpy)
+        torch.set_rng_state(torch_rng)
+        data = model.data
+        anchors = checkpoint["anchors"]
+        data.anchors = anchors
+        n = 0 if anchors is None else len(anchors)
+        _set_domain_points(data, checkpoint["train_x_all"][n:])
+        ts.set_data_train(data.train_x, data.train_y, data.train_aux_vars)
+        optimizer_state = checkpoint["optimizer"]["state"]
+        if 0 in optimizer_state and "n_iter" in optimizer_state[0]:
+            self._lbfgs_offset = optimizer_state[0]["n_iter"]
+        self.state = dict(checkpoint["state"])
+        self.last_step = ts.step
+
+    def close(self):
+        """Wait for the last checkpoint to be written."""
+        self._executor.shutdown(wait=True)
+        if self._pending is not None:
+            self._pending.result()
+
+    def clear(self):
+        """Delete all checkpoints."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(os.path.join(self.directory, "objects"), exist_ok=True)
+
+
+def save_model(model, save_path):
+    """``model.save(save_path)``, plus the step and the state of the learning
+    rate schedule in ``<path>.state.pkl``; returns the path of the model."""
+    path = model.save(save_path)
+    scheduler = getattr(model, "lr_scheduler", None)
+    state = {
+        "step": model.train_state.step,
+        "lr_scheduler": None if scheduler is None else scheduler.state_dict(),
+    }
+    with open(f"{path}.state.pkl", "wb") as f:
+        pickle.dump(state, f)
+    return path
+
+
+def restore_model(model, save_path):
+    """``model.restore(save_path)`` of a model saved by ``save_model``, which
+    also restores its step and learning rate schedule.  ``model`` must be
+    compiled as when it was saved, with the same ``decay``."""
+    model.restore(save_path)
+    path = f"{save_path}.state.pkl"
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    model.train_state.step = state["step"]
+    scheduler = getattr(model, "lr_scheduler", None)
+    if scheduler is not None and state["lr_scheduler"] is not None:
+        # torch schedulers load with load_state_dict, paddle ones with set_state_dict
+        load = getattr(scheduler, "load_state_dict", None) or scheduler.set_state_dict
+        load(state["lr_scheduler"])
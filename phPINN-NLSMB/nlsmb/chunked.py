@@ -0,0 +1,220 @@
+"""Bounded-memory evaluation over large point sets.
+
+Evaluating a closed form on a whole ``nx * nt`` grid in one shot creates many
+full-size complex temporaries, so the peak memory is a large multiple of the
+result.  The helpers here stream the points through the function in blocks
+whose size is chosen from a memory cap, write each block straight into a
+preallocated (possibly memory-mapped) output, and compute L2 errors block by
+block.  ``residual_top_k`` does the same for the RAR candidate search: it keeps
+only the ``k`` largest residuals seen so far, so its memory does not grow with
+the number of candidates.
+"""
+
+import tracemalloc
+
+import numpy as np
+
+__all__ = [
+    "DEFAULT_MAX_MEMORY",
+    "rows_per_chunk",
+    "evaluate_chunked",
+    "open_output",
+    "L2RelativeError",
+    "l2_relative_error",
+    "TopK",
+    "pde_residual",
+    "residual_top_k",
+]
+
+DEFAULT_MAX_MEMORY = 256 * 2**20
+
+
+def rows_per_chunk(fn, probe, max_memory=DEFAULT_MAX_MEMORY, min_rows=1):
+    """Number of input rows per block so that ``fn`` stays under ``max_memory``.
+
+    The peak memory of ``fn(probe)`` is measured with ``tracemalloc`` (NumPy
+    reports its allocations to it) and scaled linearly in the number of rows.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn(probe)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    if not tracing:
+        tracemalloc.stop()
+    per_row = max(peak / len(probe), 1)
+    return max(min_rows, int(max_memory // per_row))
+
+
+def open_output(path, shape, dtype=np.float64):
+    """A writable memory-mapped ``.npy`` file to be filled block by block."""
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+
+def evaluate_chunked(
+    fn, X, out=None, max_memory=DEFAULT_MAX_MEMORY, chunk_size=None, probe_size=256
+):
+    """Evaluate ``fn`` on the rows of ``X`` block by block.
+
+    Args:
+        fn: ``fn(X_block)`` returns an array, or a tuple of arrays, whose first
+            dimension is the number of rows of ``X_block``.
+        X: The input points, e.g. ``X_star``. A memory-mapped array works.
+        out: A preallocated array (or tuple of arrays, matching the return value
+            of ``fn``) to write into, e.g. from ``open_output``. If ``None``,
+            in-memory arrays are allocated.
+        max_memory: Approximate cap in bytes on the temporaries of one block.
+        chunk_size: The number of rows per block. Overrides ``max_memory``.
+
+    Returns:
+        ``out``.
+    """
+    n = len(X)
+    probe = np.asarray(X[: min(probe_size, n)])
+    if chunk_size is None:
+        chunk_size = rows_per_chunk(fn, probe, max_memory)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        values = fn(np.asarray(X[start:stop]))
+        multiple = isinstance(values, (tuple, list))
+        values = tuple(values) if multiple else (values,)
+        if out is None:
+            out = tuple(np.empty((n,) + v.shape[1:], dtype=v.dtype) for v in values)
+            out = out if multiple else out[0]
+        for o, v in zip(out if multiple else (out,), values):
+            o[start:stop] = v
+    return out
+
+
+class L2RelativeError:
+    """``||y_true - y_pred|| / ||y_true||`` accumulated over blocks."""
+
+    def __init__(self):
+        self._error = 0.0
+        self._norm = 0.0
+
+    def update(self, y_true, y_pred):
+        y_true = np.asarray(y_true)
+        self._error += float(np.sum(np.abs(y_true - y_pred) ** 2))
+        self._norm += float(np.sum(np.abs(y_true) ** 2))
+
+    @property
+    def value(self):
+        return np.sqrt(self._error / self._norm)
+
+
+def l2_relative_error(y_true, y_pred, chunk_size=2**16):
+    """Same as ``dde.metrics.l2_relative_error``, reading the inputs in blocks."""
+    metric = L2RelativeError()
+    for start in range(0, len(y_true), chunk_size):
+        stop = start + chunk_size
+        metric.update(y_true[start:stop], np.asarray(y_pred[start:stop]))
+    return metric.value
+
+
+class TopK:
+    """The ``k`` rows with the largest scores, accumulated over blocks.
+
+    Every ``update`` keeps the ``k`` best of the current ones and the new block
+    with ``np.argpartition``, so a stream of ``N`` rows costs ``O(N)`` and the
+    memory is that of ``k`` rows plus one block.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.rows = None
+        self.scores = np.empty(0)
+        self._total = 0.0
+        self._count = 0
+
+    def update(self, rows, scores):
+        scores = np.asarray(scores).ravel()
+        self._total += float(np.sum(scores))
+        self._count += len(scores)
+        if self.rows is not None:
+            rows = np.concatenate((self.rows, rows))
+            scores = np.concatenate((self.scores, scores))
+        if len(scores) > self.k:
+            best = np.argpartition(scores, -self.k)[-self.k :]
+            rows, scores = rows[best], scores[best]
+        self.rows, self.scores = rows, scores
+
+    @property
+    def value(self):
+        """``(rows, scores)`` in increasing order of the score, like the tail of
+        ``np.argsort``."""
+        order = np.argsort(self.scores)
+        return self.rows[order], self.scores[order]
+
+    @property
+    def mean(self):
+        """The mean score of all rows seen."""
+        return self._total / self._count
+
+
+def residual_top_k(
+    model,
+    operator,
+    points,
+    k,
+    num_points=None,
+    chunk_size=2**14,
+    return_residuals=False,
+):
+    """The ``k`` points with the largest residual ``sum_i |operator_i|`` for RAR.
+
+    The residuals are evaluated by ``model.predict(..., operator=operator)`` one
+    block of ``chunk_size`` points at a time, so neither the derivative graph
+    nor the residual array of the whole candidate set is ever built.
+
+    Args:
+        model: The ``dde.Model``.
+        operator: The PDE, ``operator(x, y)`` returns a list of residuals.
+        points: The ``(N, d)`` candidate points, or a function such as
+            ``geomtime.random_points`` that draws ``n`` of them, called once per
+            block so that the candidates are never all in memory.
+        k: The number of points to return.
+        num_points: The number of candidates to draw if ``points`` is a function.
+        chunk_size: The number of points per block.
+        return_residuals: Also return the ``(k,)`` residuals of the points,
+            e.g. for ``AnchorSet.add``.
+
+    Returns:
+        ``(X, mean)``: the ``(k, d)`` points, in increasing order of the
+        residual, and the mean residual over all candidates; with
+        ``return_residuals``, ``(X, mean, residuals)``.
+    """
+    if callable(points):
+        blocks = (
+            points(min(chunk_size, num_points - start))
+            for start in range(0, num_points, chunk_size)
+        )
+    else:
+        blocks = (
+            points[start : start + chunk_size]
+            for start in range(0, len(points), chunk_size)
+        )
+    top = TopK(k)
+    for X in blocks:
+        X = np.asarray(X)
+        top.update(X, _residual(model, operator, X))
+    X, residuals = top.value
+    if return_residuals:
+        return X, top.mean, residuals
+    return X, top.mean
+
+
+def _residual(model, operator, X):
+    f = model.predict(X, operator=operator)
+    # A residual may have several columns, e.g. one per ensemble member
+    return np.sum(np.absolute(np.array(f)), axis=0).reshape(len(X), -1).sum(1)
+
+
+def pde_residual(model, operator, X, chunk_size=2**14):
+    """The ``(N,)`` residuals ``sum_i |operator_i|`` of the RAR loops at the rows
+    of ``X``, evaluated block by block."""
+    return evaluate_chunked(
+        lambda block: _residual(model, operator, block), X, chunk_size=chunk_size
+    )
@@ -0,0 +1,332 @@
+"""Compile-once evaluation of closed-form NLS-MB solutions.
+
+Most of the exact solutions used in this project are rational functions of
+exponentials ``exp(a * t + b * z + d)`` with complex ``a, b, d``.  Written out
+by hand, every copy of such an expression re-evaluates the same exponentials
+many times.  ``ClosedFormEngine`` takes each closed form once, deduplicates the
+exponential basis (a term and its complex conjugate share one evaluation),
+collects all linear combinations into a single matrix product and emits
+vectorized evaluators for NumPy and the deepxde tensor backends.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+__all__ = ["ExpSum", "Rational", "ClosedFormEngine"]
+
+_DIGITS = 12
+
+
+class ExpSum:
+    """``const + sum_k coef_k * exp(rate_t_k * t + rate_z_k * z + shift_k)``.
+
+    Args:
+        terms: A list of ``(coef, rate_t, rate_z, shift)`` tuples.
+        const: The constant term.
+    """
+
+    def __init__(self, terms, const=0):
+        self.terms = [tuple(complex(v) for v in term) for term in terms]
+        self.const = complex(const)
+
+
+class Rational:
+    """``scale * prod(numerators) / prod(denominator ** power)``.
+
+    Args:
+        numerators: A list of ``ExpSum``.
+        denominators: A list of ``(ExpSum, power)`` tuples.
+        scale: A constant factor.
+    """
+
+    def __init__(self, numerators, denominators=(), scale=1):
+        self.numerators = list(numerators)
+        self.denominators = list(denominators)
+        self.scale = complex(scale)
+
+
+_Ops = namedtuple("_Ops", ["exp", "cos", "sin", "max", "concat", "constant"])
+
+
+def _backend_ops(name):
+    if name == "numpy":
+        return _Ops(
+            np.exp,
+            np.cos,
+            np.sin,
+            lambda x: np.max(x, axis=1, keepdims=True),
+            lambda xs: np.concatenate(xs, 1),
+            lambda a, like: a.astype(like.dtype, copy=False),
+        )
+    if name == "pytorch":
+        import torch
+
+        return _Ops(
+            torch.exp,
+            torch.cos,
+            torch.sin,
+            lambda x: torch.amax(x, dim=1, keepdim=True),
+            lambda xs: torch.cat(xs, 1),
+            lambda a, like: torch.as_tensor(a, dtype=like.dtype, device=like.device),
+        )
+    if name == "paddle":
+        import paddle
+
+        return _Ops(
+            paddle.exp,
+            paddle.cos,
+            paddle.sin,
+            lambda x: paddle.max(x, axis=1, keepdim=True),
+            lambda xs: paddle.concat(xs, 1),
+            lambda a, like: paddle.to_tensor(a, dtype=like.dtype, place=like.place),
+        )
+    if name == "jax":
+        import jax.numpy as jnp
+
+        return _Ops(
+            jnp.exp,
+            jnp.cos,
+            jnp.sin,
+            lambda x: jnp.max(x, axis=1, keepdims=True),
+            lambda xs: jnp.concatenate(xs, 1),
+            lambda a, like: jnp.asarray(a, dtype=like.dtype),
+        )
+    if name in ("tensorflow", "tensorflow.compat.v1"):
+        import tensorflow as tf
+
+        return _Ops(
+            tf.math.exp,
+            tf.math.cos,
+            tf.math.sin,
+            lambda x: tf.reduce_max(x, axis=1, keepdims=True),
+            lambda xs: tf.concat(xs, 1),
+            lambda a, like: tf.constant(a, dtype=like.dtype),
+        )
+    raise ValueError(f"Backend {name} is not supported.")
+
+
+def _key(*values):
+    return tuple(round(v, _DIGITS) + 0.0 for c in values for v in (c.real, c.imag))
+
+
+def _cmul(a, b):
+    return a[0] * b[0] - a[1] * b[1], a[0] * b[1] + a[1] * b[0]
+
+
+def _creciprocal(a):
+    # Scale by |re| + |im| first so that re**2 + im**2 cannot overflow in float32
+    s = abs(a[0]) + abs(a[1])
+    re, im = a[0] / s, a[1] / s
+    d = s * (re * re + im * im)
+    return re / d, -im / d
+
+
+def _cpow(a, power):
+    out = a
+    for _ in range(power - 1):
+        out = _cmul(out, a)
+    return out
+
+
+class ClosedFormEngine:
+    """Evaluator of several ``Rational`` closed forms sharing one basis.
+
+    Args:
+        fields: A dict (or list of pairs) mapping field names to ``Rational``.
+
+    Attributes:
+        fields: The dict of ``Rational`` by field name.
+        names: The field names, in the order of the evaluated values.
+    """
+
+    def __init__(self, fields):
+        fields = dict(fields)
+        self.fields = fields
+        self.names = list(fields)
+        real_basis, complex_basis = {}, {}
+        sums, den_keys = {}, set()
+        for form in fields.values():
+            denominators = [d for d, _ in form.denominators]
+            for s in form.numerators + denominators:
+                sums.setdefault(id(s), s)
+                for _, a, b, d in s.terms:
+                    if a.imag == b.imag == d.imag == 0:
+                        key = _key(a, b, d)
+                        real_basis.setdefault(key, (a, b, d))
+                    else:
+                        # A conjugate pair shares one basis function: conj(exp(e))
+                        if (a.imag, b.imag, d.imag) < (0, 0, 0):
+                            a, b, d = a.conjugate(), b.conjugate(), d.conjugate()
+                        key = _key(a, b, d)
+                        complex_basis.setdefault(key, (a, b, d))
+                    if any(s is den for den in denominators):
+                        den_keys.add(key)
+
+        # Deduplicate the linear combinations themselves (e.g. the common
+        # denominator), keyed on their coefficient vectors
+        real_index = {k: i for i, k in enumerate(real_basis)}
+        complex_index = {k: i for i, k in enumerate(complex_basis)}
+        kr, kc = len(real_basis), len(complex_basis)
+        columns, unique = {}, {}
+        for sid, s in sums.items():
+            w_re = np.zeros(kr + 2 * kc)
+            w_im = np.zeros(kr + 2 * kc)
+            for coef, a, b, d in s.terms:
+                cr, ci = coef.real, coef.imag
+                key = _key(a, b, d)
+                if key in real_index:
+                    k = real_index[key]
+                    w_re[k] += cr
+                    w_im[k] += ci
+                    continue
+                sign = 1
+                if key not in complex_index:
+                    key = _key(a.conjugate(), b.conjugate(), d.conjugate())
+                    sign = -1
+                k = kr + complex_index[key]
+                # coef * (C + i * sign * S)
+                w_re[k] += cr
+                w_re[k + kc] -= sign * ci
+                w_im[k] += ci
+                w_im[k + kc] += sign * cr
+            col = (tuple(w_re), tuple(w_im), s.const)
+            columns[sid] = unique.setdefault(col, len(unique))
+
+        m = len(unique)
+        weights = np.zeros((kr + 2 * kc, 2 * m))
+        const = np.zeros((1, 2 * m))
+        for (w_re, w_im, c), j in unique.items():
+            weights[:, j] = w_re
+            weights[:, m + j] = w_im
+            const[0, j] = c.real
+            const[0, m + j] = c.imag
+
+        exponents = list(real_basis.values()) + list(complex_basis.values())
+        exponents = np.array(exponents, dtype=complex).reshape(-1, 3).T
+        shift_mask = np.zeros((1, kr + kc))
+        if den_keys:
+            keys = list(real_basis) + list(complex_basis)
+            shift_mask[0] = [0 if k in den_keys else -1e30 for k in keys]
+        self._arrays = {
+            "rate_re": exponents.real,
+            "rate_im": exponents[:, kr:].imag,
+            "shift_mask": shift_mask,
+            "weights": weights,
+            "const": const,
+        }
+        self._num_real = kr
+        self._num_complex = kc
+        self._num_sums = m
+        self._forms = [
+            (
+                form.scale,
+                [columns[id(s)] for s in form.numerators],
+                [(columns[id(s)], p) for s, p in form.denominators],
+            )
+            for form in fields.values()
+        ]
+        self._evaluators = {}
+
+    @property
+    def num_basis(self):
+        """Number of distinct exponentials evaluated per point."""
+        return self._num_real + self._num_complex
+
+    def evaluator(self, backend="numpy"):
+        """Return ``f(z, t) -> [(re, im), ...]`` for the given backend.
+
+        ``z`` and ``t`` are real ``(N, 1)`` arrays or tensors of the backend, and
+        one ``(re, im)`` pair of ``(N, 1)`` arrays is returned per field.  Only
+        ``exp``, ``cos``, ``sin`` and one matrix product are used, so the
+        evaluator is differentiable and works in float32.
+        """
+        if backend not in self._evaluators:
+            ops = _backend_ops(backend)
+            cache = {}
+
+            def f(z, t):
+                key = (str(z.dtype), str(getattr(z, "device", None)))
+                if key not in cache:
+                    cache[key] = {
+                        k: ops.constant(v, z) for k, v in self._arrays.items()
+                    }
+                return self._evaluate(ops, cache[key], z, t)
+
+            self._evaluators[backend] = f
+        return self._evaluators[backend]
+
+    def _basis(self, ops, arr, z, t):
+        kr, kc = self._num_real, self._num_complex
+        rate = arr["rate_re"]
+        exponent = t * rate[0:1] + z * rate[1:2] + rate[2:3]
+        # Factor out the largest denominator exponent per point (but at least 0,
+        # because of the constant terms) so that float32 does not overflow; it
+        # cancels in the rational expression up to a factor exp(degree * shift)
+        shift = ops.max(exponent + arr["shift_mask"])
+        shift = (shift + abs(shift)) / 2
+        mag = ops.exp(exponent - shift)
+        if kc == 0:
+            return mag, shift
+        rate = arr["rate_im"]
+        phase = t * rate[0:1] + z * rate[1:2] + rate[2:3]
+        parts = [mag[:, :kr]] if kr else []
+        parts += [mag[:, kr:] * ops.cos(phase), mag[:, kr:] * ops.sin(phase)]
+        return ops.concat(parts), shift
+
+    def _combine(self, ops, arr, basis, shift=None):
+        m = self._num_sums
+        const = arr["const"] if shift is None else arr["const"] * ops.exp(-shift)
+        values = basis @ arr["weights"] + const
+        sums = [(values[:, j : j + 1], values[:, m + j : m + j + 1]) for j in range(m)]
+        reciprocal, out = {}, []
+        for scale, nums, dens in self._forms:
+            value = sums[nums[0]]
+            for j in nums[1:]:
+                value = _cmul(value, sums[j])
+            for j, p in dens:
+                if (j, p) not in reciprocal:
+                    if (j, 1) not in reciprocal:
+                        reciprocal[j, 1] = _creciprocal(sums[j])
+                    reciprocal[j, p] = _cpow(reciprocal[j, 1], p)
+                value = _cmul(value, reciprocal[j, p])
+            degree = len(nums) - sum(p for _, p in dens)
+            if shift is not None and degree != 0:
+                factor = ops.exp(degree * shift)
+                value = (value[0] * factor, value[1] * factor)
+            if scale != 1:
+                value = (
+                    scale.real * value[0] - scale.imag * value[1],
+                    scale.real * value[1] + scale.imag * value[0],
+                )
+            out.append(value)
+        return out
+
+    def _evaluate(self, ops, arr, z, t):
+        basis, shift = self._basis(ops, arr, z, t)
+        return self._combine(ops, arr, basis, shift)
+
+    def __call__(self, XT):
+        """Evaluate all fields at ``XT = [z, t]`` as complex ``(N, 1)`` arrays."""
+        XT = np.asarray(XT, dtype=np.float64)
+        values = self.evaluator("numpy")(XT[:, 0:1], XT[:, 1:2])
+        return [re + 1j * im for re, im in values]
+
+    def grid(self, z, t):
+        """Evaluate all fields on ``np.meshgrid(z, t)`` as complex ``(nt, nz)`` arrays.
+
+        The exponentials factor per axis, so only ``O((nz + nt) * num_basis)``
+        transcendental calls are made instead of ``O(nz * nt * num_basis)``.
+        """
+        z = np.asarray(z, dtype=np.float64).reshape(1, -1)
+        t = np.asarray(t, dtype=np.float64).reshape(-1, 1)
+        nt, nz = t.shape[0], z.shape[1]
+        arr = self._arrays
+        kr = self._num_real
+        rate = arr["rate_re"] + 1j * np.pad(arr["rate_im"], ((0, 0), (kr, 0)))
+        et = np.exp(t * rate[0:1])[:, None, :]
+        ez = np.exp(z.T * rate[1:2] + rate[2:3])[None, :, :]
+        e = (et * ez).reshape(nt * nz, -1)
+        basis = np.concatenate([e.real, e[:, kr:].imag], 1)
+        values = self._combine(_backend_ops("numpy"), arr, basis)
+        return [(re + 1j * im).reshape(nt, nz) for re, im in values]
@@ -0,0 +1,326 @@
+"""Space-time domain decomposition in worker processes (XPINN).
+
+One network over the whole ``(z, t)`` rectangle trains in one process, so
+extra cores only help through the intra-op threads of each small matmul.
+``DomainDecomposition`` splits the rectangle into an ``nz x nt`` grid of
+subdomains, each with its own copy of the network, and trains every
+subdomain in its own process.  Neighbouring subdomains are coupled by an
+interface condition: every ``exchange`` steps each process writes its
+prediction on its interfaces into a shared-memory array, and each interface
+point is then fitted to the average of the two predictions, as in XPINN
+(Jagtap & Karniadakis, 2020).  ``predict`` evaluates every point with the
+network of its subdomain.
+"""
+
+import copy
+import multiprocessing
+import traceback
+
+import deepxde as dde
+import numpy as np
+from deepxde.callbacks import Callback
+
+from .observation import ObservationBC
+
+__all__ = ["DomainDecomposition"]
+
+
+class _Exchange(Callback):
+    """Every ``period`` epochs, publish this subdomain's interface prediction
+    and refit the interface condition to the average with the neighbours'."""
+
+    def __init__(self, decomposition, index, interface, shared, barrier, period):
+        super().__init__()
+        self.decomposition = decomposition
+        self.index = index
+        self.interface = interface
+        self.shared = shared
+        self.barrier = barrier
+        self.period = period
+        self.epochs = 0
+
+    def on_epoch_end(self):
+        self.epochs += 1
+        if self.epochs % self.period == 0:
+            self.exchange()
+
+    def exchange(self):
+        edges = self.decomposition.edges_of(self.index)
+        if not edges:
+            return
+        values = self.decomposition.interface_values(self.shared)
+        points = np.vstack([self.decomposition.interfaces[e] for e, _ in edges])
+        own = self.model.predict(points)
+        start = 0
+        for e, side in edges:
+            n = len(self.decomposition.interfaces[e])
+            values[e, side] = own[start : start + n]
+            start += n
+        self.barrier.wait()
+        target = np.vstack([values[e].mean(0) for e, _ in edges])
+        self.barrier.wait()
+        self.interface.values = dde.backend.as_tensor(
+            target.astype(dde.config.real(np))
+        )
+
+
+class DomainDecomposition:
+    """XPINN training of ``net`` on an ``nz x nt`` grid of subdomains.
+
+    Every subdomain trains a copy of ``net`` on its own collocation points,
+    the observations of ``observation`` inside it and ``num_interface`` points
+    on each edge it shares with a neighbour.  The workers are forked, so
+    ``operator`` and ``net`` (with its output transform) may be closures of
+    the script.  PyTorch backend only.
+
+    Args:
+        net: The network of each subdomain, copied.
+        operator: The PDE.
+        z, t: The ``(lower, upper)`` bounds of the rectangle.
+        nz, nt: The number of subdomains along z and t.
+        observation: An ``ObservationBC`` of initial and boundary data, or
+            ``None`` with a hard constraint.
+        num_domain: The number of collocation points per subdomain.
+        num_interface: The number of points per interface edge.
+        **data_kwargs: Further arguments of ``dde.data.TimePDE``.
+    """
+
+    def __init__(
+        self,
+        net,
+        operator,
+        z,
+        t,
+        nz,
+        nt,
+        observation=None,
+        num_domain=5000,
+        num_interface=100,
+        **data_kwargs,
+    ):
+        if dde.backend.backend_name != "pytorch":
+            raise ValueError("DomainDecomposition needs the PyTorch backend")
+        self.net = net
+        self.operator = operator
+        self.z_edges = np.linspace(z[0], z[1], nz + 1)
+        self.t_edges = np.linspace(t[0], t[1], nt + 1)
+        self.observation = observation
+        self.num_domain = num_domain
+        self.data_kwargs = data_kwargs
+        self.nets = []
+        # Interfaces: (the two neighbouring subdomains, the points on the edge);
+        # side 0 is the subdomain of smaller z or t
+        self.neighbours = []
+        self.interfaces = []
+        for i in range(nz):
+            for j in range(nt):
+                if i + 1 < nz:
+                    s = np.linspace(self.t_edges[j], self.t_edges[j + 1], num_interface)
+                    X = np.stack([np.full_like(s, self.z_edges[i + 1]), s], 1)
+                    self.neighbours.append((i * nt + j, (i + 1) * nt + j))
+                    self.interfaces.append(X)
+                if j + 1 < nt:
+                    s = np.linspace(self.z_edges[i], self.z_edges[i + 1], num_interface)
+                    X = np.stack([s, np.full_like(s, self.t_edges[j + 1])], 1)
+                    self.neighbours.append((i * nt + j, i * nt + j + 1))
+                    self.interfaces.append(X)
+        self.num_interface = num_interface
+
+    @property
+    def num_outputs(self):
+        import torch
+
+        with torch.no_grad():
+            return self.net(torch.zeros(1, 2)).shape[1]
+
+    @property
+    def num_subdomains(self):
+        return (len(self.z_edges) - 1) * (len(self.t_edges) - 1)
+
+    def bounds(self, k):
+        """``((z0, z1), (t0, t1))`` of subdomain ``k``."""
+        i, j = divmod(k, len(self.t_edges) - 1)
+        return (
+            (self.z_edges[i], self.z_edges[i + 1]),
+            (self.t_edges[j], self.t_edges[j + 1]),
+        )
+
+    def edges_of(self, k):
+        """``[(edge, side), ...]`` of the interfaces of subdomain ``k``."""
+        return [
+            (e, pair.index(k)) for e, pair in enumerate(self.neighbours) if k in pair
+        ]
+
+    def interface_values(self, shared):
+        """The ``(edges, 2, num_interface, outputs)`` view of the shared array."""
+        return np.frombuffer(shared, dtype=np.float64).reshape(
+            len(self.interfaces), 2, self.num_interface, -1
+        )
+
+    def subdomain(self, k):
+        """``(data, interface)`` of subdomain ``k``; ``interface`` is the
+        ``ObservationBC`` refitted by the exchange, or ``None``."""
+        (z0, z1), (t0, t1) = self.bounds(k)
+        geomtime = dde.geometry.GeometryXTime(
+            dde.geometry.Interval(z0, z1), dde.geometry.TimeDomain(t0, t1)
+        )
+        bcs = []
+        if self.observation is not None:
+            obs = self.observation
+            X = obs.points
+            inside = (X[:, 0] >= z0) & (X[:, 0] <= z1)
+            inside &= (X[:, 1] >= t0) & (X[:, 1] <= t1)
+            if inside.any():
+                values = dde.backend.to_numpy(obs.values)
+                bcs.append(ObservationBC(X[inside], values[inside], obs.component))
+        edges = self.edges_of(k)
+        interface = None
+        if edges:
+            points = np.vstack([self.interfaces[e] for e, _ in edges])
+            interface = ObservationBC(points, np.zeros((len(points), self.num_outputs)))
+            bcs.append(interface)
+        data = dde.data.TimePDE(
+            geomtime, self.operator, bcs, num_domain=self.num_domain, **self.data_kwargs
+        )
+        return data, interface
+
+    def train(
+        self,
+        iterations,
+        loss_weights,
+        interface_weight=100,
+        lr=0.001,
+        exchange=100,
+        threads=1,
+        display_every=1000,
+    ):
+        """Train all subdomains for ``iterations`` Adam steps in parallel;
+        returns the loss history and train state of subdomain 0.
+
+        Args:
+            iterations: The number of steps of every subdomain.
+            loss_weights: The weights of the residuals, followed by that of the
+                observations, used where a subdomain has observations.
+            interface_weight: The weight of the interface condition.
+            lr: The Adam learning rate.
+            exchange: The number of steps between interface exchanges.
+            threads: ``torch`` threads per process; with one process per
+                subdomain, ``nz * nt * threads`` should not exceed the cores.
+            display_every: Display period of subdomain 0; the others are quiet.
+        """
+        context = multiprocessing.get_context("fork")
+        outputs = self.num_outputs
+        shared = context.RawArray(
+            "d", len(self.interfaces) * 2 * self.num_interface * outputs
+        )
+        barrier = context.Barrier(self.num_subdomains, timeout=3600)
+        queue = context.Queue()
+        settings = (
+            iterations,
+            loss_weights,
+            interface_weight,
+            lr,
+            exchange,
+            threads,
+            display_every,
+        )
+        workers = [
+            context.Process(
+                target=self._worker, args=(k, shared, barrier, queue, settings)
+            )
+            for k in range(self.num_subdomains)
+        ]
+        for w in workers:
+            w.start()
+        states, history = {}, None
+        for _ in workers:
+            k, state, result = queue.get()
+            if isinstance(state, str):
+                for w in workers:
+                    w.terminate()
+                raise RuntimeError(f"subdomain {k} failed:\n{state}")
+            states[k] = state
+            if k == 0:
+                history = result
+        for w in workers:
+            w.join()
+        self.nets = []
+        for k in range(self.num_subdomains):
+            net = copy.deepcopy(self.net)
+            net.load_state_dict(
+                {name: dde.backend.as_tensor(v) for name, v in states[k].items()}
+            )
+            self.nets.append(net.eval())
+        return history
+
+    def _worker(self, k, shared, barrier, queue, settings):
+        try:
+            import torch
+
+            (
+                iterations,
+                loss_weights,
+                interface_weight,
+                lr,
+                exchange,
+                threads,
+                display_every,
+            ) = settings
+            torch.set_num_threads(threads)
+            data, interface = self.subdomain(k)
+            num_pde = len(loss_weights) - (self.observation is not None)
+            weights = list(loss_weights[:num_pde])
+            if len(data.bcs) > (interface is not None):
+                weights.append(loss_weights[-1])
+            if interface is not None:
+                weights.append(interface_weight)
+            model = dde.Model(data, self.net)
+            model.compile("adam", lr=lr, loss="MSE", loss_weights=weights)
+            callbacks = []
+            if interface is not None:
+                sync = _Exchange(self, k, interface, shared, barrier, exchange)
+                sync.model = model
+                sync.exchange()
+                callbacks.append(sync)
+            history = model.train(
+                iterations=iterations,
+                display_every=display_every,
+                callbacks=callbacks,
+                verbose=1 if k == 0 else 0,
+            )
+            state = {
+                n: v.detach().cpu().numpy() for n, v in self.net.state_dict().items()
+            }
+            queue.put((k, state, history if k == 0 else None))
+        except Exception:
+            barrier.abort()
+            queue.put((k, traceback.format_exc(), None))
+
+    def predict(self, X):
+        """The outputs at the points ``X``, each from the network of its
+        subdomain."""
+        import torch
+
+        X = np.asarray(X, dtype=dde.config.real(np))
+        i = np.clip(
+            np.searchsorted(self.z_edges, X[:, 0], side="right") - 1,
+            0,
+            len(self.z_edges) - 2,
+        )
+        j = np.clip(
+            np.searchsorted(self.t_edges, X[:, 1], side="right") - 1,
+            0,
+            len(self.t_edges) - 2,
+        )
+        k = i * (len(self.t_edges) - 1) + j
+        y = None
+        with torch.no_grad():
+            for s, net in enumerate(self.nets):
+                rows = k == s
+                if not rows.any():
+                    continue
+                out = net(torch.as_tensor(X[rows])).cpu().numpy()
+                if y is None:
+                    y = np.empty((len(X), out.shape[1]), dtype=out.dtype)
+                y[rows] = out
+        return y
@@ -0,0 +1,343 @@
+"""Derivatives of the network outputs needed by the NLS-MB residual.
+
+Every ``pde(x, y)`` needs the first derivatives of the five outputs and the
+second derivatives of Eu and Ev along one input.  With ``dde.grad`` that is
+one reverse pass per output plus one reverse-over-reverse pass per second
+derivative, each over the whole network.
+
+``NLSMBDerivatives`` instead pushes a truncated Taylor expansion through the
+network: each hidden layer carries the stacked block ``[h, dh/dz, dh/dt,
+d2h/ds2]`` of shape ``(4, N, width)`` and applies its weight matrix to the
+whole block in a single matmul, so all derivatives come out of one forward
+sweep and the training backward runs over a plain feed-forward graph.  This
+covers the ``tanh``/``sin`` FNN and PFNN of DeepXDE and the ``SeparableNet``,
+whose axis networks are expanded once per distinct coordinate, with no output
+transform or with a ``HardConstraint``.  With JAX the derivatives are taken with
+``vmap``/``jacfwd``/``jvp`` of the network function.
+
+The ``"jvp"`` mode takes the same derivatives with nested forward-mode
+``jvp`` of the whole network (``torch.func.jvp`` or ``jax.jvp``): one
+jvp-of-jvp along the second-derivative input gives its first and second
+derivatives, and one more jvp gives the first derivative along the other
+input.  It works for any network and transform, and is what ``"fused"``
+falls back to for networks the sweep does not cover.  The ``"reverse"`` mode,
+and the TensorFlow and Paddle backends, use ``dde.grad`` as before.
+"""
+
+import deepxde as dde
+
+from .hard_constraint import HardConstraint
+from .networks import SeparableNet
+
+__all__ = ["NLSMBDerivatives"]
+
+
+def _activation_jets():
+    """``activation -> derivatives(a, h)``, returning the first, second and third
+    derivatives of the activation at the pre-activation ``a``, where ``h`` is
+    the activation itself."""
+    bkd = dde.backend
+
+    def tanh(a, h):
+        g1 = 1 - h * h
+        g2 = -2 * h * g1
+        return g1, g2, -2 * (g1 * g1 + h * g2)
+
+    def sin(a, h):
+        g1 = bkd.cos(a)
+        return g1, -h, -g1
+
+    return {bkd.tanh: tanh, bkd.sin: sin}
+
+
+def _taylor_activation():
+    """``apply(A, b, activation, derivatives, s)``: the jet of
+    ``activation(A + b)`` for the jet ``A = [a, a_z, a_t, a_ss]``.
+
+    Written as one autograd function, so that the backward pass does not go
+    through the slicing and stacking of the jet, which is what dominates the
+    time of the sweep on CPU.
+    """
+    import torch
+
+    class TaylorActivation(torch.autograd.Function):
+        @staticmethod
+        def forward(ctx, A, b, activation, derivatives, s):
+            a = A[0] + b
+            h = activation(a)
+            g1, g2, _ = derivatives(a, h)
+            a_s = A[1 + s]
+            H = A * g1
+            H[0] = h
+            H[3] += g2 * a_s * a_s
+            ctx.save_for_backward(A, a, h)
+            ctx.derivatives, ctx.s = derivatives, s
+            return H
+
+        @staticmethod
+        @torch.autograd.function.once_differentiable
+        def backward(ctx, G):
+            A, a, h = ctx.saved_tensors
+            s = ctx.s
+            g1, g2, g3 = ctx.derivatives(a, h)
+            a_s = A[1 + s]
+            grad = G * g1
+            grad[0] += g2 * (G[1] * A[1] + G[2] * A[2] + G[3] * A[3]) + (
+                g3 * a_s * a_s * G[3]
+            )
+            grad[1 + s] += 2 * g2 * a_s * G[3]
+            return grad, grad[0].sum(0), None, None, None
+
+    return TaylorActivation.apply
+
+
+class NLSMBDerivatives:
+    """``derivatives(x, y) -> (y_z, y_t, E_ss)``.
+
+    ``y_z`` and ``y_t`` are the ``(N, k)`` first derivatives of all the outputs
+    with respect to z (input 0) and t (input 1), and ``E_ss`` is the ``(N, 2)``
+    second derivative of Eu and Ev (outputs 0 and 1) with respect to input
+    ``second``.
+
+    Args:
+        net: The network, so that the PyTorch backend can run the fused sweep.
+            With ``None``, or a network it cannot handle, ``dde.grad`` is used.
+        second: The input of the second derivative, 1 for ``Eu_tt``/``Ev_tt``
+            and 0 for ``Eu_zz``/``Ev_zz``.
+        mode: ``"fused"``, ``"jvp"`` for nested forward mode, or ``"reverse"``
+            to always use ``dde.grad``.
+    """
+
+    modes = ("fused", "jvp", "reverse")
+
+    def __init__(self, net=None, second=1, mode="fused"):
+        if mode not in self.modes:
+            raise ValueError(f"Unknown mode {mode!r}")
+        self.net = net
+        self.second = second
+        self.mode = mode
+        self._activations = None
+        self._apply = None
+
+    def __call__(self, x, y):
+        backend = dde.backend.backend_name
+        if self.mode == "fused":
+            if backend == "jax":
+                return self._jax(x, y)
+            if backend == "pytorch" and self._supported():
+                return self._taylor(x)
+        if self.mode != "reverse":
+            if backend == "jax":
+                return self._jax_jvp(x, y)
+            if backend == "pytorch" and self.net is not None:
+                return self._jvp(x)
+        return self._reverse(x, y)
+
+    def _reverse(self, x, y):
+        bkd = dde.backend
+        k = (y[0] if isinstance(y, (list, tuple)) else y).shape[1]
+        y_z, y_t = [], []
+        for i in range(k):
+            y_z.append(dde.grad.jacobian(y, x, i=i, j=0))
+            y_t.append(dde.grad.jacobian(y, x, i=i, j=1))
+        s = self.second
+        E_ss = [dde.grad.hessian(y, x, component=c, i=s, j=s) for c in (0, 1)]
+        if dde.backend.backend_name == "jax":
+            y_z, y_t, E_ss = [[v[0] for v in vs] for vs in (y_z, y_t, E_ss)]
+        return bkd.concat(y_z, 1), bkd.concat(y_t, 1), bkd.concat(E_ss, 1)
+
+    def _jax(self, x, y):
+        import jax
+        import jax.numpy as jnp
+
+        fn = y[1]
+        f = lambda xi: fn(xi[None])[0]
+        e = jnp.zeros(x.shape[1], dtype=x.dtype).at[self.second].set(1)
+        f_s = lambda xi: jax.jvp(f, (xi,), (e,))[1]
+        J = jax.vmap(jax.jacfwd(f))(x)
+        E_ss = jax.vmap(lambda xi: jax.jvp(f_s, (xi,), (e,))[1][:2])(x)
+        return J[:, :, 0], J[:, :, 1], E_ss
+
+    def _jax_jvp(self, x, y):
+        import jax
+        import jax.numpy as jnp
+
+        # The network is applied row by row, so a jvp of the batch with one
+        # tangent per row gives the directional derivatives of every point
+        fn = y[1]
+        s = self.second
+        e_s = jnp.zeros_like(x).at[:, s].set(1)
+        e_o = jnp.zeros_like(x).at[:, 1 - s].set(1)
+        f_s = lambda x: jax.jvp(fn, (x,), (e_s,))[1]
+        y_s, y_ss = jax.jvp(f_s, (x,), (e_s,))
+        _, y_o = jax.jvp(fn, (x,), (e_o,))
+        y_z, y_t = (y_s, y_o) if s == 0 else (y_o, y_s)
+        return y_z, y_t, y_ss[:, 0:2]
+
+    def _jvp(self, x):
+        import torch
+
+        net = self.net
+        transform = net._output_transform
+        s = self.second
+        x = x.detach()
+        e_s, e_o = torch.zeros_like(x), torch.zeros_like(x)
+        e_s[:, s] = 1
+        e_o[:, 1 - s] = 1
+        f_s = lambda x: torch.func.jvp(net, (x,), (e_s,))[1]
+        # A HardConstraint is composed from its cached jet instead of being
+        # differentiated through
+        composed = isinstance(transform, HardConstraint)
+        if composed:
+            net._output_transform = None
+        try:
+            y_s, y_ss = torch.func.jvp(f_s, (x,), (e_s,))
+            y, y_o = torch.func.jvp(net, (x,), (e_o,))
+        finally:
+            net._output_transform = transform
+        y_z, y_t = (y_s, y_o) if s == 0 else (y_o, y_s)
+        if composed:
+            J = self._hard_constraint(transform, x, torch.stack([y, y_z, y_t, y_ss]))
+            y_z, y_t, y_ss = J[1], J[2], J[3]
+        return y_z, y_t, y_ss[:, 0:2]
+
+    def _supported(self):
+        net = self.net
+        if self._activations is None:
+            self._activations = _activation_jets()
+            self._apply = _taylor_activation()
+        if isinstance(net, SeparableNet):
+            nets = list(net.axes)
+        elif isinstance(net, (dde.nn.FNN, dde.nn.PFNN)):
+            nets = [net]
+        else:
+            return False
+        if net._input_transform is not None:
+            return False
+        transform = net._output_transform
+        if transform is not None and not isinstance(transform, HardConstraint):
+            return False
+        activations = [
+            a
+            for n in nets
+            for a in (
+                n.activation if isinstance(n.activation, list) else [n.activation]
+            )
+        ]
+        return all(a in self._activations for a in activations)
+
+    # Taylor-mode sweep for the PyTorch FNN/PFNN. A jet is the stacked block
+    # [value, d/dz, d/dt, d2/ds2] of shape (4, N, width)
+
+    def _linear(self, J, layer):
+        return J @ layer.weight.T
+
+    def _affine(self, J, layer):
+        # The bias only enters the value
+        A = self._linear(J, layer)
+        return A + self._bias_jet(layer.bias)
+
+    def _bias_jet(self, b):
+        import torch
+
+        return torch.cat([b[None], b.new_zeros(3, b.shape[0])])[:, None]
+
+    def _activate(self, J, layer, activation):
+        A = self._linear(J, layer)
+        return self._apply(
+            A, layer.bias, activation, self._activations[activation], self.second
+        )
+
+    def _taylor(self, x):
+        import torch
+
+        net = self.net
+        x = x.detach()
+        zeros = torch.zeros_like(x)
+        e_z, e_t = zeros.clone(), zeros.clone()
+        e_z[:, 0] = 1
+        e_t[:, 1] = 1
+        J = torch.stack([x, e_z, e_t, zeros])
+        if isinstance(net, SeparableNet):
+            J = self._separable(x)
+        elif isinstance(net, dde.nn.PFNN):
+            J = self._pfnn(J)
+        else:
+            J = self._fnn(J, net)
+        if net._output_transform is not None:
+            J = self._hard_constraint(net._output_transform, x, J)
+        return J[1], J[2], J[3][:, 0:2]
+
+    def _fnn(self, J, net):
+        activations = net.activation
+        for j, linear in enumerate(net.linears[:-1]):
+            activation = (
+                activations[j] if isinstance(activations, list) else activations
+            )
+            J = self._activate(J, linear, activation)
+        return self._affine(J, net.linears[-1])
+
+    def _separable(self, x):
+        import torch
+
+        net = self.net
+        k, rank = net.num_outputs, net.rank
+        jets = []
+        for axis, fnn in enumerate(net.axes):
+            # Each axis network only sees its own coordinate, so it is expanded
+            # once per distinct value and the jets are gathered back to the points
+            v, inverse = torch.unique(x[:, axis], return_inverse=True)
+            J = torch.zeros(4, len(v), 1, dtype=x.dtype, device=x.device)
+            J[0, :, 0] = v
+            J[1 + axis] = 1
+            J = self._fnn(J, fnn)
+            jets.append([J_[inverse].reshape(len(x), k, rank) for J_ in J])
+        # Summed over the rank as part of each product
+        dot = lambda a, b: (a * b).sum(2)
+        return self._product(*jets, mul=dot)
+
+    def _product(self, A, B, mul=lambda a, b: a * b):
+        # The jet of the product of two jets
+        import torch
+
+        s = self.second
+        return torch.stack(
+            [
+                mul(A[0], B[0]),
+                mul(A[1], B[0]) + mul(A[0], B[1]),
+                mul(A[2], B[0]) + mul(A[0], B[2]),
+                mul(A[3], B[0]) + 2 * mul(A[1 + s], B[1 + s]) + mul(A[0], B[3]),
+            ]
+        )
+
+    def _pfnn(self, J):
+        import torch
+
+        net = self.net
+        for layer in net.layers[:-1]:
+            if isinstance(layer, torch.nn.ModuleList):
+                if isinstance(J, list):
+                    J = [
+                        self._activate(J_, f, net.activation) for f, J_ in zip(layer, J)
+                    ]
+                else:
+                    J = [self._activate(J, f, net.activation) for f in layer]
+            else:
+                if isinstance(J, list):
+                    J = torch.cat(J, dim=2)
+                J = self._activate(J, layer, net.activation)
+        if isinstance(J, list):
+            return torch.cat(
+                [self._affine(J_, f) for f, J_ in zip(net.layers[-1], J)], dim=2
+            )
+        return self._affine(J, net.layers[-1])
+
+    def _hard_constraint(self, transform, x, J):
+        import torch
+
+        # distance * y + exact, with the value and derivatives of [distance, exact]
+        # taken from the per-point-set cache of the transform
+        _, g, jac, hess = transform.jet(x)
+        s = self.second
+        G = torch.stack([g, jac[0], jac[1], hess[s][s]])
+        return self._product(G[:, :, 0:1], J) + G[:, :, 1:]
@@ -0,0 +1,182 @@
+"""Training an ensemble of networks in one model.
+
+Robust numbers need several runs with different seeds, and every run
+repeats the imports, the exact-solution grid and a training loop of small
+matmuls that leaves most cores idle.  ``EnsembleFNN`` holds ``members``
+fully connected networks of the same shape as stacked ``(members, in, out)``
+weights and evaluates them with one batched matmul per layer on the same
+points.  Its outputs are the outputs of all members side by side, so that
+``model.predict`` and ``evaluate_chunked`` work unchanged.
+
+The derivatives of a member's outputs must not be summed with those of the
+other members at the same point.  The network therefore copies the points
+once per member and evaluates member ``k`` on copy ``k``; ``operator`` wraps
+the PDE so that it differentiates with respect to these copies, which gives
+the derivatives of all members in one reverse sweep.  ``EnsembleBC`` wraps a
+boundary condition, and ``ensemble_report`` prints the errors of the members
+and of their mean.
+"""
+
+import deepxde as dde
+import numpy as np
+
+from .chunked import l2_relative_error
+
+__all__ = ["EnsembleBC", "EnsembleFNN", "ensemble_report"]
+
+
+class EnsembleFNN(dde.nn.NN):
+    """``members`` networks like ``dde.nn.FNN(layer_sizes, ...)``, trained together.
+
+    The output has ``members * layer_sizes[-1]`` columns, those of member 0
+    first.  Pass the PDE through ``operator`` and the boundary conditions
+    through ``EnsembleBC``; the residuals are summed over the members, so that
+    with Adam every member trains as it would alone.  Derivatives must be
+    taken with ``dde.grad``, e.g. by ``NLSMBDerivatives`` without a network.
+    PyTorch backend only.
+
+    Args:
+        layer_sizes: The layer sizes of every member, e.g. ``[2] + [64] * 6 + [5]``.
+        activation: Activation function.
+        kernel_initializer: Initializer for the kernel weights of every member.
+        members: The number of networks.
+        seed: Member ``k`` is initialized with the seed ``seed + k``; ``None``
+            continues the global random state.
+
+    Attributes:
+        inputs: The points of the last forward pass, copied once per member,
+            of shape ``(members * N, d)``.
+    """
+
+    def __init__(self, layer_sizes, activation, kernel_initializer, members, seed=None):
+        if dde.backend.backend_name != "pytorch":
+            raise ValueError("EnsembleFNN needs the PyTorch backend")
+        import torch
+
+        super().__init__()
+        self.members = members
+        self.num_outputs = layer_sizes[-1]
+        self.activation = dde.nn.activations.get(activation)
+        initializer = dde.nn.initializers.get(kernel_initializer)
+        dtype = dde.config.real(torch)
+        self.weights = torch.nn.ParameterList()
+        self.biases = torch.nn.ParameterList()
+        shapes = list(zip(layer_sizes[:-1], layer_sizes[1:]))
+        kernels = [[] for _ in shapes]
+        for k in range(members):
+            with torch.random.fork_rng(enabled=seed is not None):
+                if seed is not None:
+                    torch.manual_seed(seed + k)
+                for kernel, (n_in, n_out) in zip(kernels, shapes):
+                    # Shaped like a torch.nn.Linear weight, so that the initializers
+                    # see the same fan_in and fan_out
+                    w = torch.empty(n_out, n_in, dtype=dtype)
+                    initializer(w)
+                    kernel.append(w.T)
+        for kernel, (_, n_out) in zip(kernels, shapes):
+            self.weights.append(torch.nn.Parameter(torch.stack(kernel)))
+            self.biases.append(
+                torch.nn.Parameter(torch.zeros(members, 1, n_out, dtype=dtype))
+            )
+        self.inputs = None
+
+    def interleave(self, y):
+        """``(members * N, c) -> (N, members * c)``, from the member-major rows
+        of ``inputs`` to the columns of the output."""
+        return y.reshape(self.members, -1, y.shape[1]).transpose(0, 1).flatten(1)
+
+    def stacked(self, y):
+        """The inverse of ``interleave``."""
+        c = y.shape[1] // self.members
+        return y.reshape(len(y), self.members, c).transpose(0, 1).reshape(-1, c)
+
+    def forward(self, inputs):
+        import torch
+
+        self.inputs = inputs.repeat(self.members, 1)
+        x = self.inputs
+        if self._input_transform is not None:
+            x = self._input_transform(x)
+        x = x.reshape(self.members, len(inputs), -1)
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = torch.baddbmm(b, x, w)
+            if i < last:
+                x = self.activation(x)
+        x = x.reshape(-1, self.num_outputs)
+        if self._output_transform is not None:
+            x = self._output_transform(self.inputs, x)
+        return self.interleave(x)
+
+    def operator(self, operator):
+        """The PDE ``operator`` of every member; each residual of the returned
+        operator has one column per member."""
+
+        def ensemble(x, y):
+            if self.inputs is None or len(self.inputs) != self.members * len(x):
+                raise ValueError("The outputs are not from the last forward pass")
+            f = operator(self.inputs, self.stacked(y))
+            if not isinstance(f, (list, tuple)):
+                f = [f]
+            return [self.interleave(fi) for fi in f]
+
+        return ensemble
+
+
+class EnsembleBC:
+    """The boundary condition ``bc`` on every member of an ``EnsembleFNN``.
+
+    The errors of the members are side by side.  Only conditions on the
+    outputs, such as ``ObservationBC``, ``PointSetBC`` and ``DirichletBC``,
+    are supported, since derivatives with respect to the shared inputs would
+    be summed over the members.
+    """
+
+    def __init__(self, bc, members):
+        self.bc = bc
+        self.members = members
+
+    def __getattr__(self, name):
+        if name == "bc":
+            raise AttributeError(name)
+        return getattr(self.bc, name)
+
+    def error(self, X, inputs, outputs, beg, end, aux_var=None):
+        c = outputs.shape[1] // self.members
+        errors = [
+            self.bc.error(X, inputs, outputs[:, k * c : (k + 1) * c], beg, end, aux_var)
+            for k in range(self.members)
+        ]
+        return dde.backend.concat(errors, 1)
+
+
+def ensemble_report(members, exact, names):
+    """Print the L2 relative error of every member, their mean and standard
+    deviation, and the error of the ensemble mean.
+
+    Args:
+        members: ``(K, N, F)`` values of ``F`` quantities per member, e.g.
+            ``|E|``, ``|p|`` and ``|eta|``.
+        exact: The ``(N, F)`` exact values.
+        names: The ``F`` names.
+
+    Returns:
+        The ``(N, F)`` ensemble mean and standard deviation.
+    """
+    mean = members.mean(0)
+    std = members.std(0)
+    errors = np.array(
+        [
+            [l2_relative_error(exact[:, j], m[:, j]) for j in range(len(names))]
+            for m in members
+        ]
+    )
+    print("L2 relative errors:")
+    print(f"{'member':<10}" + "".join(f"{name:>12}" for name in names))
+    for k, row in enumerate(errors):
+        print(f"{k:<10}" + "".join(f"{e:>12.3e}" for e in row))
+    print(f"{'mean':<10}" + "".join(f"{e:>12.3e}" for e in errors.mean(0)))
+    print(f"{'std':<10}" + "".join(f"{e:>12.3e}" for e in errors.std(0)))
+    ensemble = [l2_relative_error(exact[:, j], mean[:, j]) for j in range(len(names))]
+    print(f"{'ensemble':<10}" + "".join(f"{e:>12.3e}" for e in ensemble))
+    return mean, std
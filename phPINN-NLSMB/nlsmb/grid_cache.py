@@ -0,0 +1,261 @@
+"""On-disk cache of the evaluation grid and the exact fields on it.
+
+Every script builds ``X, T = np.meshgrid(x, t)``, ``X_star`` and the exact
+E/p/eta fields before training starts.  ``exact_grid`` stores these arrays as
+``.npy`` files keyed by case name, domain bounds, grid size and the code of
+the fields, and loads them memory-mapped on the next run, so that reading a
+few time slices for plotting only touches those rows.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .chunked import DEFAULT_MAX_MEMORY, evaluate_chunked, open_output
+
+__all__ = ["ExactGrid", "exact_grid", "open_exact_grid", "default_cache_dir"]
+
+
+def default_cache_dir():
+    """``$NLSMB_CACHE_DIR``, or ``~/.cache/nlsmb`` if it is not set."""
+    return os.environ.get(
+        "NLSMB_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "nlsmb")
+    )
+
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _fields_digest(fields):
+    """A hash of what ``fields`` computes the grid from.
+
+    That is the source of ``fields``, and of the functions of its module that it
+    calls, such as a ``solution(XT)`` next to it; the numbers, strings and
+    arrays these read from the module or their closures, such as ``I = 1j``; and
+    for a bound method such as ``TWO_SOLITONS.grid``, the public attributes of
+    its object.  Private attributes are skipped, as they hold caches built from
+    the public ones, such as the evaluators of a ``ClosedFormEngine``.
+    """
+    digest = hashlib.sha1()
+    module = getattr(fields, "__module__", None)
+    # Keep the visited values alive, so that their ids are not reused
+    seen = {}
+
+    def visit(value):
+        if value is None or isinstance(value, (bool, int, float, complex, str)):
+            digest.update(repr(value).encode())
+            return
+        if id(value) in seen:
+            return
+        seen[id(value)] = value
+        if isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype.str}{value.shape}".encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                visit(k)
+                visit(v)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                visit(v)
+        elif inspect.ismethod(value):
+            visit(value.__func__)
+            visit(value.__self__)
+        elif inspect.isfunction(value):
+            if value.__module__ != module:
+                return
+            try:
+                digest.update(inspect.getsource(value).encode())
+            except (OSError, TypeError):
+                digest.update(value.__code__.co_code)
+            for name in sorted(_code_names(value.__code__)):
+                if name in value.__globals__:
+                    visit(value.__globals__[name])
+            for cell in value.__closure__ or ():
+                visit(cell.cell_contents)
+        elif hasattr(value, "__dict__") and not (
+            inspect.ismodule(value) or inspect.isclass(value)
+        ):
+            visit({k: v for k, v in vars(value).items() if not k.startswith("_")})
+
+    visit(fields)
+    return digest.hexdigest()
+
+
+def _key(case, fields, z_lower, z_upper, t_lower, t_upper, nx, nt, names, version):
+    meta = {
+        "case": case,
+        "fields": _fields_digest(fields),
+        "domain": [float(z_lower), float(z_upper), float(t_lower), float(t_upper)],
+        "nx": int(nx),
+        "nt": int(nt),
+        "names": list(names),
+        "version": version,
+    }
+    digest = hashlib.sha1(json.dumps(meta, sort_keys=True).encode()).hexdigest()
+    return f"{case}-{digest[:16]}", meta
+
+
+class ExactGrid:
+    """Memory-mapped grid of one case.
+
+    Attributes:
+        x: ``(nx,)`` z-coordinates.
+        t: ``(nt,)`` t-coordinates.
+        X, T: ``(nt, nx)`` arrays of ``np.meshgrid(x, t)``.
+        X_star: ``(nt * nx, 2)`` flattened ``[z, t]`` points.
+        names: The names of the exact fields, e.g. ``["E", "p", "eta"]``.
+
+    ``grid[name]`` is the complex ``(nt, nx)`` field ``name``.
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.names = meta["names"]
+        self.z_lower, self.z_upper, self.t_lower, self.t_upper = meta["domain"]
+        self.nx, self.nt = meta["nx"], meta["nt"]
+        for name in ["x", "t", "X", "T", "X_star"]:
+            setattr(self, name, self._load(name))
+        self._fields = {}
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    def __getitem__(self, name):
+        if name not in self._fields:
+            if name not in self.names:
+                raise KeyError(name)
+            self._fields[name] = self._load(f"field_{name}")
+        return self._fields[name]
+
+    def time_index(self, tt):
+        """Row of ``t = tt``, as computed by the plotting code."""
+        return round(
+            (tt - self.t_lower) / (self.t_upper - self.t_lower) * (self.nt - 1)
+        )
+
+    def time_slice(self, name, tt):
+        """Field ``name`` at ``t = tt``; only this row is read from disk."""
+        return np.array(self[name][self.time_index(tt)])
+
+
+def open_exact_grid(
+    case,
+    fields,
+    z_lower,
+    z_upper,
+    t_lower,
+    t_upper,
+    nx,
+    nt,
+    names=("E", "p", "eta"),
+    version=0,
+    cache_dir=None,
+):
+    """Open the cached grid of ``exact_grid`` with these arguments, raising
+    ``FileNotFoundError`` if it does not exist."""
+    dirname, meta = _key(
+        case, fields, z_lower, z_upper, t_lower, t_upper, nx, nt, names, version
+    )
+    path = os.path.join(cache_dir or default_cache_dir(), dirname)
+    if not os.path.isfile(os.path.join(path, "meta.json")):
+        raise FileNotFoundError(f"No cached grid at {path}")
+    return ExactGrid(path, meta)
+
+
+def exact_grid(
+    case,
+    fields,
+    z_lower,
+    z_upper,
+    t_lower,
+    t_upper,
+    nx,
+    nt,
+    names=("E", "p", "eta"),
+    version=0,
+    cache_dir=None,
+    max_memory=DEFAULT_MAX_MEMORY,
+):
+    """Load the grid of ``case`` from the cache, computing it on a miss.
+
+    Args:
+        case: Name of the case, e.g. ``"two_solitons"``.
+        fields: ``fields(x, t)`` returns one complex ``(nt, nx)`` array per name
+            on ``np.meshgrid(x, t)``, e.g. ``TWO_SOLITONS.grid``.  Its code is
+            part of the key, so editing the closed form computes a new grid.
+        names: The names of the fields returned by ``fields``.
+        version: Bump it to recompute the grid when something the key does
+            not see changes, e.g. a closed form in another module.
+        cache_dir: Defaults to ``default_cache_dir()``.
+        max_memory: Approximate cap in bytes on the temporaries of ``fields``.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    try:
+        return open_exact_grid(
+            case,
+            fields,
+            z_lower,
+            z_upper,
+            t_lower,
+            t_upper,
+            nx,
+            nt,
+            names,
+            version,
+            cache_dir,
+        )
+    except FileNotFoundError:
+        pass
+    dirname, meta = _key(
+        case, fields, z_lower, z_upper, t_lower, t_upper, nx, nt, names, version
+    )
+    path = os.path.join(cache_dir, dirname)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write into a private directory and rename it, so that concurrent runs never
+    # see a half-written grid
+    tmp = tempfile.mkdtemp(prefix=f".{dirname}-", dir=cache_dir)
+    try:
+        x = np.linspace(z_lower, z_upper, nx)
+        t = np.linspace(t_lower, t_upper, nt)
+        X, T = np.meshgrid(x, t)
+        arrays = {"x": x, "t": t, "X": X, "T": T}
+        arrays["X_star"] = np.hstack((X.flatten()[:, None], T.flatten()[:, None]))
+        for name, value in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), value)
+
+        # The fields are evaluated a few t-rows at a time and written straight
+        # into memory-mapped files, so large grids never sit in memory at once
+        def rows(t_rows):
+            return [np.asarray(v).reshape(len(t_rows), nx) for v in fields(x, t_rows)]
+
+        outs = [
+            open_output(os.path.join(tmp, f"field_{name}.npy"), (nt, nx), v.dtype)
+            for name, v in zip(names, rows(t[:1]))
+        ]
+        evaluate_chunked(rows, t, out=outs, max_memory=max_memory, probe_size=8)
+        for out in outs:
+            out.flush()
+        del outs
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another run has cached the same grid in the meantime
+            if not os.path.isfile(os.path.join(path, "meta.json")):
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return ExactGrid(path, meta)
@@ -0,0 +1,131 @@
+"""Hard-constraint output transform with per-point caching.
+
+With ``hard_constraint`` on, the network output is mapped to
+``distance(x) * y + exact(x)`` on every forward pass, but the distance factor
+and the exact boundary values only depend on the input points.  For the
+PyTorch backend ``HardConstraint`` evaluates them once per point set, together
+with their first and second derivatives, and rebuilds them on later passes as
+the quadratic Taylor polynomial
+
+    g(x) = g(x0) + J (x - x0) + 1/2 (x - x0)^T H (x - x0),
+
+which at ``x = x0`` has the same value, gradient and Hessian as ``g``.  The
+PDE residual therefore sees the same derivatives as before, while the
+transcendental functions run only when ``PDEPointResampler`` or
+``add_anchors`` changes the point set.
+"""
+
+import threading
+from collections import OrderedDict
+
+__all__ = ["HardConstraint"]
+
+
+def _is_torch(x):
+    return type(x).__module__.startswith("torch")
+
+
+def _grad(y, x, create_graph=False):
+    import torch
+
+    if not y.requires_grad:
+        return torch.zeros_like(x)
+    (g,) = torch.autograd.grad(
+        y.sum(), x, retain_graph=True, create_graph=create_graph, allow_unused=True
+    )
+    return torch.zeros_like(x) if g is None else g
+
+
+class HardConstraint:
+    """``y -> distance(x) * y + exact(x)``, usable with ``net.apply_output_transform``.
+
+    Args:
+        distance: ``distance(x)`` returns the ``(N, 1)`` factor that vanishes on
+            the constrained boundary.
+        exact: ``exact(x)`` returns the ``(N, k)`` boundary values, one column
+            per network output.
+        max_sets: Number of point sets kept in the cache (training points, test
+            points, prediction batches, ...).
+    """
+
+    def __init__(self, distance, exact, max_sets=4):
+        self.distance = distance
+        self.exact = exact
+        self.max_sets = max_sets
+        self._cache = OrderedDict()
+        # AsyncResampler fills the cache from its worker thread
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, x, y):
+        if not _is_torch(x) or not x.requires_grad:
+            return self.distance(x) * y + self.exact(x)
+        x0, value, jac, hess = self.jet(x)
+        dx = x - x0
+        d = x.shape[1]
+        g = value
+        for i in range(d):
+            dxi = dx[:, i : i + 1]
+            g = g + dxi * (jac[i] + 0.5 * dxi * hess[i][i])
+            for j in range(i + 1, d):
+                g = g + dxi * dx[:, j : j + 1] * hess[i][j]
+        return g[:, 0:1] * y + g[:, 1:]
+
+    def __getstate__(self):
+        # Copies and pickles get neither the cache nor the lock
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def jet(self, x):
+        """``(x0, g, jac, hess)`` of ``g = [distance, exact]`` at the points ``x``.
+
+        ``g`` is ``(N, 1 + k)``, ``jac[i]`` is ``dg/dx_i`` and ``hess[i][j]`` is
+        ``d2g/dx_i dx_j``, all detached and cached for the point set.
+        """
+        import torch
+
+        key = (tuple(x.shape), x.data_ptr())
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and torch.equal(entry[0], x.detach()):
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        with torch.enable_grad():
+            x0 = x.detach().clone().requires_grad_(True)
+            g = torch.cat([self.distance(x0), self.exact(x0)], 1)
+            d = x0.shape[1]
+            # jac[i] = dg/dx_i and hess[i][j] = d2g/dx_i dx_j, each of shape (N, 1 + k)
+            jac = [[] for _ in range(d)]
+            hess = [[[] for _ in range(d)] for _ in range(d)]
+            for c in range(g.shape[1]):
+                gc = _grad(g[:, c], x0, create_graph=True)
+                for i in range(d):
+                    jac[i].append(gc[:, i])
+                    hc = _grad(gc[:, i], x0)
+                    for j in range(d):
+                        hess[i][j].append(hc[:, j])
+        stack = lambda cols: torch.stack(cols, 1).detach()
+        entry = (
+            x0.detach(),
+            g.detach(),
+            [stack(cols) for cols in jac],
+            [[stack(cols) for cols in row] for row in hess],
+        )
+        with self._lock:
+            self._cache[key] = entry
+            if len(self._cache) > self.max_sets:
+                self._cache.popitem(last=False)
+        return entry
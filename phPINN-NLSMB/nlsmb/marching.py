@@ -0,0 +1,195 @@
+"""Time marching over windows in t.
+
+The scripts fit the whole ``(z, t)`` rectangle at once, so early in training
+the network fits the residual at late times before the solution there is
+determined by the initial data.  ``TimeMarching`` splits ``[t_lower,
+t_upper]`` into windows and trains them in order: every window starts from
+the network of the previous one and takes its initial condition from the
+prediction of that network on the window's first time line.  Inside a
+window the residuals can be weighted causally (Wang, Sankaran & Perdikaris,
+"Respecting causality is all you need for training physics-informed neural
+networks"): a time slice only gets weight once the slices before it have a
+small residual.
+"""
+
+import copy
+
+import deepxde as dde
+import numpy as np
+
+from .observation import ObservationBC
+
+__all__ = ["CausalWeights", "TimeMarching"]
+
+
+class CausalWeights:
+    """``operator`` with its residuals weighted by time slice.
+
+    The points are binned into ``slices`` slices of ``[t_lower, t_upper]``;
+    slice ``k`` gets the weight ``exp(-epsilon * sum_{j<k} L_j)``, where ``L_j``
+    is the detached mean squared residual of slice ``j``.  The residuals are
+    multiplied by the square root of the weight, so that the MSE loss weights
+    their squares.  PyTorch backend only.
+
+    Args:
+        operator: The PDE, ``operator(x, y)`` returns a list of residuals.
+        t_lower, t_upper: The time range of the slices.
+        slices: The number of time slices.
+        epsilon: The causality parameter; 0 gives equal weights.
+    """
+
+    def __init__(self, operator, t_lower, t_upper, slices=16, epsilon=1.0):
+        if dde.backend.backend_name != "pytorch":
+            raise ValueError("CausalWeights needs the PyTorch backend")
+        self.operator = operator
+        self.t_lower = t_lower
+        self.t_upper = t_upper
+        self.slices = slices
+        self.epsilon = epsilon
+        self.weights = None
+
+    def __call__(self, x, y):
+        import torch
+
+        f = self.operator(x, y)
+        t = (x[:, 1].detach() - self.t_lower) / (self.t_upper - self.t_lower)
+        index = (t * self.slices).long().clamp(0, self.slices - 1)
+        with torch.no_grad():
+            r2 = sum(fi.detach()[:, 0] ** 2 for fi in f)
+            zeros = r2.new_zeros(self.slices)
+            loss = zeros.index_add(0, index, r2)
+            count = zeros.index_add(0, index, torch.ones_like(r2))
+            loss = loss / count.clamp(min=1)
+            self.weights = torch.exp(-self.epsilon * (loss.cumsum(0) - loss))
+        scale = self.weights.sqrt()[index][:, None]
+        return [fi * scale for fi in f]
+
+
+class TimeMarching:
+    """Train ``net`` window by window in t, warm-starting every window.
+
+    Window 0 uses the observations of ``observation`` in its time range; every
+    later window uses those in its range plus ``num_initial`` points on its
+    first time line, observed with the prediction of the previous window.  A
+    copy of the network is kept per window, and ``predict`` evaluates each
+    point with the copy of its window.  PyTorch backend only.
+
+    Args:
+        net: The network, trained in place.
+        operator: The PDE.
+        space: The spatial geometry, e.g. ``space_domain``.
+        time: The ``dde.geometry.TimeDomain`` to split.
+        windows: The number of windows of equal length.
+        observation: An ``ObservationBC`` of initial and boundary data, or
+            ``None`` with a hard constraint.
+        num_domain: The number of collocation points per window.
+        num_initial: The number of initial points of windows after the first.
+        causal: The ``epsilon`` of ``CausalWeights`` inside every window, or
+            ``None`` for unweighted residuals.
+        slices: The number of causal time slices per window.
+        **data_kwargs: Further arguments of ``dde.data.TimePDE``, e.g.
+            ``train_distribution``.
+    """
+
+    def __init__(
+        self,
+        net,
+        operator,
+        space,
+        time,
+        windows,
+        observation=None,
+        num_domain=5000,
+        num_initial=200,
+        causal=None,
+        slices=16,
+        **data_kwargs,
+    ):
+        if dde.backend.backend_name != "pytorch":
+            raise ValueError("TimeMarching needs the PyTorch backend")
+        self.net = net
+        self.operator = operator
+        self.space = space
+        self.edges = np.linspace(time.t0, time.t1, windows + 1)
+        self.observation = observation
+        self.num_domain = num_domain
+        self.num_initial = num_initial
+        self.causal = causal
+        self.slices = slices
+        self.data_kwargs = data_kwargs
+        self.nets = []
+        self.model = None
+
+    def window(self, i):
+        """The ``dde.data.TimePDE`` of window ``i``."""
+        t0, t1 = self.edges[i], self.edges[i + 1]
+        geomtime = dde.geometry.GeometryXTime(
+            self.space, dde.geometry.TimeDomain(t0, t1)
+        )
+        bcs = []
+        if self.observation is not None:
+            obs = self.observation
+            values = dde.backend.to_numpy(obs.values)
+            t = obs.points[:, 1]
+            inside = (t > t0 if i > 0 else t >= t0) & (t <= t1)
+            bcs.append(ObservationBC(obs.points[inside], values[inside], obs.component))
+        if i > 0:
+            z = self.space.uniform_points(self.num_initial, boundary=True)
+            X0 = np.hstack((z, np.full_like(z[:, :1], t0)))
+            bcs.append(ObservationBC(X0, self.predict(X0)))
+        operator = self.operator
+        if self.causal is not None:
+            operator = CausalWeights(operator, t0, t1, self.slices, self.causal)
+        return dde.data.TimePDE(
+            geomtime, operator, bcs, num_domain=self.num_domain, **self.data_kwargs
+        )
+
+    def train(
+        self, iterations, loss_weights, initial_weight=100, lr=0.001, **train_kwargs
+    ):
+        """Train every window for ``iterations`` Adam steps; returns the loss
+        history and train state of the last window.
+
+        Args:
+            iterations: The number of steps per window.
+            loss_weights: The weights of the residuals, followed by that of the
+                observations if there are any.
+            initial_weight: The weight of the initial condition of the windows
+                after the first.
+            lr: The Adam learning rate.
+            **train_kwargs: Passed to ``model.train``.
+        """
+        for i in range(len(self.edges) - 1):
+            data = self.window(i)
+            weights = list(loss_weights)
+            if i > 0:
+                weights.append(initial_weight)
+            self.model = dde.Model(data, self.net)
+            self.model.compile("adam", lr=lr, loss="MSE", loss_weights=weights)
+            print(f"Time window {i}: t in [{self.edges[i]:g}, {self.edges[i + 1]:g}]")
+            losshistory, train_state = self.model.train(
+                iterations=iterations, **train_kwargs
+            )
+            self.nets.append(copy.deepcopy(self.net).eval())
+        return losshistory, train_state
+
+    def predict(self, X):
+        """The outputs at the points ``X``, each from the network of its window."""
+        import torch
+
+        X = np.asarray(X, dtype=dde.config.real(np))
+        window = np.searchsorted(self.edges[1:-1], X[:, 1], side="left")
+        window = np.minimum(window, len(self.nets) - 1)
+        y = None
+        with torch.no_grad():
+            for i, net in enumerate(self.nets):
+                rows = window == i
+                if not rows.any():
+                    continue
+                parameter = next(net.parameters())
+                out = net(torch.as_tensor(X[rows], device=parameter.device))
+                out = out.cpu().numpy()
+                if y is None:
+                    y = np.empty((len(X), out.shape[1]), dtype=out.dtype)
+                y[rows] = out
+        return y
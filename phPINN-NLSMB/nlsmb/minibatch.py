@@ -0,0 +1,107 @@
+"""Mini-batched collocation training.
+
+``dde.data.TimePDE`` trains full-batch: every step evaluates the network and
+its derivatives on all ``num_domain`` points plus the anchors, so the cost of
+a step and the memory of its autograd graph grow with the point count.
+``collocation_batches`` streams fixed-size mini-batches out of a large
+collocation pool, and the ``MiniBatch`` callback puts one of them in place of
+the domain points of the data before every step, so that the usual
+``model.compile("adam", ...)`` / ``model.train(...)`` flow trains on them.
+When training ends the full point set is put back, so a following full-batch
+L-BFGS stage, ``model.predict`` and RAR see the data as before.
+"""
+
+import numpy as np
+from deepxde.callbacks import Callback
+
+__all__ = ["MiniBatch", "collocation_batches"]
+
+
+def collocation_batches(pool, batch_size, seed=None):
+    """Endless mini-batches of ``batch_size`` rows of ``pool``.
+
+    Every pass over the pool (an epoch) uses a new random permutation; the
+    last incomplete batch of an epoch is dropped, so all batches have the same
+    shape.
+
+    Args:
+        pool: An ``(M, d)`` array of collocation points, or a function
+            returning a new one, called at the start of every epoch, e.g.
+            ``lambda: geomtime.random_points(400000)``.
+        batch_size: Number of points per batch, at most the pool size.
+        seed: Seed of the permutations.
+    """
+    rng = np.random.default_rng(seed)
+    while True:
+        points = pool() if callable(pool) else pool
+        if batch_size > len(points):
+            raise ValueError(
+                f"batch_size {batch_size} is larger than the pool ({len(points)})"
+            )
+        order = rng.permutation(len(points))
+        for start in range(0, len(points) - batch_size + 1, batch_size):
+            yield points[order[start : start + batch_size]]
+
+
+def _set_domain_points(data, X, solution=True):
+    """Make ``X`` plus the anchors the domain points of the PDE ``data``.
+
+    The points of the conditions, ``data.train_x_bc``, are kept rather than
+    recomputed from the new domain points.  With ``solution=False``,
+    ``train_y`` is left out, as the exact solution is only needed for the
+    metrics on the test points; this is the per-step path of mini-batches.
+    """
+    if data.anchors is not None:
+        X = np.vstack((data.anchors, X))
+    data.train_x_all = X
+    data.train_x = np.vstack((data.train_x_bc, X))
+    data.train_y = data.soln(data.train_x) if solution and data.soln else None
+    if data.auxiliary_var_fn is not None:
+        data.train_aux_vars = data.auxiliary_var_fn(data.train_x).astype(
+            data.train_x.dtype
+        )
+
+
+class MiniBatch(Callback):
+    """Train each step on the next mini-batch of ``batches``.
+
+    The batch replaces the domain points of the PDE data; the anchors (e.g.
+    added by RAR) and the points of the conditions are kept in every step.
+
+    Args:
+        batches: An iterator of ``(B, d)`` point arrays, e.g. from
+            ``collocation_batches``.
+    """
+
+    def __init__(self, batches):
+        super().__init__()
+        self.batches = iter(batches)
+        self._full = None
+
+    def on_train_begin(self):
+        data = self.model.data
+        self._full = (
+            data.train_x_all,
+            data.train_x_bc,
+            data.num_bcs,
+            data.train_x,
+            data.train_y,
+            data.train_aux_vars,
+        )
+
+    def on_batch_begin(self):
+        _set_domain_points(self.model.data, next(self.batches), solution=False)
+
+    def on_train_end(self):
+        data = self.model.data
+        (
+            data.train_x_all,
+            data.train_x_bc,
+            data.num_bcs,
+            data.train_x,
+            data.train_y,
+            data.train_aux_vars,
+        ) = self._full
+        self.model.train_state.set_data_train(
+            data.train_x, data.train_y, data.train_aux_vars
+        )
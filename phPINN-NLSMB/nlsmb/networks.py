@@ -0,0 +1,83 @@
+"""Network variants for the PyTorch backend.
+
+``SeparableNet`` exploits the tensor-product ``np.meshgrid(z, t)`` grid on which
+the scripts predict and evaluate: it has one network for z and one for t, and
+combines their feature vectors by an outer product, so that a grid prediction
+costs ``nz + nt`` network evaluations instead of ``nz * nt``.
+"""
+
+import deepxde as dde
+import numpy as np
+
+__all__ = ["SeparableNet"]
+
+
+class SeparableNet(dde.nn.NN):
+    """Separable network ``y_c(z, t) = sum_r f_cr(z) g_cr(t)``.
+
+    ``f`` and ``g`` are two ``dde.nn.FNN`` with a single input, each with
+    ``num_outputs * rank`` outputs.  Used as the ``net`` of a ``dde.Model`` it
+    is evaluated point by point like any other network, with output transforms
+    such as ``HardConstraint``; ``predict_grid`` and the fused derivatives of
+    ``NLSMBDerivatives`` evaluate each axis network once per distinct
+    coordinate, which on grid points, e.g. with ``train_distribution="uniform"``,
+    is ``O(nz + nt)``.
+
+    Args:
+        layer_sizes: The hidden layer sizes of each axis network, e.g. ``[64] * 4``.
+        num_outputs: The number of outputs ``k``.
+        rank: The number of feature pairs summed per output.
+        activation: Activation function of the axis networks.
+        kernel_initializer: Initializer for the kernel weights.
+    """
+
+    def __init__(self, layer_sizes, num_outputs, rank, activation, kernel_initializer):
+        if dde.backend.backend_name != "pytorch":
+            raise ValueError("SeparableNet needs the PyTorch backend")
+        import torch
+
+        super().__init__()
+        self.num_outputs = num_outputs
+        self.rank = rank
+        self.axes = torch.nn.ModuleList(
+            dde.nn.FNN(
+                [1] + list(layer_sizes) + [num_outputs * rank],
+                activation,
+                kernel_initializer,
+            )
+            for _ in range(2)
+        )
+
+    def features(self, axis, v):
+        """``(n, k, rank)`` features of the axis network at the ``(n, 1)``
+        coordinates ``v``."""
+        return self.axes[axis](v).reshape(len(v), self.num_outputs, self.rank)
+
+    def forward(self, inputs):
+        if self._input_transform is not None:
+            raise ValueError("SeparableNet does not support input transforms")
+        f = self.features(0, inputs[:, 0:1])
+        g = self.features(1, inputs[:, 1:2])
+        y = (f * g).sum(2)
+        if self._output_transform is not None:
+            y = self._output_transform(inputs, y)
+        return y
+
+    def predict_grid(self, z, t):
+        """The ``(nt * nz, k)`` outputs on ``np.meshgrid(z, t)``, in the row order
+        of ``X_star``."""
+        import torch
+
+        parameter = next(self.parameters())
+        as_column = lambda v: torch.tensor(
+            np.reshape(v, (-1, 1)), dtype=parameter.dtype, device=parameter.device
+        )
+        z, t = as_column(z), as_column(t)
+        with torch.no_grad():
+            f, g = self.features(0, z), self.features(1, t)
+            y = torch.einsum("ikr,jkr->jik", f, g).reshape(-1, self.num_outputs)
+            if self._output_transform is not None:
+                Z, T = torch.meshgrid(z[:, 0], t[:, 0], indexing="xy")
+                X = torch.stack([Z.flatten(), T.flatten()], 1)
+                y = self._output_transform(X, y)
+        return y.cpu().numpy()
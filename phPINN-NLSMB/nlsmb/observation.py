@@ -0,0 +1,45 @@
+"""All observed components on one point set as a single condition.
+
+The scripts used to build one ``dde.icbc.PointSetBC`` per output (Eu, Ev, pu,
+pv, eta) on the same ``X_u_train``.  DeepXDE stacks the points of every
+condition into the training input, so the network, and in the PDE pass its
+derivatives, were evaluated on five copies of the observation points.
+``ObservationBC`` puts the points in once and compares all the components in
+one error.
+"""
+
+import numpy as np
+from deepxde.icbc import PointSetBC
+
+__all__ = ["ObservationBC"]
+
+
+class ObservationBC(PointSetBC):
+    """Observations of consecutive output components on a set of points.
+
+    The error is scaled by ``sqrt(k)`` for ``k`` components, so that with
+    ``loss="MSE"`` its loss is the sum of the ``k`` per-component losses of
+    separate ``PointSetBC`` objects, and the loss weight of one of them can be
+    reused unchanged.  Unlike a ``PointSetBC`` with a list of components, it
+    works with every backend.
+
+    Args:
+        points: ``(N, d)`` observation points, e.g. ``X_u_train``.
+        values: An ``(N, k)`` array, or a list of ``k`` arrays of shape
+            ``(N, 1)``, one per component.
+        component: The output component of the first column of ``values``.
+    """
+
+    def __init__(self, points, values, component=0):
+        if isinstance(values, (list, tuple)):
+            values = np.hstack([np.reshape(v, (-1, 1)) for v in values])
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values[:, None]
+        super().__init__(points, values, component=component)
+        self.num_components = values.shape[1]
+        self._scale = float(np.sqrt(self.num_components))
+
+    def error(self, X, inputs, outputs, beg, end, aux_var=None):
+        stop = self.component + self.num_components
+        return (outputs[beg:end, self.component : stop] - self.values) * self._scale
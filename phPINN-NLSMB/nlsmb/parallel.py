@@ -0,0 +1,335 @@
+"""Data-parallel training in worker processes.
+
+One PyTorch run only uses more cores through the intra-op threads of each
+matmul, which hardly helps the 64- to 128-wide layers of the scripts.
+``DataParallel`` forks ``processes`` workers joined by ``torch.distributed``
+with the gloo backend on localhost.  Every worker keeps every
+``processes``-th collocation, anchor and observation point of the model's
+data, and scales the weight of every loss term by its share of that term's
+points, so that the losses of the workers sum to the loss of the whole data.
+In every evaluation of the loss, the gradients and the loss are summed over
+the workers with one all-reduce.  The workers thus take the same steps as a
+single process on all the points: Adam with the full gradient, and L-BFGS
+with the full loss and gradient in its line search, so that its steps and
+its convergence test agree between the workers.
+"""
+
+import copy
+import functools
+import multiprocessing
+import random
+import socket
+import traceback
+
+import deepxde as dde
+import numpy as np
+
+from .minibatch import _set_domain_points
+
+__all__ = ["DataParallel"]
+
+_COUNTS = ("num_domain", "num_boundary", "num_initial")
+
+
+class _AllReduce:
+    """An optimizer whose closure returns the loss and leaves the gradients
+    summed over all workers."""
+
+    def __init__(self, opt, params):
+        self.opt = opt
+        self.params = params
+
+    def __getattr__(self, name):
+        if name == "opt":
+            raise AttributeError(name)
+        return getattr(self.opt, name)
+
+    def step(self, closure):
+        import torch
+        import torch.distributed as dist
+
+        def reduced():
+            loss = closure()
+            grads = [
+                torch.zeros_like(p) if p.grad is None else p.grad for p in self.params
+            ]
+            flat = torch.cat([g.flatten() for g in grads] + [loss.detach().reshape(1)])
+            dist.all_reduce(flat)
+            offset = 0
+            for p in self.params:
+                p.grad = flat[offset : offset + p.numel()].view_as(p).clone()
+                offset += p.numel()
+            return flat[-1]
+
+        return self.opt.step(reduced)
+
+
+def _shard_points(data, train_points):
+    """The slice of the worker of a draw of ``train_points`` for all workers,
+    so that the shares stay disjoint also for uniform and quasi-random
+    distributions, which every worker would draw alike."""
+    if data.train_x_all is not None:
+        return data.train_x_all
+    rank, step = data.shard
+    counts = {name: getattr(data, name) for name in _COUNTS if getattr(data, name, 0)}
+    anchors = data.anchors
+    for name, count in counts.items():
+        setattr(data, name, count * step)
+    data.anchors = None
+    try:
+        X = train_points(data)[rank::step]
+    finally:
+        for name, count in counts.items():
+            setattr(data, name, count)
+        data.anchors = anchors
+    if anchors is not None:
+        X = np.vstack((anchors, X))
+    data.train_x_all = X
+    return X
+
+
+@functools.lru_cache(maxsize=None)
+def _sharded(cls):
+    """``cls`` drawing the share of a worker, see ``_shard_points``."""
+
+    def train_points(self):
+        return _shard_points(self, cls.train_points)
+
+    return type(cls.__name__, (cls,), {"train_points": train_points})
+
+
+def _reseed(callbacks, rank):
+    """Give the callbacks that draw from a generator of their own, such as
+    ``RADResampler``, a different one in every worker."""
+    for callback in callbacks:
+        rng = getattr(callback, "_rng", None)
+        if isinstance(rng, np.random.Generator):
+            callback._rng = np.random.default_rng([rng.integers(2**63), rank])
+
+
+def _mse(y_true, y_pred):
+    import torch
+
+    # A term with fewer points than workers has none in some workers, whose
+    # loss is then 0 rather than the nan of an empty mean
+    if y_pred.numel() == 0:
+        return y_pred.sum()
+    return torch.mean(torch.square(y_true - y_pred))
+
+
+def _reduce_losses(outputs_losses):
+    import torch.distributed as dist
+
+    def reduced(*args):
+        outputs, losses = outputs_losses(*args)
+        losses = losses.detach().clone()
+        dist.all_reduce(losses)
+        return outputs, losses
+
+    return reduced
+
+
+class DataParallel:
+    """Train ``model`` on shards of its data in ``processes`` workers.
+
+    The workers are forked, so the PDE and the network (with its output
+    transform) may be closures of the script.  Observations are sharded if
+    they are ``PointSetBC`` (e.g. ``ObservationBC``); other conditions take
+    their points from the sharded collocation points.  After training, the
+    parameters of the workers are loaded into ``model.net`` and ``model`` is
+    compiled for prediction.  PyTorch backend only.
+
+    Args:
+        model: The ``dde.Model``, with PDE data.
+        processes: The number of workers.
+        threads: ``torch`` threads per worker; ``processes * threads`` should
+            not exceed the cores.
+    """
+
+    def __init__(self, model, processes=2, threads=1):
+        if dde.backend.backend_name != "pytorch":
+            raise ValueError("DataParallel needs the PyTorch backend")
+        self.model = model
+        self.processes = processes
+        self.threads = threads
+
+    def shard(self, data, rank):
+        """Keep every ``processes``-th point of ``data``, starting at ``rank``,
+        also of the point sets drawn later."""
+        step = self.processes
+        bcs = []
+        for bc in data.bcs:
+            if isinstance(bc, dde.icbc.PointSetBC):
+                bc = copy.copy(bc)
+                bc.points = bc.points[rank::step]
+                bc.values = bc.values[rank::step]
+            bcs.append(bc)
+        data.bcs = bcs
+        n = 0 if data.anchors is None else len(data.anchors)
+        X = data.train_x_all[n:]
+        if n:
+            data.anchors = data.anchors[rank::step]
+        # Resamplers draw the share of the worker
+        for name in _COUNTS:
+            if getattr(data, name, 0):
+                setattr(data, name, -(-getattr(data, name) // step))
+        if not hasattr(data, "shard"):
+            data.__class__ = _sharded(type(data))
+        data.shard = rank, step
+        # Rebuild the points of the conditions and the test points of the shard
+        X = X[rank::step]
+        data.train_x_all = X if data.anchors is None else np.vstack((data.anchors, X))
+        data.train_x_bc = None
+        data.bc_points()
+        data.test_x = data.test_y = data.test_aux_vars = None
+        _set_domain_points(data, X)
+
+    def train(
+        self,
+        iterations,
+        loss_weights,
+        lr=0.001,
+        decay=None,
+        lbfgs=False,
+        metrics=None,
+        display_every=1000,
+        callbacks=None,
+        lbfgs_callbacks=None,
+    ):
+        """Train for ``iterations`` Adam steps, then with L-BFGS if ``lbfgs``;
+        returns the loss history and train state of worker 0.
+
+        Args:
+            iterations: The number of Adam steps.
+            loss_weights: The weights of all loss terms.
+            lr, decay: Of Adam.
+            lbfgs: Continue with L-BFGS, with ``dde.optimizers.LBFGS_options``.
+            metrics: Of both phases; worker 0 displays them on its test data.
+            display_every: Display period of worker 0; the others are quiet.
+            callbacks: Of the Adam phase, run in every worker, e.g. the
+                resampler or ``MiniBatch``; each draws its own share of the
+                points, with the random state of its worker.
+            lbfgs_callbacks: Of the L-BFGS phase, run in every worker.
+        """
+        context = multiprocessing.get_context("fork")
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        queue = context.Queue()
+        seed = np.random.randint(2**31 - self.processes)
+        settings = (
+            iterations,
+            loss_weights,
+            lr,
+            decay,
+            lbfgs,
+            metrics,
+            display_every,
+            callbacks,
+            lbfgs_callbacks,
+            port,
+            seed,
+        )
+        workers = [
+            context.Process(target=self._worker, args=(rank, queue, settings))
+            for rank in range(self.processes)
+        ]
+        for w in workers:
+            w.start()
+        state, history = None, None
+        for _ in workers:
+            rank, error, result = queue.get()
+            if error is not None:
+                for w in workers:
+                    w.terminate()
+                raise RuntimeError(f"worker {rank} failed:\n{error}")
+            if rank == 0:
+                state, history = result
+        for w in workers:
+            w.join()
+        model = self.model
+        model.net.load_state_dict(
+            {name: dde.backend.as_tensor(v) for name, v in state.items()}
+        )
+        model.compile("adam", lr=lr, loss_weights=loss_weights, metrics=metrics)
+        model.losshistory, model.train_state = history
+        return history
+
+    def _compile(self, optimizer, weights, metrics, **kwargs):
+        model = self.model
+        model.compile(
+            optimizer, loss=_mse, loss_weights=weights, metrics=metrics, **kwargs
+        )
+        model.opt = _AllReduce(model.opt, list(model.net.parameters()))
+        model.outputs_losses_train = _reduce_losses(model.outputs_losses_train)
+        model.outputs_losses_test = _reduce_losses(model.outputs_losses_test)
+
+    def _worker(self, rank, queue, settings):
+        try:
+            import torch
+            import torch.distributed as dist
+
+            (
+                iterations,
+                loss_weights,
+                lr,
+                decay,
+                lbfgs,
+                metrics,
+                display_every,
+                callbacks,
+                lbfgs_callbacks,
+                port,
+                seed,
+            ) = settings
+            torch.set_num_threads(self.threads)
+            dist.init_process_group(
+                "gloo",
+                init_method=f"tcp://127.0.0.1:{port}",
+                rank=rank,
+                world_size=self.processes,
+            )
+            # The workers draw different points, and take the network of worker 0
+            random.seed(seed + rank)
+            np.random.seed(seed + rank)
+            _reseed(list(callbacks or []) + list(lbfgs_callbacks or []), rank)
+            model = self.model
+            for p in model.net.parameters():
+                dist.broadcast(p.data, 0)
+            data = model.data
+            self.shard(data, rank)
+            num_bcs = np.array(data.num_bcs)
+            counts = np.append(len(data.train_x) - num_bcs.sum(), num_bcs)
+            totals = torch.as_tensor(counts, dtype=torch.float64)
+            dist.all_reduce(totals)
+            shares = counts / np.maximum(totals.numpy(), 1)
+            num_pde = len(loss_weights) - len(num_bcs)
+            shares = np.concatenate([np.full(num_pde, shares[0]), shares[1:]])
+            weights = (np.asarray(loss_weights) * shares).tolist()
+
+            verbose = 1 if rank == 0 else 0
+            self._compile("adam", weights, metrics, lr=lr, decay=decay)
+            history = model.train(
+                iterations=iterations,
+                display_every=display_every,
+                callbacks=callbacks,
+                verbose=verbose,
+            )
+            if lbfgs:
+                self._compile("L-BFGS", weights, metrics)
+                history = model.train(
+                    display_every=display_every,
+                    callbacks=lbfgs_callbacks,
+                    verbose=verbose,
+                )
+            result = None
+            if rank == 0:
+                state = {
+                    n: v.detach().cpu().numpy()
+                    for n, v in model.net.state_dict().items()
+                }
+                result = (state, history)
+            dist.destroy_process_group()
+            queue.put((rank, None, result))
+        except Exception:
+            queue.put((rank, traceback.format_exc(), None))
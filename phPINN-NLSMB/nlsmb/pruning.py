@@ -0,0 +1,124 @@
+"""Pruning of low-residual collocation points.
+
+Late in a long Adam run the residual is small over most of the domain, yet
+every step still differentiates the network twice at all ``num_domain``
+points.  ``CollocationPruner`` periodically evaluates the residual on the
+full point set and trains on a subset of it: the points with the largest
+residuals, a random part of the others, and enough points in every cell of a
+coarse grid over the domain that no region is left without points.  The
+next evaluation starts again from the full set, so points whose residual
+grows come back.
+"""
+
+import numpy as np
+from deepxde.callbacks import Callback
+
+from .chunked import pde_residual
+from .minibatch import _set_domain_points
+
+__all__ = ["CollocationPruner"]
+
+
+class CollocationPruner(Callback):
+    """Every ``period`` epochs, train on the domain points that are not pruned.
+
+    The bottom ``fraction`` of the domain points by residual is down-sampled to
+    a ``keep`` part of it; the anchors and the points of the conditions are
+    always kept.  Works with Adam and L-BFGS (whose epochs are
+    ``iter_per_step`` iterations long) and with a resampler placed before it
+    in the callbacks, whose new point sets become the full set.  The full set
+    is put back when training ends.
+
+    Args:
+        operator: The PDE, ``operator(x, y)`` returns a list of residuals.
+        period: Prune every ``period`` epochs.
+        fraction: The part of the domain points that may be pruned.
+        keep: The part of the prunable points kept at random.
+        bins: The number of grid cells per input dimension.
+        min_per_bin: The number of points every cell keeps, if it has as many.
+        seed: Seed of the down-sampling.
+    """
+
+    def __init__(
+        self,
+        operator,
+        period=1000,
+        fraction=0.5,
+        keep=0.1,
+        bins=16,
+        min_per_bin=2,
+        seed=None,
+    ):
+        super().__init__()
+        if not 0 <= fraction <= 1:
+            raise ValueError(f"fraction must be in [0, 1], got {fraction}")
+        if not 0 <= keep <= 1:
+            raise ValueError(f"keep must be in [0, 1], got {keep}")
+        self.operator = operator
+        self.period = period
+        self.fraction = fraction
+        self.keep = keep
+        self.bins = bins
+        self.min_per_bin = min_per_bin
+        self.epochs_since_last_prune = 0
+        self._rng = np.random.default_rng(seed)
+        self._full = None
+        self._cells = None
+        self._active = None
+
+    def on_train_begin(self):
+        self._full = None
+
+    def on_epoch_end(self):
+        self.epochs_since_last_prune += 1
+        if self.epochs_since_last_prune < self.period:
+            return
+        self.epochs_since_last_prune = 0
+        data = self.model.data
+        if self._full is None or data.train_x_all is not self._active:
+            self._set_full(data)
+        X = self._full
+        residual = pde_residual(self.model, self.operator, X)
+        m = int(self.fraction * len(X))
+        # The kth of argpartition must be below the point count; with
+        # fraction=1 every point may be pruned
+        low = np.arange(len(X)) if m >= len(X) else np.argpartition(residual, m)[:m]
+        dropped = low[self._rng.random(m) >= self.keep]
+        mask = np.ones(len(X), dtype=bool)
+        mask[dropped] = False
+        mask[self._refill(mask, dropped)] = True
+        _set_domain_points(data, X[mask])
+        self._active = data.train_x_all
+
+    def on_train_end(self):
+        data = self.model.data
+        if self._full is not None and data.train_x_all is self._active:
+            _set_domain_points(data, self._full)
+            self.model.train_state.set_data_train(
+                data.train_x, data.train_y, data.train_aux_vars
+            )
+        self._full = self._active = None
+
+    def _set_full(self, data):
+        n = 0 if data.anchors is None else len(data.anchors)
+        X = data.train_x_all[n:]
+        lo, hi = X.min(0), X.max(0)
+        index = np.floor((X - lo) / np.maximum(hi - lo, 1e-12) * self.bins)
+        index = np.clip(index, 0, self.bins - 1).astype(int)
+        self._full = X
+        self._cells = np.ravel_multi_index(index.T, (self.bins,) * X.shape[1])
+
+    def _refill(self, mask, dropped):
+        """The dropped points to restore so that every cell keeps
+        ``min_per_bin`` points where it can."""
+        cells = self._cells
+        deficit = self.min_per_bin - np.bincount(cells[mask], minlength=cells.max() + 1)
+        candidates = self._rng.permutation(dropped)
+        candidates = candidates[deficit[cells[candidates]] > 0]
+        # Rank the candidates of each cell in random order, and refill those
+        # ranked below the deficit of their cell
+        candidates = candidates[np.argsort(cells[candidates], kind="stable")]
+        c = cells[candidates]
+        first = np.searchsorted(c, c)
+        rank = np.arange(len(c)) - first
+        return candidates[rank < deficit[c]]
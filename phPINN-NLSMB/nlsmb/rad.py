@@ -0,0 +1,105 @@
+"""Residual-based adaptive distribution (RAD) of the collocation points.
+
+Instead of appending the largest residuals as anchors like RAR, RAD redraws
+the whole domain point set from the density
+
+    p(x) ∝ |f(x)|^k / mean(|f|^k) + c,
+
+with ``|f| = sum_i |f_i|`` the residual of the RAR loops, so the points follow
+the residual while ``c`` keeps part of them spread over the domain.  ``p`` is
+represented on a fixed pool of candidate points whose residuals are cached:
+every resample re-evaluates only a part of the pool, rebuilds the cumulative
+distribution of the weights once and draws all ``num_domain`` points from it
+by systematic resampling, ``O(M + num_domain)`` for a pool of ``M`` points.
+"""
+
+import numpy as np
+from deepxde.callbacks import Callback
+
+from .chunked import pde_residual
+from .minibatch import _set_domain_points
+
+__all__ = ["RADResampler"]
+
+
+class RADResampler(Callback):
+    """Every ``period`` epochs, replace the domain points of the data by
+    ``num_domain`` points drawn from the RAD density on ``pool``.
+
+    The anchors, e.g. added by RAR, and the points of the conditions are kept.
+    The pool residuals are computed in full at the first resample; later
+    resamples refresh the next ``refresh`` fraction of the pool in turn, so a
+    cached residual is at most ``1 / refresh`` resamples old.
+
+    Args:
+        operator: The PDE, ``operator(x, y)`` returns a list of residuals.
+        pool: The ``(M, d)`` candidate points, e.g.
+            ``geomtime.random_points(100000)``.
+        period: Resample every ``period`` epochs.
+        k: The exponent of the residual.
+        c: The constant added to the normalized weights; larger ``c`` is closer
+            to uniform sampling.
+        refresh: The fraction of the pool re-evaluated per resample.
+        chunk_size: The number of points per residual evaluation block.
+        seed: Seed of the sampling.
+    """
+
+    def __init__(
+        self,
+        operator,
+        pool,
+        period=100,
+        k=1,
+        c=1,
+        refresh=0.25,
+        chunk_size=2**14,
+        seed=None,
+    ):
+        super().__init__()
+        self.operator = operator
+        self.pool = np.asarray(pool)
+        self.period = period
+        self.k = k
+        self.c = c
+        self.refresh = refresh
+        self.chunk_size = chunk_size
+        self.residuals = None
+        self.cdf = None
+        self.epochs_since_last_resample = 0
+        self._cursor = 0
+        self._refresh_size = max(1, int(round(refresh * len(self.pool))))
+        self._rng = np.random.default_rng(seed)
+
+    def on_epoch_end(self):
+        self.epochs_since_last_resample += 1
+        if self.epochs_since_last_resample < self.period:
+            return
+        self.epochs_since_last_resample = 0
+        self.update_residuals()
+        _set_domain_points(self.model.data, self.sample(self.model.data.num_domain))
+
+    def update_residuals(self):
+        """Evaluate the residuals of the next ``refresh`` part of the pool (all
+        of it the first time) and rebuild the cumulative distribution."""
+        if self.residuals is None:
+            self.residuals = pde_residual(
+                self.model, self.operator, self.pool, self.chunk_size
+            )
+        else:
+            M = len(self.pool)
+            rows = np.arange(self._cursor, self._cursor + self._refresh_size) % M
+            self._cursor = (self._cursor + self._refresh_size) % M
+            self.residuals[rows] = pde_residual(
+                self.model, self.operator, self.pool[rows], self.chunk_size
+            )
+        weights = self.residuals**self.k
+        weights = weights / weights.mean() + self.c
+        self.cdf = np.cumsum(weights)
+        self.cdf /= self.cdf[-1]
+
+    def sample(self, n):
+        """``n`` pool points drawn from the cached distribution."""
+        # Systematic resampling: the intervals of the cumulative distribution
+        # that n equally spaced quantiles fall into
+        counts = np.diff(np.floor(self.cdf * n + self._rng.random()), prepend=0)
+        return self.pool[np.repeat(np.arange(len(self.pool)), counts.astype(int))]
@@ -0,0 +1,113 @@
+"""Collocation resampling in a background thread.
+
+``dde.callbacks.PDEPointResampler`` redraws the training points on the main
+thread: every ``period`` epochs training stops while new points are sampled,
+the condition points and the training arrays are rebuilt and, with
+``hard_constraint`` on, the ``HardConstraint`` jets of the new set are
+computed on its first forward pass.  ``AsyncResampler`` keeps a second point
+set that a worker thread prepares while the current one is trained, so that
+the resample itself only exchanges the arrays of the data.  The same worker
+runs other sampling jobs through ``submit``, e.g. the RAR candidates.
+"""
+
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
+import deepxde as dde
+import numpy as np
+from deepxde.callbacks import Callback
+
+from .hard_constraint import HardConstraint
+
+__all__ = ["AsyncResampler"]
+
+_FIELDS = (
+    "train_x_all",
+    "train_x_bc",
+    "num_bcs",
+    "train_x",
+    "train_y",
+    "train_aux_vars",
+)
+
+
+class AsyncResampler(Callback):
+    """``dde.callbacks.PDEPointResampler(period)`` that prepares the next point
+    set in a worker thread.
+
+    The next set is drawn by ``train_next_batch`` of a shallow copy of the data,
+    with the anchors of the data at that moment, so it is sampled exactly like
+    the set of ``PDEPointResampler``.  If the anchors change before it is used
+    (``add_anchors`` between two ``model.train`` calls), it is drawn again.
+
+    Args:
+        period: Resample the PDE points every ``period`` epochs.
+    """
+
+    def __init__(self, period=100):
+        super().__init__()
+        self.period = period
+        self.epochs_since_last_resample = 0
+        self.num_bcs_initial = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="resampler")
+        self._next = None
+        self._anchors = None
+
+    def submit(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the worker, after the point sets already
+        queued; returns a ``concurrent.futures.Future``.
+
+        For RAR, ``resampler.submit(geomtime.random_points, 100000)`` draws the
+        candidates of the next round while the current one trains.
+        """
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def on_train_begin(self):
+        data = self.model.data
+        self.num_bcs_initial = data.num_bcs
+        if self._next is None or self._anchors is not data.anchors:
+            self._prepare_next()
+
+    def on_epoch_end(self):
+        self.epochs_since_last_resample += 1
+        if self.epochs_since_last_resample < self.period:
+            return
+        self.epochs_since_last_resample = 0
+        data = self.model.data
+        if self._anchors is not data.anchors:
+            self._prepare_next()
+        for name, value in zip(_FIELDS, self._next.result()):
+            setattr(data, name, value)
+        self._prepare_next()
+
+        if not np.array_equal(self.num_bcs_initial, data.num_bcs):
+            print("Initial value of self.num_bcs:", self.num_bcs_initial)
+            print("self.model.data.num_bcs:", data.num_bcs)
+            raise ValueError(
+                "`num_bcs` changed! Please update the loss function by `model.compile`."
+            )
+
+    def _prepare_next(self):
+        data = self.model.data
+        shadow = copy.copy(data)
+        for name in _FIELDS:
+            setattr(shadow, name, None)
+        transform = getattr(self.model.net, "_output_transform", None)
+        if (
+            not isinstance(transform, HardConstraint)
+            or dde.backend.backend_name != "pytorch"
+        ):
+            transform = None
+        self._anchors = data.anchors
+        self._next = self.submit(self._draw, shadow, transform)
+
+    @staticmethod
+    def _draw(data, transform):
+        data.train_next_batch()
+        if transform is not None:
+            import torch
+
+            # The model feeds torch.as_tensor(train_x), which shares this
+            # memory, so its first forward pass finds the jet in the cache
+            transform.jet(torch.as_tensor(data.train_x))
+        return tuple(getattr(data, name) for name in _FIELDS)
@@ -0,0 +1,178 @@
+"""Cache of finished runs, keyed by a hash of everything that determines them.
+
+Running a script again with nothing changed trains from scratch and writes
+another ``output_<time>`` folder with the same results.  ``RunCache`` hashes
+the case name, the config, the source of the script (whose module-level
+switches are its config), the sources of this package, the deepxde version,
+the backend and the seed.  At the end of a run,
+``store`` records the output folder under this key, together with the saved
+model, the prediction on ``X_star`` and the ``.mat`` results.  The next run
+with the same key finds the folder as ``folder`` and can print the stored
+results instead of training, or load the model and prediction and redo only
+the metrics and plots.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+
+import deepxde as dde
+import numpy as np
+from scipy import io
+
+from .grid_cache import default_cache_dir
+
+__all__ = ["RunCache"]
+
+
+def _source_digest(paths, ignore):
+    # The cache switches do not change the result, their assignments are not
+    # hashed
+    pattern = re.compile(rb"^\s*(%s)\s*=" % b"|".join(n.encode() for n in ignore))
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            for line in f:
+                if not (ignore and pattern.match(line)):
+                    digest.update(line)
+    return digest.hexdigest()
+
+
+def _package_digest():
+    # The networks, samplers and callbacks of the scripts live in this package,
+    # and changing them changes the result too
+    here = os.path.dirname(os.path.abspath(__file__))
+    return _source_digest(sorted(glob.glob(os.path.join(here, "*.py"))), ())
+
+
+class RunCache:
+    """The cached run of ``case`` with this config, code, backend and seed.
+
+    The code is the ``sources``, the ``.py`` files of this package and the
+    installed deepxde version.
+
+    Args:
+        case: Name of the case, e.g. ``"two_solitons"``.
+        sources: The files whose content is part of the key, usually
+            ``[__file__]``.
+        config: A JSON-serializable dict of further settings, e.g. a Hydra
+            config as a container.
+        seed: The random seed of the run.
+        version: Bump it to invalidate the cached runs of ``case``.
+        cache_dir: Defaults to ``default_cache_dir()``; the index is kept in
+            its ``runs`` subdirectory.
+        ignore: Variables whose assignments in ``sources`` are left out of
+            the key, such as the switches of the cache itself.
+
+    Attributes:
+        key: The hash of the run.
+        folder: The output folder of the cached run, or ``None`` on a miss.
+    """
+
+    def __init__(
+        self,
+        case,
+        sources=(),
+        config=None,
+        seed=None,
+        version=0,
+        cache_dir=None,
+        ignore=("use_cache", "regenerate"),
+    ):
+        self.meta = {
+            "case": case,
+            "config": config,
+            "source": _source_digest(sources, ignore),
+            "package": _package_digest(),
+            "deepxde": dde.__version__,
+            "backend": dde.backend.backend_name,
+            "float": dde.config.default_float(),
+            "seed": seed,
+            "version": version,
+        }
+        text = json.dumps(self.meta, sort_keys=True, default=str)
+        self.key = f"{case}-{hashlib.sha1(text.encode()).hexdigest()[:16]}"
+        self.index = os.path.join(
+            cache_dir or default_cache_dir(), "runs", f"{self.key}.json"
+        )
+        self.entry = self._load()
+
+    def _load(self):
+        try:
+            with open(self.index) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # An output directory that was deleted or moved counts as no cache
+        files = [entry["mat"], entry["prediction"]]
+        if not all(os.path.isfile(os.path.join(entry["folder"], p)) for p in files):
+            return None
+        return entry
+
+    @property
+    def folder(self):
+        return None if self.entry is None else self.entry["folder"]
+
+    @property
+    def elapsed(self):
+        """The training time of the cached run."""
+        return self.entry["elapsed"]
+
+    @property
+    def checkpoint(self):
+        """The path of the saved model, or ``None`` if none was stored."""
+        if self.entry is None or self.entry["checkpoint"] is None:
+            return None
+        return os.path.join(self.entry["folder"], self.entry["checkpoint"])
+
+    def prediction(self):
+        """The stored prediction on ``X_star``."""
+        return np.load(os.path.join(self.folder, self.entry["prediction"]))
+
+    def results(self):
+        """The stored ``.mat`` results as a dict."""
+        return io.loadmat(os.path.join(self.folder, self.entry["mat"]))
+
+    def report(self):
+        """Print the L2 errors and training time of the cached run."""
+        results = self.results()
+        print(f"Cached run {self.key} in {self.folder}")
+        for name in ["E", "p", "eta"]:
+            error = results[f"{name}_L2_relative_error"].item()
+            print(f"{name} L2 relative error: {error:e}")
+        print(f"Training took {results['elapsed'].item():.1f} s")
+
+    def store(self, folder, prediction, mat, elapsed, model=None):
+        """Record the finished run in ``folder`` under this key.
+
+        Args:
+            folder: The output folder of the run.
+            prediction: The prediction on ``X_star``, saved to the folder.
+            mat: The path of the ``.mat`` results, which must be in ``folder``.
+            elapsed: The training time.
+            model: The trained ``dde.Model`` to save, or ``None`` if the
+                prediction does not come from one model.
+        """
+        folder = os.path.abspath(folder)
+        np.save(os.path.join(folder, "prediction.npy"), prediction)
+        checkpoint = None
+        if model is not None:
+            checkpoint = os.path.relpath(
+                model.save(os.path.join(folder, "cached_model")), folder
+            )
+        entry = {
+            "folder": folder,
+            "prediction": "prediction.npy",
+            "mat": os.path.relpath(os.path.abspath(mat), folder),
+            "checkpoint": checkpoint,
+            "elapsed": float(elapsed),
+            "meta": self.meta,
+        }
+        os.makedirs(os.path.dirname(self.index), exist_ok=True)
+        tmp = f"{self.index}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(tmp, self.index)
+        self.entry = entry
@@ -0,0 +1,228 @@
+"""Switching from Adam to L-BFGS when Adam stops making progress.
+
+The scripts train a fixed number of Adam steps before L-BFGS, and L-BFGS runs
+until ``maxiter``.  A fixed count is either too short, and L-BFGS starts far
+from a minimum where it is unstable, or too long, and thousands of Adam steps
+hardly change the loss.  ``AdamLBFGS`` trains with Adam until the smoothed
+loss and gradient norm have both stopped decreasing, switches to L-BFGS, and
+stops L-BFGS once its smoothed loss stagnates.  It reports the wall-clock
+time saved against the fixed schedule.
+"""
+
+import collections
+import math
+import time
+
+import deepxde as dde
+import numpy as np
+from deepxde.callbacks import Callback
+
+__all__ = ["AdamLBFGS", "Plateau"]
+
+
+def _ema(old, new, smoothing):
+    return new if old is None else smoothing * old + (1 - smoothing) * new
+
+
+class Plateau(Callback):
+    """Stop training once it has plateaued.
+
+    The total training loss is read whenever deepxde evaluates it (every
+    ``display_every`` steps, or every L-BFGS epoch), and with the PyTorch
+    backend the gradient norm after every step; both are smoothed with an
+    exponential moving average.  Training stops when neither has decreased by
+    a relative ``tol`` over the last ``patience`` steps, or when the loss is
+    not finite.
+
+    Args:
+        patience: The window in steps.
+        tol: The relative decrease that counts as progress.
+        min_steps: Never stop before this many steps of this training run.
+        smoothing: The factor of the moving averages.
+    """
+
+    def __init__(self, patience=2000, tol=1e-2, min_steps=0, smoothing=0.9):
+        super().__init__()
+        self.patience = patience
+        self.tol = tol
+        self.min_steps = min_steps
+        self.smoothing = smoothing
+        self.stopped_step = None
+
+    def on_train_begin(self):
+        self.start = self.model.train_state.step
+        self.records = collections.deque()
+        self.loss = None
+        self.grad = None
+        self.stopped_step = None
+        self._last = None
+
+    def on_batch_end(self):
+        if dde.backend.backend_name != "pytorch":
+            return
+        squares = [
+            p.grad.pow(2).sum()
+            for p in self.model.net.parameters()
+            if p.grad is not None
+        ]
+        if squares:
+            grad = math.sqrt(float(sum(squares)))
+            self.grad = _ema(self.grad, grad, self.smoothing)
+
+    def on_epoch_end(self):
+        ts = self.model.train_state
+        # deepxde only replaces loss_train by a new array when it evaluates
+        if ts.loss_train is None or ts.loss_train is self._last:
+            return
+        self._last = ts.loss_train
+        loss = float(np.sum(ts.loss_train))
+        if not math.isfinite(loss):
+            self._stop()
+            return
+        self.loss = _ema(self.loss, loss, self.smoothing)
+        self.records.append((ts.step, self.loss, self.grad))
+        while len(self.records) > 1 and self.records[1][0] <= ts.step - self.patience:
+            self.records.popleft()
+        step, loss0, grad0 = self.records[0]
+        if step > ts.step - self.patience or ts.step - self.start < self.min_steps:
+            return
+        if self._improved(loss0, self.loss) or self._improved(grad0, self.grad):
+            return
+        self._stop()
+
+    def _improved(self, old, new):
+        return old is not None and new is not None and old - new > self.tol * abs(old)
+
+    def _stop(self):
+        self.stopped_step = self.model.train_state.step
+        self.model.stop_training = True
+
+
+class AdamLBFGS:
+    """Adam until it plateaus, then L-BFGS until it stagnates.
+
+    Args:
+        model: The ``dde.Model``.
+        max_adam: The most Adam steps, i.e. those of the fixed schedule.
+        patience, tol: The ``Plateau`` window and relative decrease of Adam.
+        min_adam: The fewest Adam steps.
+        lbfgs_patience, lbfgs_tol: The same for L-BFGS, in iterations.
+        check_every: L-BFGS iterations per epoch while it runs, i.e. how
+            often its loss is checked; deepxde's default is 1000.
+        smoothing: The factor of the moving averages.
+
+    Attributes:
+        summary: The steps and times of both phases after ``train``.
+    """
+
+    def __init__(
+        self,
+        model,
+        max_adam=30000,
+        patience=2000,
+        tol=1e-2,
+        min_adam=2000,
+        lbfgs_patience=1000,
+        lbfgs_tol=1e-3,
+        check_every=100,
+        smoothing=0.9,
+    ):
+        self.model = model
+        self.max_adam = max_adam
+        self.adam = Plateau(patience, tol, min_adam, smoothing)
+        self.lbfgs = Plateau(lbfgs_patience, lbfgs_tol, 0, smoothing)
+        self.check_every = check_every
+        self.summary = None
+
+    def train(
+        self,
+        lr=0.001,
+        loss_weights=None,
+        decay=None,
+        callbacks=None,
+        lbfgs_callbacks=None,
+        display_every=100,
+        model_save_path=None,
+        **compile_kwargs,
+    ):
+        """Train both phases; returns the loss history and train state.
+
+        Args:
+            lr, decay: Of Adam.
+            loss_weights: Of both phases.
+            callbacks: Of the Adam phase, e.g. the resampler.
+            lbfgs_callbacks: Of the L-BFGS phase.
+            display_every: Also how often the Adam loss is checked, so it
+                should be well below ``patience``.
+            model_save_path: Passed to both ``model.train``.
+            **compile_kwargs: Passed to both ``model.compile``, e.g. metrics.
+        """
+        model = self.model
+        model.compile(
+            "adam",
+            lr=lr,
+            loss="MSE",
+            decay=decay,
+            loss_weights=loss_weights,
+            **compile_kwargs,
+        )
+        start = model.train_state.step
+        tic = time.perf_counter()
+        model.train(
+            iterations=self.max_adam,
+            display_every=display_every,
+            model_save_path=model_save_path,
+            callbacks=list(callbacks or []) + [self.adam],
+        )
+        adam_time = time.perf_counter() - tic
+        adam_steps = model.train_state.step - start
+
+        # Run check_every L-BFGS iterations per epoch, so that the plateau is
+        # checked without waiting 1000 iterations
+        options = dde.optimizers.LBFGS_options
+        saved = options["iter_per_step"], options["fun_per_step"]
+        options["iter_per_step"] = min(self.check_every, options["maxiter"])
+        options["fun_per_step"] = int(options["iter_per_step"] * 1.25)
+        try:
+            model.compile("L-BFGS", loss_weights=loss_weights, **compile_kwargs)
+            start = model.train_state.step
+            tic = time.perf_counter()
+            losshistory, train_state = model.train(
+                display_every=display_every,
+                model_save_path=model_save_path,
+                callbacks=list(lbfgs_callbacks or []) + [self.lbfgs],
+            )
+            lbfgs_time = time.perf_counter() - tic
+            lbfgs_steps = model.train_state.step - start
+        finally:
+            options["iter_per_step"], options["fun_per_step"] = saved
+
+        self.summary = {
+            "adam_steps": adam_steps,
+            "adam_time": adam_time,
+            "lbfgs_steps": lbfgs_steps,
+            "lbfgs_time": lbfgs_time,
+            "max_lbfgs": options["maxiter"],
+        }
+        self.report()
+        return losshistory, train_state
+
+    def report(self):
+        """Print the steps of both phases and the time saved against running
+        ``max_adam`` Adam steps and L-BFGS up to ``maxiter``."""
+        s = self.summary
+        adam_saved = (self.max_adam - s["adam_steps"]) * s["adam_time"]
+        adam_saved /= max(s["adam_steps"], 1)
+        # Where L-BFGS converges by itself, the fixed schedule stops at the same step
+        lbfgs_saved = 0
+        if self.lbfgs.stopped_step is not None:
+            lbfgs_saved = (s["max_lbfgs"] - s["lbfgs_steps"]) * s["lbfgs_time"]
+            lbfgs_saved /= max(s["lbfgs_steps"], 1)
+        print(
+            f"Adam: {s['adam_steps']} of {self.max_adam} steps in "
+            f"{s['adam_time']:.1f} s; saved about {adam_saved:.1f} s"
+        )
+        print(
+            f"L-BFGS: {s['lbfgs_steps']} of at most {s['max_lbfgs']} iterations in "
+            f"{s['lbfgs_time']:.1f} s; saved at most {lbfgs_saved:.1f} s"
+        )
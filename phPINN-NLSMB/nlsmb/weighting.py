@@ -0,0 +1,238 @@
+"""Self-adaptive loss weights.
+
+The scripts weight the five PDE residuals by 1 and the observations by 100,
+a choice tuned by hand per case; with a poor one the terms train at very
+different rates and thousands of iterations are lost.  ``AdaptiveWeights``
+sets the weights from the gradients of the loss terms every ``period``
+steps, with one of three rules:
+
+* ``"grad_norm"``: every term gets the weight that makes the norm of its
+  weighted gradient the mean of the gradient norms of all terms.
+* ``"annealing"``: learning rate annealing (Wang, Teng & Perdikaris,
+  "Understanding and mitigating gradient pathologies in physics-informed
+  neural networks"); the PDE terms keep their weights and every other term
+  gets ``max |grad L_r| / mean |grad L_i|``, where ``L_r`` is the weighted
+  PDE loss.
+* ``"ntk"``: the NTK rule of Wang, Yu & Perdikaris, "When and why PINNs fail
+  to train: A neural tangent kernel perspective"; term ``i`` gets
+  ``tr(K) / tr(K_ii)``.  The trace of its NTK block is the squared Frobenius
+  norm of the Jacobian of its residuals, estimated with one Rademacher
+  vector ``v`` as ``|J^T v|^2``, i.e. one backward pass per term.
+
+All rules cost one forward pass and one backward pass per term, and the new
+weights are smoothed with a moving average.  ``compare_weightings`` trains
+the same initial network with the fixed weights and with every rule, and
+prints how many steps and seconds each needs to reach a target L2 error.
+"""
+
+import copy
+import random
+import time
+
+import deepxde as dde
+import numpy as np
+from deepxde.callbacks import Callback
+
+__all__ = ["AdaptiveWeights", "TimeToTarget", "compare_weightings"]
+
+
+def _probe(y_true, y_pred):
+    import torch
+
+    # The gradient of the product of the residuals with a random vector v of
+    # ±1 with respect to the parameters is J^T v
+    return (y_pred * (torch.randint_like(y_pred, 2) * 2 - 1)).sum()
+
+
+class AdaptiveWeights(Callback):
+    """Every ``period`` steps, update ``model.loss_weights`` by ``strategy``.
+
+    Use it with Adam; L-BFGS needs a fixed loss.  PyTorch backend only.
+
+    Args:
+        strategy: ``"grad_norm"``, ``"annealing"`` or ``"ntk"``.
+        period: Steps between updates.
+        alpha: The moving average factor of the weights.
+        num_pde: The number of PDE residual terms, which come first.
+
+    Attributes:
+        weights: The current weights, also ``model.loss_weights``.
+        history: ``(step, weights)`` of every update.
+        overhead: Seconds spent on the updates.
+    """
+
+    def __init__(self, strategy="grad_norm", period=100, alpha=0.9, num_pde=5):
+        super().__init__()
+        if dde.backend.backend_name != "pytorch":
+            raise ValueError("AdaptiveWeights needs the PyTorch backend")
+        if strategy not in ("grad_norm", "annealing", "ntk"):
+            raise ValueError(f"Unknown strategy {strategy}")
+        self.strategy = strategy
+        self.period = period
+        self.alpha = alpha
+        self.num_pde = num_pde
+        self.weights = None
+        self.history = []
+        self.overhead = 0.0
+
+    def on_train_begin(self):
+        if self.weights is None:
+            n = len(self.model.train_state.loss_train)
+            weights = self.model.loss_weights
+            self.weights = np.ones(n) if weights is None else np.array(weights, float)
+        self.update()
+
+    def on_batch_end(self):
+        if self.model.train_state.step - self.last_step >= self.period:
+            self.update()
+
+    def update(self):
+        """Compute and set the weights of the current training points."""
+        tic = time.perf_counter()
+        loss_fn = _probe if self.strategy == "ntk" else dde.losses.get("MSE")
+        grads = self._gradients(loss_fn)
+        if self.strategy == "grad_norm":
+            norms = np.array([np.linalg.norm(g) for g in grads])
+            target = norms.mean() / np.maximum(norms, 1e-30)
+        elif self.strategy == "annealing":
+            pde = sum(w * g for w, g in zip(self.weights, grads[: self.num_pde]))
+            peak = np.abs(pde).max()
+            target = self.weights.copy()
+            for i in range(self.num_pde, len(grads)):
+                target[i] = peak / max(np.abs(grads[i]).mean(), 1e-30)
+        else:
+            traces = np.array([np.dot(g, g) for g in grads])
+            target = traces.sum() / np.maximum(traces, 1e-30)
+        self.weights = self.alpha * self.weights + (1 - self.alpha) * target
+        self.model.loss_weights = self.weights.tolist()
+        self.last_step = self.model.train_state.step
+        self.history.append((self.last_step, self.weights.copy()))
+        self.overhead += time.perf_counter() - tic
+
+    def _gradients(self, loss_fn):
+        """The gradients of the unweighted loss terms as flat arrays."""
+        import torch
+
+        model = self.model
+        ts = model.train_state
+        inputs = torch.as_tensor(ts.X_train).requires_grad_()
+        targets = None if ts.y_train is None else torch.as_tensor(ts.y_train)
+        outputs = model.net(inputs)
+        losses = model.data.losses_train(targets, outputs, loss_fn, inputs, model)
+        params = [p for p in model.net.parameters() if p.requires_grad]
+        grads = []
+        for loss in losses:
+            g = torch.autograd.grad(loss, params, retain_graph=True, allow_unused=True)
+            g = [torch.zeros_like(p) if gi is None else gi for p, gi in zip(params, g)]
+            grads.append(torch.cat([gi.flatten() for gi in g]).cpu().numpy())
+        dde.grad.clear()
+        return grads
+
+
+class TimeToTarget(Callback):
+    """Stop training when the first test metric reaches ``target``.
+
+    Attributes:
+        step, seconds: When it was reached, or ``None``.
+        error: The last value of the metric.
+    """
+
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+
+    def on_train_begin(self):
+        self.start = self.model.train_state.step
+        self.tic = time.perf_counter()
+        self.step = self.seconds = self.error = None
+        self._last = None
+
+    def on_epoch_end(self):
+        metrics = self.model.train_state.metrics_test
+        if not metrics or metrics is self._last:
+            return
+        self._last = metrics
+        self.error = float(metrics[0])
+        if self.error <= self.target:
+            self.step = self.model.train_state.step - self.start
+            self.seconds = time.perf_counter() - self.tic
+            self.model.stop_training = True
+
+
+# The training points of a ``dde.data.PDE``, which the resamplers replace
+_POINTS = (
+    "train_x_all",
+    "train_x",
+    "train_y",
+    "train_x_bc",
+    "train_aux_vars",
+    "anchors",
+)
+
+
+def compare_weightings(
+    model,
+    target,
+    iterations,
+    loss_weights=None,
+    strategies=("fixed", "grad_norm", "annealing", "ntk"),
+    period=100,
+    num_pde=5,
+    lr=0.001,
+    display_every=100,
+    callbacks=None,
+    **compile_kwargs,
+):
+    """Train ``model`` from its current network once per strategy, for at
+    most ``iterations`` Adam steps, and print the steps and seconds each
+    needs to reach an L2 relative error of ``target``.
+
+    ``"fixed"`` keeps ``loss_weights``, which are also the initial weights of
+    the other strategies.  Every run starts from the same network, training
+    points and random number generator states.  ``callbacks`` is a function
+    that returns new callbacks for each run, e.g. ``lambda: [resampler()]``,
+    so that runs share no callback state.  The model needs the
+    ``"l2 relative error"`` metric, which is added if ``compile_kwargs`` has
+    no metrics.  Returns a dict of the ``TimeToTarget`` of every strategy.
+    """
+    import torch
+
+    compile_kwargs.setdefault("metrics", ["l2 relative error"])
+    initial = copy.deepcopy(model.net.state_dict())
+    data = model.data
+    points = {name: copy.deepcopy(getattr(data, name)) for name in _POINTS}
+    rng = random.getstate(), np.random.get_state(), torch.get_rng_state()
+    results = {}
+    for strategy in strategies:
+        model.net.load_state_dict(initial)
+        for name, value in points.items():
+            setattr(data, name, copy.deepcopy(value))
+        random.setstate(rng[0])
+        np.random.set_state(rng[1])
+        torch.set_rng_state(rng[2])
+        model.train_state = dde.model.TrainState()
+        model.losshistory = dde.model.LossHistory()
+        model.compile("adam", lr=lr, loss_weights=loss_weights, **compile_kwargs)
+        results[strategy] = TimeToTarget(target)
+        extra = [results[strategy]]
+        if strategy != "fixed":
+            extra.append(AdaptiveWeights(strategy, period, num_pde=num_pde))
+        model.train(
+            iterations=iterations,
+            display_every=display_every,
+            callbacks=(callbacks() if callbacks else []) + extra,
+        )
+
+    baseline = results.get("fixed")
+    print(f"Steps and time to an L2 relative error of {target:.1e}:")
+    print(f"{'strategy':<12}{'steps':>8}{'time [s]':>12}{'speedup':>10}{'L2':>12}")
+    for strategy, result in results.items():
+        if result.step is None:
+            reached = f"{'-':>8}{'-':>12}{'-':>10}"
+        else:
+            speedup = "-"
+            if baseline is not None and baseline.seconds is not None:
+                speedup = f"{baseline.seconds / result.seconds:.2f}"
+            reached = f"{result.step:>8}{result.seconds:>12.1f}{speedup:>10}"
+        print(f"{strategy:<12}{reached}{result.error:>12.3e}")
+    return results
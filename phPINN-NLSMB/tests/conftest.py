@@ -0,0 +1,53 @@
+import os
+import sys
+
+os.environ.setdefault("DDEBACKEND", "pytorch")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import deepxde as dde
+import numpy as np
+import pytest
+
+
+def poisson_pde(x, y):
+    # -u'' = pi^2 sin(pi x), solved by sin(pi x); a list of residuals like the
+    # NLS-MB pde
+    u_xx = dde.grad.hessian(y, x)
+    return [-u_xx - np.pi**2 * dde.backend.sin(np.pi * x)]
+
+
+def poisson_solution(x):
+    return np.sin(np.pi * x)
+
+
+@pytest.fixture
+def poisson_model():
+    """``make(num_domain=64, num_boundary=2, observations=0)``: a fresh
+    ``dde.Model`` of the 1D Poisson problem on [-1, 1], with the same initial
+    network for the same arguments."""
+
+    def make(num_domain=64, num_boundary=2, observations=0, seed=0):
+        dde.config.set_random_seed(seed)
+        geom = dde.geometry.Interval(-1, 1)
+        bcs = [
+            dde.icbc.DirichletBC(
+                geom, lambda x: np.zeros((len(x), 1)), lambda _, on: on
+            )
+        ]
+        if observations:
+            X = np.linspace(-0.9, 0.9, observations)[:, None]
+            bcs.append(dde.icbc.PointSetBC(X, poisson_solution(X)))
+        data = dde.data.PDE(
+            geom,
+            poisson_pde,
+            bcs,
+            num_domain=num_domain,
+            num_boundary=num_boundary,
+            solution=poisson_solution,
+            num_test=50,
+            train_distribution="uniform",
+        )
+        net = dde.nn.FNN([1, 16, 16, 1], "tanh", "Glorot normal")
+        return dde.Model(data, net)
+
+    return make
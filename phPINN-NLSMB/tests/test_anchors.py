@@ -0,0 +1,61 @@
+import numpy as np
+
+from conftest import poisson_pde
+from nlsmb import AnchorSet, pde_residual, residual_top_k
+
+
+class _Counting:
+    def __init__(self, operator):
+        self.operator = operator
+        self.points = 0
+
+    def __call__(self, x, y):
+        self.points += len(x)
+        return self.operator(x, y)
+
+
+def _model(poisson_model):
+    model = poisson_model()
+    model.compile("adam", lr=1e-3)
+    return model
+
+
+def test_add_with_residuals_skips_the_residual_pass(poisson_model):
+    X = np.linspace(-1, 1, 200)[:, None].astype(np.float32)
+    kept = []
+    for passed in [False, True]:
+        model = _model(poisson_model)
+        operator = _Counting(poisson_pde)
+        points, _, residuals = residual_top_k(
+            model, operator, X, 10, return_residuals=True
+        )
+        np.testing.assert_allclose(
+            residuals, pde_residual(model, poisson_pde, points), rtol=1e-6
+        )
+        searched = operator.points
+        anchors = AnchorSet(model, operator, min_distance=1e-3)
+        anchors.add(points, residuals if passed else None)
+        # With the residuals passed in, the new points are not evaluated again
+        assert operator.points - searched == (0 if passed else len(points))
+        kept.append((model.data.anchors, anchors.residuals))
+    np.testing.assert_array_equal(kept[0][0], kept[1][0])
+    np.testing.assert_allclose(kept[0][1], kept[1][1], rtol=1e-6)
+
+
+def test_add_deduplicates_and_keeps_the_budget(poisson_model):
+    model = _model(poisson_model)
+    n = len(model.data.train_x_all)
+    anchors = AnchorSet(model, poisson_pde, min_distance=0.05, max_anchors=4)
+    X = np.array([[0.0], [0.01], [0.5], [0.52], [0.9]])
+    residuals = np.array([1.0, 2.0, 3.0, 0.5, 4.0])
+    # 0.01 excludes 0.0, and 0.5 excludes 0.52
+    assert anchors.add(X, residuals) == 3
+    np.testing.assert_allclose(np.sort(model.data.anchors[:, 0]), [0.01, 0.5, 0.9])
+    assert len(model.data.train_x_all) == n + 3
+
+    # Points too close to an anchor are rejected, and over the budget the
+    # anchors with the lowest residual are dropped
+    assert anchors.add(np.array([[0.51], [-0.5], [-0.9]]), [100.0, 100.0, 100.0]) == 2
+    assert len(model.data.anchors) == 4
+    assert len(model.data.train_x_all) == n + 4
+    assert -0.5 in model.data.anchors and -0.9 in model.data.anchors
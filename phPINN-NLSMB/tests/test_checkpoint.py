@@ -0,0 +1,82 @@
+import glob
+
+import pytest
+import torch
+
+from nlsmb import Checkpointer, restore_model, save_model
+
+
+def _compile(model, total):
+    model.compile("adam", lr=1e-2, decay=("inverse time", total // 3, 0.5))
+
+
+def _parameters(model):
+    return [p.detach().clone() for p in model.net.parameters()]
+
+
+def test_save_and_restore_model_continue_the_run(poisson_model, tmp_path):
+    model = poisson_model()
+    _compile(model, 40)
+    model.train(iterations=40, verbose=0)
+    expected = _parameters(model)
+
+    model = poisson_model()
+    _compile(model, 40)
+    model.train(iterations=15, verbose=0)
+    path = save_model(model, str(tmp_path / "adam"))
+
+    model = poisson_model()
+    _compile(model, 40)
+    restore_model(model, path)
+    assert model.train_state.step == 15
+    assert model.lr_scheduler.last_epoch == 15
+    model.train(iterations=25, verbose=0)
+    assert model.train_state.step == 40
+    for a, b in zip(_parameters(model), expected):
+        torch.testing.assert_close(a, b, rtol=0, atol=0)
+
+
+def test_checkpointer_round_trip(poisson_model, tmp_path):
+    model = poisson_model()
+    _compile(model, 40)
+    model.train(iterations=40, verbose=0)
+    expected = _parameters(model)
+
+    model = poisson_model()
+    _compile(model, 40)
+    checkpointer = Checkpointer(str(tmp_path / "checkpoints"), period=5, keep=2)
+    checkpointer.state["phase"] = "adam"
+    model.train(iterations=15, callbacks=[checkpointer], verbose=0)
+    checkpointer.close()
+    assert len(glob.glob(str(tmp_path / "checkpoints" / "checkpoint-*.pkl"))) == 2
+
+    model = poisson_model()
+    _compile(model, 40)
+    checkpointer = Checkpointer(str(tmp_path / "checkpoints"), period=5)
+    checkpoint = checkpointer.latest()
+    assert checkpoint["step"] == 15
+    checkpointer.restore(model, checkpoint)
+    assert checkpointer.state == {"phase": "adam"}
+    assert model.train_state.step == 15
+    assert model.losshistory.steps[-1] == 15
+    model.train(iterations=25, callbacks=[checkpointer], verbose=0)
+    checkpointer.close()
+    assert model.train_state.step == 40
+    for a, b in zip(_parameters(model), expected):
+        torch.testing.assert_close(a, b, rtol=0, atol=0)
+
+    checkpointer.clear()
+    assert checkpointer.latest() is None
+
+
+def test_checkpointer_refuses_another_key(poisson_model, tmp_path):
+    model = poisson_model()
+    _compile(model, 10)
+    checkpointer = Checkpointer(str(tmp_path), period=5, key="a")
+    model.train(iterations=5, callbacks=[checkpointer], verbose=0)
+    checkpointer.close()
+    checkpoint = checkpointer.latest()
+    assert checkpoint["key"] == "a"
+    with pytest.raises(ValueError):
+        Checkpointer(str(tmp_path), key="b").restore(model, checkpoint)
+    Checkpointer(str(tmp_path), key="a").restore(model, checkpoint)
@@ -0,0 +1,105 @@
+import deepxde as dde
+import numpy as np
+
+from conftest import poisson_pde
+from nlsmb import (
+    TWO_SOLITONS,
+    TopK,
+    evaluate_chunked,
+    exact_grid,
+    l2_relative_error,
+    open_output,
+    pde_residual,
+    residual_top_k,
+    rows_per_chunk,
+)
+
+
+def _fields(X):
+    return np.sin(X[:, 0:1]) + 1j * X[:, 1:2], X.sum(1)
+
+
+def test_evaluate_chunked_matches_direct(tmp_path):
+    X = np.random.default_rng(0).uniform(size=(1000, 2))
+    expected = _fields(X)
+    outputs = [
+        None,
+        (open_output(tmp_path / "a.npy", (1000, 1), complex), np.empty(1000)),
+    ]
+    for out in outputs:
+        values = evaluate_chunked(_fields, X, out=out, chunk_size=77)
+        for value, e in zip(values, expected):
+            np.testing.assert_array_equal(value, e)
+    value = evaluate_chunked(lambda X: X * 2, X, max_memory=4096)
+    np.testing.assert_array_equal(value, X * 2)
+
+
+def test_rows_per_chunk_scales_with_the_memory_cap():
+    def fn(X):
+        return np.ones((len(X), 1000))
+
+    probe = np.zeros((256, 2))
+    rows = rows_per_chunk(fn, probe, max_memory=2**20)
+    # 8000 bytes per row
+    assert 100 <= rows <= 131
+    assert rows_per_chunk(fn, probe, max_memory=1) == 1
+
+
+def test_l2_relative_error_matches_deepxde():
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=(1000, 1)) + 1j * rng.normal(size=(1000, 1))
+    y_pred = y + 0.1 * rng.normal(size=(1000, 1))
+    expected = dde.metrics.l2_relative_error(y, y_pred)
+    np.testing.assert_allclose(l2_relative_error(y, y_pred, chunk_size=64), expected)
+
+
+def test_exact_grid_in_blocks(tmp_path):
+    domain = (-1.0, 1.0, -0.5, 0.5, 64, 48)
+    grid = exact_grid(
+        "two_solitons", TWO_SOLITONS.grid, *domain, max_memory=1, cache_dir=tmp_path
+    )
+    expected = TWO_SOLITONS.grid(grid.x, grid.t)
+    for name, e in zip(grid.names, expected):
+        np.testing.assert_allclose(grid[name], e, rtol=1e-12)
+
+
+def test_top_k_matches_argsort():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(size=(1000, 2))
+    scores = rng.uniform(size=1000)
+    top = TopK(10)
+    for start in range(0, 1000, 64):
+        top.update(X[start : start + 64], scores[start : start + 64])
+    rows, best = top.value
+    order = np.argsort(scores)[-10:]
+    np.testing.assert_array_equal(rows, X[order])
+    np.testing.assert_array_equal(best, scores[order])
+    np.testing.assert_allclose(top.mean, scores.mean())
+
+
+def test_residual_top_k_matches_full_search(poisson_model):
+    model = poisson_model()
+    model.compile("adam", lr=1e-3)
+    X = np.random.default_rng(0).uniform(-1, 1, (500, 1)).astype(np.float32)
+    full = np.abs(model.predict(X, operator=poisson_pde)[0]).ravel()
+    residual = pde_residual(model, poisson_pde, X, chunk_size=64)
+    np.testing.assert_allclose(residual, full, rtol=1e-6)
+    points, mean = residual_top_k(model, poisson_pde, X, 5, chunk_size=64)
+    np.testing.assert_array_equal(points, X[np.argsort(full)[-5:]])
+    np.testing.assert_allclose(mean, full.mean(), rtol=1e-6)
+
+
+def test_residual_top_k_draws_blocks(poisson_model):
+    model = poisson_model()
+    model.compile("adam", lr=1e-3)
+    sizes = []
+
+    def draw(n):
+        sizes.append(n)
+        return np.random.default_rng(len(sizes)).uniform(-1, 1, (n, 1))
+
+    points, _ = residual_top_k(
+        model, poisson_pde, draw, 5, num_points=150, chunk_size=64
+    )
+    assert sizes == [64, 64, 22]
+    assert points.shape == (5, 1)
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from nlsmb import TWO_SOLITONS
+
+
+def _expsum(s, z, t):
+    value = s.const + 0j
+    for coef, a, b, d in s.terms:
+        value = value + coef * np.exp(a * t + b * z + d)
+    return value
+
+
+def _rational(form, z, t):
+    value = form.scale + 0j
+    for s in form.numerators:
+        value = value * _expsum(s, z, t)
+    for s, p in form.denominators:
+        value = value / _expsum(s, z, t) ** p
+    return value
+
+
+def _exact(engine, z, t):
+    # Term by term in complex arithmetic, without the basis and matmul of the engine
+    return [_rational(form, z, t) for form in engine.fields.values()]
+
+
+def _points(n=500):
+    rng = np.random.default_rng(0)
+    return rng.uniform(-5, 5, (n, 1)), rng.uniform(-5, 5, (n, 1))
+
+
+def _to_numpy(x):
+    if hasattr(x, "detach"):
+        x = x.detach().cpu()
+    if hasattr(x, "numpy"):
+        return x.numpy()
+    return np.asarray(x)
+
+
+def _backend(name):
+    if name == "numpy":
+        return np.asarray
+    if name == "pytorch":
+        torch = pytest.importorskip("torch")
+        return torch.as_tensor
+    if name == "jax":
+        jnp = pytest.importorskip("jax.numpy")
+        return jnp.asarray
+    if name == "paddle":
+        paddle = pytest.importorskip("paddle")
+        return paddle.to_tensor
+    tf = pytest.importorskip("tensorflow")
+    return tf.constant
+
+
+def test_call_matches_exact():
+    z, t = _points()
+    values = TWO_SOLITONS(np.hstack([z, t]))
+    for value, exact in zip(values, _exact(TWO_SOLITONS, z, t)):
+        np.testing.assert_allclose(value, exact, rtol=1e-10, atol=1e-12)
+
+
+def test_grid_matches_call():
+    z = np.linspace(-5, 5, 7)
+    t = np.linspace(-5, 5, 5)
+    Z, T = np.meshgrid(z, t)
+    values = TWO_SOLITONS(np.stack([Z.ravel(), T.ravel()], 1))
+    for grid, value in zip(TWO_SOLITONS.grid(z, t), values):
+        np.testing.assert_allclose(grid.ravel(), value.ravel(), rtol=1e-10, atol=1e-12)
+
+
+@pytest.mark.parametrize("backend", ["numpy", "pytorch", "jax", "paddle", "tensorflow"])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_evaluator_matches_exact(backend, dtype):
+    tensor = _backend(backend)
+    z, t = _points()
+    values = TWO_SOLITONS.evaluator(backend)(
+        tensor(z.astype(dtype)), tensor(t.astype(dtype))
+    )
+    assert len(values) == len(TWO_SOLITONS.names)
+    for (re, im), exact in zip(values, _exact(TWO_SOLITONS, z, t)):
+        value = _to_numpy(re) + 1j * _to_numpy(im)
+        assert value.shape == exact.shape
+        # jax runs in float32 unless x64 is enabled
+        rtol = 1e-10 if _to_numpy(re).dtype == np.float64 else 1e-4
+        scale = np.abs(exact).max()
+        np.testing.assert_allclose(value, exact, rtol=rtol, atol=rtol * scale)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        TWO_SOLITONS.evaluator("mxnet")
@@ -0,0 +1,113 @@
+import threading
+
+import deepxde as dde
+import numpy as np
+import torch
+
+from nlsmb import DomainDecomposition, ObservationBC
+from nlsmb.decomposition import _Exchange
+
+
+def pde(x, y):
+    return [dde.grad.jacobian(y, x, i=i, j=1) for i in range(2)]
+
+
+def _decomposition(nz=2, nt=2, **kwargs):
+    torch.manual_seed(0)
+    net = dde.nn.FNN([2, 8, 2], "tanh", "Glorot normal")
+    points = np.array([[z, 0.0] for z in np.linspace(-1, 1, 5)])
+    observation = ObservationBC(points, np.hstack([points[:, :1], -points[:, :1]]))
+    return DomainDecomposition(
+        net,
+        pde,
+        (-1, 1),
+        (0, 1),
+        nz,
+        nt,
+        observation,
+        num_domain=20,
+        num_interface=4,
+        **kwargs,
+    )
+
+
+def test_edges_of():
+    decomposition = _decomposition()
+    # Subdomain k = i * nt + j is cell (i, j) of z x t
+    assert decomposition.neighbours == [(0, 2), (0, 1), (1, 3), (2, 3)]
+    assert decomposition.edges_of(0) == [(0, 0), (1, 0)]
+    assert decomposition.edges_of(3) == [(2, 1), (3, 1)]
+    # The edge between subdomains 0 and 2 lies at z = 0 over their t range
+    np.testing.assert_array_equal(decomposition.interfaces[0][:, 0], 0)
+    np.testing.assert_allclose(
+        decomposition.interfaces[0][:, 1], [0, 1 / 6, 1 / 3, 0.5]
+    )
+    assert _decomposition(1, 1).edges_of(0) == []
+
+
+def test_subdomain():
+    decomposition = _decomposition()
+    # Subdomain 0 is z in [-1, 0], t in [0, 0.5] and observes its part of t = 0
+    data, interface = decomposition.subdomain(0)
+    observed, fitted = data.bcs
+    assert fitted is interface
+    np.testing.assert_array_equal(observed.points[:, 0], [-1, -0.5, 0])
+    np.testing.assert_allclose(
+        interface.points, np.vstack([decomposition.interfaces[e] for e in (0, 1)])
+    )
+    # Subdomain 1 is t in [0.5, 1], without observations
+    data, interface = decomposition.subdomain(1)
+    assert data.bcs == [interface]
+
+
+class _Model:
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, X):
+        return np.full((len(X), 2), self.value)
+
+
+def test_interface_exchange():
+    decomposition = _decomposition(2, 1)
+    _, interface = decomposition.subdomain(0)
+    shared = (np.ctypeslib.as_ctypes_type(np.float64) * (2 * 4 * 2))()
+    values = decomposition.interface_values(shared)
+    # The neighbour across z = 0 has published 3
+    values[0, 1] = 3
+    sync = _Exchange(decomposition, 0, interface, shared, threading.Barrier(1), 2)
+    sync.model = _Model(1.0)
+    sync.on_epoch_end()
+    np.testing.assert_array_equal(values[0, 0], 0)
+    sync.on_epoch_end()
+    np.testing.assert_array_equal(values[0, 0], 1)
+    np.testing.assert_array_equal(interface.values.numpy(), 2)
+    assert interface.values.dtype == torch.float32
+
+
+class _Constant(torch.nn.Module):
+    def __init__(self, value):
+        super().__init__()
+        self.value = torch.nn.Parameter(torch.tensor(float(value)))
+
+    def forward(self, x):
+        return self.value.expand(len(x), 1)
+
+
+def test_predict():
+    decomposition = _decomposition()
+    decomposition.nets = [_Constant(k) for k in range(4)]
+    X = np.array([[-1, 0], [-0.5, 0.7], [0.5, 0.2], [1, 1], [0, 0.5]])
+    # A point on an edge belongs to the later subdomain, the upper bounds to
+    # the last
+    np.testing.assert_array_equal(decomposition.predict(X)[:, 0], [0, 1, 2, 3, 3])
+
+
+def test_train():
+    decomposition = _decomposition(2, 1)
+    decomposition.train(2, [1, 1, 100], exchange=1, display_every=1000)
+    assert len(decomposition.nets) == 2
+    assert decomposition.nets[0] is not decomposition.nets[1]
+    x = torch.rand(4, 2)
+    with torch.no_grad():
+        assert not torch.equal(decomposition.nets[0](x), decomposition.nets[1](x))
@@ -0,0 +1,54 @@
+import deepxde as dde
+import numpy as np
+import torch
+
+from conftest import poisson_pde
+from nlsmb import EnsembleBC, EnsembleFNN
+
+LAYERS = [1, 8, 8, 1]
+
+
+def _members(net):
+    """Standalone ``dde.nn.FNN`` with the weights of every member of ``net``."""
+    fnns = []
+    for k in range(net.members):
+        fnn = dde.nn.FNN(LAYERS, "tanh", "Glorot normal")
+        with torch.no_grad():
+            for linear, w, b in zip(fnn.linears, net.weights, net.biases):
+                linear.weight.copy_(w[k].T)
+                linear.bias.copy_(b[k, 0])
+        fnns.append(fnn)
+    return fnns
+
+
+def test_members_match_standalone_networks():
+    net = EnsembleFNN(LAYERS, "tanh", "Glorot normal", members=3, seed=0)
+    x = torch.linspace(-1, 1, 20)[:, None].requires_grad_()
+    y = net(x)
+    residual = net.operator(poisson_pde)(x, y)[0]
+    dde.grad.clear()
+    assert y.shape == (20, 3) and residual.shape == (20, 3)
+    for k, fnn in enumerate(_members(net)):
+        x_k = x.detach().clone().requires_grad_()
+        y_k = fnn(x_k)
+        torch.testing.assert_close(y[:, k : k + 1], y_k)
+        torch.testing.assert_close(residual[:, k : k + 1], poisson_pde(x_k, y_k)[0])
+        dde.grad.clear()
+
+
+def test_seeded_members_differ_and_repeat():
+    a = EnsembleFNN(LAYERS, "tanh", "Glorot normal", members=2, seed=0)
+    b = EnsembleFNN(LAYERS, "tanh", "Glorot normal", members=2, seed=0)
+    for wa, wb in zip(a.weights, b.weights):
+        torch.testing.assert_close(wa, wb)
+    assert not torch.equal(a.weights[0][0], a.weights[0][1])
+
+
+def test_ensemble_bc_splits_members():
+    X = np.linspace(-1, 1, 5)[:, None]
+    bc = dde.icbc.PointSetBC(X, np.sin(X))
+    ensemble = EnsembleBC(bc, members=2)
+    outputs = torch.as_tensor(np.hstack([np.sin(X), np.sin(X) + 1]))
+    error = ensemble.error(X, X, outputs, 0, 5)
+    torch.testing.assert_close(error, torch.as_tensor(np.hstack([0 * X, 0 * X + 1])))
+    np.testing.assert_array_equal(ensemble.collocation_points(X), X)
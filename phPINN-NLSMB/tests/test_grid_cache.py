@@ -0,0 +1,89 @@
+import importlib.util
+
+import numpy as np
+import pytest
+
+from nlsmb import exact_grid, open_exact_grid
+
+SOURCE = """
+import numpy as np
+
+K = {k}
+UNUSED = {unused}
+
+
+def wave(X, T):
+    return np.exp(1j * (K * X - {omega} * T))
+
+
+def fields(x, t):
+    X, T = np.meshgrid(x, t)
+    return [wave(X, T), X + 1j * T]
+"""
+
+DOMAIN = (-1.0, 1.0, 0.0, 0.5, 33, 11)
+
+
+def _fields(tmp_path, name, k=1.0, unused=0, omega=2.0):
+    path = tmp_path / f"{name}.py"
+    path.write_text(SOURCE.format(k=k, unused=unused, omega=omega))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.fields
+
+
+def _grid(fields, tmp_path):
+    return exact_grid(
+        "wave", fields, *DOMAIN, names=("E", "XT"), cache_dir=tmp_path / "cache"
+    )
+
+
+def test_key_depends_on_the_fields(tmp_path):
+    path = _grid(_fields(tmp_path, "base"), tmp_path).path
+    # Same code in another module, and a global the fields do not read
+    assert _grid(_fields(tmp_path, "same"), tmp_path).path == path
+    assert _grid(_fields(tmp_path, "unused", unused=1), tmp_path).path == path
+    # A constant and a helper function the fields call
+    assert _grid(_fields(tmp_path, "k", k=1.5), tmp_path).path != path
+    assert _grid(_fields(tmp_path, "omega", omega=3.0), tmp_path).path != path
+    # Constructing a closed-form evaluator does not change its key
+    from nlsmb import TWO_SOLITONS
+
+    path = _grid(TWO_SOLITONS.grid, tmp_path).path
+    TWO_SOLITONS.evaluator("numpy")
+    assert _grid(TWO_SOLITONS.grid, tmp_path).path == path
+
+
+def test_reopen_and_time_slice(tmp_path):
+    fields = _fields(tmp_path, "base")
+    cache_dir = tmp_path / "cache"
+    with pytest.raises(FileNotFoundError):
+        open_exact_grid("wave", fields, *DOMAIN, ("E", "XT"), cache_dir=cache_dir)
+    _grid(fields, tmp_path)
+    grid = open_exact_grid("wave", fields, *DOMAIN, ("E", "XT"), cache_dir=cache_dir)
+
+    x = np.linspace(DOMAIN[0], DOMAIN[1], DOMAIN[4])
+    t = np.linspace(DOMAIN[2], DOMAIN[3], DOMAIN[5])
+    E, XT = fields(x, t)
+    np.testing.assert_allclose(grid["E"], E)
+    np.testing.assert_allclose(grid.X_star[:, 0], XT.real.ravel())
+    np.testing.assert_allclose(grid.X_star[:, 1], XT.imag.ravel())
+    for i, tt in enumerate(t):
+        assert grid.time_index(tt) == i
+        np.testing.assert_allclose(grid.time_slice("E", tt), E[i])
+    with pytest.raises(KeyError):
+        grid["q"]
+
+
+def test_arrays_are_read_only(tmp_path):
+    grid = _grid(_fields(tmp_path, "base"), tmp_path)
+    assert isinstance(grid["E"], np.memmap)
+    with pytest.raises(ValueError):
+        grid["E"][0, 0] = 0
+    with pytest.raises(ValueError):
+        grid.X[0, 0] = 0
+    # Slices are copies and can be written
+    row = grid.time_slice("E", 0.0)
+    row[0] = 0
+    assert grid["E"][0, 0] != 0
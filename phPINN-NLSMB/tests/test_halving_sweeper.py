@@ -0,0 +1,87 @@
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("hydra")
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Every job writes the total steps it trained into its checkpoint; the error
+# only depends on the configuration
+APP = """
+import os
+
+import hydra
+
+
+@hydra.main(version_base=None, config_path=".", config_name="config")
+def main(cfg):
+    done = 0
+    if cfg.checkpoint:
+        with open(cfg.checkpoint) as f:
+            done = int(f.read())
+    path = os.path.abspath(f"x{cfg.x}-{done + cfg.adam}.txt")
+    with open(path, "w") as f:
+        f.write(str(done + cfg.adam))
+    return {
+        "E_L2": float(cfg.x),
+        "steps": done + cfg.adam,
+        "schedule": cfg.schedule,
+        "checkpoint": path,
+    }
+
+
+if __name__ == "__main__":
+    main()
+"""
+
+CONFIG = """
+defaults:
+  - override hydra/sweeper: nlsmb_halving
+  - override hydra/launcher: nlsmb_pool
+  - _self_
+
+hydra:
+  sweep:
+    dir: {sweep}
+  sweeper:
+    min_budget: 10
+    max_budget: 90
+    eta: 3
+  launcher:
+    processes: 2
+    shared_dir: null
+
+x: 0
+adam: 0
+schedule: null
+checkpoint: null
+"""
+
+
+def test_rungs_share_the_schedule_and_the_summary(tmp_path):
+    sweep = tmp_path / "sweep"
+    (tmp_path / "app.py").write_text(APP)
+    (tmp_path / "config.yaml").write_text(CONFIG.format(sweep=sweep))
+    subprocess.run(
+        [sys.executable, "app.py", "--multirun", "x=range(1,10)"],
+        cwd=tmp_path,
+        env=dict(os.environ, PYTHONPATH=ROOT),
+        check=True,
+        capture_output=True,
+    )
+    with open(sweep / "summary.csv") as f:
+        rows = list(csv.DictReader(f))
+    # 9 configurations train 10 steps, the best 3 continue to 30 and the best
+    # one to 90
+    assert len(rows) == 9 + 3 + 1
+    assert {row["schedule"] for row in rows} == {"90"}
+    steps = {}
+    for row in rows:
+        x = row["job"].split()[0]
+        steps.setdefault(x, []).append(int(row["steps"]))
+    assert steps["x=1"] == [10, 30, 90]
+    assert steps["x=2"] == steps["x=3"] == [10, 30]
+    assert all(steps[f"x={x}"] == [10] for x in range(4, 10))
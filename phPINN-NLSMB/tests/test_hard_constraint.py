@@ -0,0 +1,67 @@
+import numpy as np
+import torch
+
+from nlsmb import HardConstraint
+
+
+def _distance(x):
+    return x[:, 1:2] * (1 - x[:, 0:1] ** 2)
+
+
+def _exact(x):
+    return torch.cat([torch.sin(x[:, 0:1]) * torch.exp(-x[:, 1:2]), x[:, 0:1] ** 3], 1)
+
+
+def _derivatives(y, x):
+    # The values, gradients and Hessians of each output column
+    out = []
+    for c in range(y.shape[1]):
+        (g,) = torch.autograd.grad(y[:, c].sum(), x, create_graph=True)
+        h = [
+            torch.autograd.grad(g[:, i].sum(), x, retain_graph=True)[0]
+            for i in range(2)
+        ]
+        out += [y[:, c], g, *h]
+    return out
+
+
+def test_matches_the_direct_transform():
+    torch.manual_seed(0)
+    x = torch.rand(50, 2, dtype=torch.float64, requires_grad=True)
+    net = torch.nn.Sequential(
+        torch.nn.Linear(2, 8), torch.nn.Tanh(), torch.nn.Linear(8, 2)
+    )
+    net = net.double()
+    hc = HardConstraint(_distance, _exact)
+    direct = _distance(x) * net(x) + _exact(x)
+    for _ in range(2):
+        values = _derivatives(hc(x, net(x)), x)
+        for value, expected in zip(values, _derivatives(direct, x)):
+            torch.testing.assert_close(value, expected)
+    assert (hc.hits, hc.misses) == (1, 1)
+    # Without grad the transform is evaluated directly
+    with torch.no_grad():
+        torch.testing.assert_close(hc(x.detach(), net(x)), direct)
+    assert (hc.hits, hc.misses) == (1, 1)
+
+
+def test_cache_misses_once_per_point_set(poisson_model):
+    model = poisson_model()
+    hc = HardConstraint(lambda x: 1 - x**2, lambda x: 0 * x)
+    model.net.apply_output_transform(hc)
+    model.compile("adam", lr=1e-3)
+
+    def train(iterations):
+        model.train(iterations=iterations, display_every=1000, verbose=0)
+        return hc.misses
+
+    # The training and the test points
+    assert train(1) == 2
+    assert train(3) == 2
+    model.data.resample_train_points()
+    assert train(2) == 3
+    model.data.add_anchors(np.array([[0.5]]))
+    assert train(2) == 4
+    assert hc.hits > 0
+    hc.clear()
+    assert train(1) == 6
@@ -0,0 +1,97 @@
+import deepxde as dde
+import numpy as np
+import torch
+
+from nlsmb import CausalWeights, ObservationBC, TimeMarching
+
+
+def test_causal_weights():
+    # Slice k of [0, 1] has the residual k + 1 in both components
+    t = torch.tensor([0.1, 0.3, 0.35, 0.6, 0.9])[:, None]
+    x = torch.cat([torch.zeros_like(t), t], 1)
+    residual = torch.floor(t * 4) + 1
+    weights = CausalWeights(lambda x, y: [residual, 2 * residual], 0, 1, slices=4)
+    f = weights(x, None)
+    loss = 5 * torch.tensor([1.0, 4.0, 9.0, 16.0])
+    expected = torch.exp(-(loss.cumsum(0) - loss))
+    torch.testing.assert_close(weights.weights, expected)
+    index = torch.tensor([0, 1, 1, 2, 3])
+    torch.testing.assert_close(f[0], residual * expected[index, None].sqrt())
+    torch.testing.assert_close(f[1], 2 * f[0])
+    # Without causality all slices weigh the same
+    weights = CausalWeights(lambda x, y: [residual], 0, 1, slices=4, epsilon=0)
+    torch.testing.assert_close(weights(x, None)[0], residual)
+
+
+def _marching(windows=4, **kwargs):
+    torch.manual_seed(0)
+    net = dde.nn.FNN([2, 8, 2], "tanh", "Glorot normal")
+    points = np.array([[z, t] for t in [0.0, 0.25, 0.5, 1.0] for z in [-1.0, 1.0]])
+    observation = ObservationBC(points, np.hstack([points[:, 1:], -points[:, 1:]]))
+
+    def pde(x, y):
+        return [dde.grad.jacobian(y, x, i=i, j=1) for i in range(2)]
+
+    space = dde.geometry.Interval(-1, 1)
+    marching = TimeMarching(
+        net,
+        pde,
+        space,
+        dde.geometry.TimeDomain(0, 1),
+        windows,
+        observation,
+        num_domain=50,
+        num_initial=5,
+        **kwargs,
+    )
+    return marching
+
+
+def test_windows():
+    marching = _marching()
+    np.testing.assert_allclose(marching.edges, [0, 0.25, 0.5, 0.75, 1])
+    data = marching.window(0)
+    assert isinstance(data.geom.timedomain, dde.geometry.TimeDomain)
+    assert (data.geom.timedomain.t0, data.geom.timedomain.t1) == (0, 0.25)
+    # The first window observes its initial line, later ones start after it
+    (observed,) = data.bcs
+    np.testing.assert_array_equal(observed.points[:, 1], [0, 0, 0.25, 0.25])
+    marching.nets.append(marching.net)
+    data = marching.window(1)
+    observed, initial = data.bcs
+    np.testing.assert_array_equal(observed.points[:, 1], [0.5, 0.5])
+    np.testing.assert_array_equal(initial.points[:, 1], np.full(5, 0.25))
+    np.testing.assert_allclose(
+        initial.values.numpy(), marching.predict(initial.points), rtol=1e-6
+    )
+    assert isinstance(_marching(causal=1.0).window(0).pde, CausalWeights)
+
+
+class _Constant(torch.nn.Module):
+    def __init__(self, value):
+        super().__init__()
+        self.value = torch.nn.Parameter(torch.tensor(float(value)))
+
+    def forward(self, x):
+        return self.value.expand(len(x), 1)
+
+
+def test_predict_stitches_the_windows():
+    marching = _marching(windows=2)
+    X = np.array([[0.0, 0.0], [0.3, 0.5], [0.1, 0.7], [0.2, 1.0], [0.5, 0.2]])
+    marching.nets = [_Constant(1)]
+    np.testing.assert_array_equal(marching.predict(X)[:, 0], 1)
+    marching.nets.append(_Constant(2))
+    # A point on an edge belongs to the earlier window
+    np.testing.assert_array_equal(marching.predict(X)[:, 0], [1, 1, 2, 2, 1])
+
+
+def test_train():
+    marching = _marching(windows=2)
+    marching.train(2, [1, 1, 100], display_every=1000)
+    assert len(marching.nets) == 2
+    assert marching.nets[0] is not marching.nets[1]
+    # The last copy is the trained network
+    x = torch.rand(4, 2)
+    with torch.no_grad():
+        torch.testing.assert_close(marching.nets[1](x), marching.net(x))
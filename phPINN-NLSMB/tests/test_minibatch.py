@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from deepxde.callbacks import Callback
+
+from nlsmb import MiniBatch, collocation_batches
+
+
+def test_collocation_batches_reshuffle_every_epoch():
+    pool = np.arange(20.0)[:, None]
+    batches = collocation_batches(pool, 6, seed=0)
+    epochs = [[next(batches) for _ in range(3)] for _ in range(2)]
+    for epoch in epochs:
+        assert all(b.shape == (6, 1) for b in epoch)
+        rows = np.concatenate(epoch).ravel()
+        # The last incomplete batch is dropped, the rest are distinct rows
+        assert len(set(rows)) == 18
+    assert not np.array_equal(np.concatenate(epochs[0]), np.concatenate(epochs[1]))
+
+
+def test_collocation_batches_draw_a_pool_per_epoch():
+    calls = []
+
+    def pool():
+        calls.append(len(calls))
+        return np.full((4, 2), float(len(calls)))
+
+    batches = collocation_batches(pool, 2)
+    values = [next(batches)[0, 0] for _ in range(5)]
+    assert values == [1, 1, 2, 2, 3]
+    assert len(calls) == 3
+    with pytest.raises(ValueError):
+        next(collocation_batches(np.zeros((3, 2)), 4))
+
+
+class _Record(Callback):
+    def __init__(self):
+        super().__init__()
+        self.train_x = []
+
+    def on_batch_begin(self):
+        self.train_x.append(self.model.train_state.X_train)
+
+
+def test_mini_batch_steps_and_restore(poisson_model):
+    model = poisson_model(observations=5)
+    model.compile("adam", lr=1e-3)
+    data = model.data
+    data.add_anchors(np.array([[0.25], [0.5]], dtype=np.float32))
+    full = (data.train_x_all, data.train_x_bc, data.train_x, data.train_y)
+    pool = np.linspace(-0.99, 0.99, 40, dtype=np.float32)[:, None]
+    record = _Record()
+    # The recording callback sees the batch of the step before
+    model.train(
+        iterations=4,
+        callbacks=[MiniBatch(collocation_batches(pool, 8, seed=0)), record],
+        display_every=1000,
+        verbose=0,
+    )
+    batches = collocation_batches(pool, 8, seed=0)
+    for train_x in record.train_x[1:]:
+        expected = np.vstack((full[1], data.anchors, next(batches)))
+        np.testing.assert_array_equal(train_x, expected)
+    for before, after in zip(
+        full, (data.train_x_all, data.train_x_bc, data.train_x, data.train_y)
+    ):
+        assert after is before
+    np.testing.assert_array_equal(model.train_state.X_train, data.train_x)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+import torch
+
+from nlsmb import SeparableNet
+
+
+def test_separable_predict_grid_matches_forward():
+    torch.manual_seed(0)
+    net = SeparableNet([8] * 2, 5, 3, "tanh", "Glorot normal")
+    net.apply_output_transform(lambda x, y: x[:, 0:1] * x[:, 1:2] * y + 1)
+    z = np.linspace(-1, 1, 7)
+    t = np.linspace(0, 2, 4)
+    Z, T = np.meshgrid(z, t)
+    X = np.stack([Z.ravel(), T.ravel()], 1).astype(np.float32)
+    with torch.no_grad():
+        expected = net(torch.as_tensor(X)).numpy()
+    np.testing.assert_allclose(net.predict_grid(z, t), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_separable_is_a_sum_of_products():
+    torch.manual_seed(0)
+    net = SeparableNet([8], 2, 3, "tanh", "Glorot normal")
+    x = torch.rand(10, 2)
+    f = net.features(0, x[:, 0:1])
+    g = net.features(1, x[:, 1:2])
+    assert f.shape == g.shape == (10, 2, 3)
+    torch.testing.assert_close(net(x), torch.einsum("nkr,nkr->nk", f, g))
+    net.apply_feature_transform(lambda x: x)
+    with pytest.raises(ValueError):
+        net(x)
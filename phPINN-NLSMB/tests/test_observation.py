@@ -0,0 +1,47 @@
+import deepxde as dde
+import numpy as np
+
+from nlsmb import ObservationBC
+
+
+def _losses(make_bcs):
+    dde.config.set_random_seed(0)
+    geom = dde.geometry.Rectangle([-1, 0], [1, 1])
+    rng = np.random.default_rng(0)
+    X = rng.uniform(size=(40, 2))
+    values = [np.cos(k * X[:, 0:1]) + X[:, 1:2] for k in range(5)]
+    data = dde.data.PDE(
+        geom,
+        lambda x, y: y[:, 0:1] - x[:, 0:1],
+        make_bcs(X, values),
+        num_domain=30,
+        train_distribution="uniform",
+    )
+    model = dde.Model(data, dde.nn.FNN([2, 16, 5], "tanh", "Glorot normal"))
+    model.compile("adam", lr=1e-3)
+    losshistory, _ = model.train(iterations=0, verbose=0)
+    return losshistory.loss_train[0], len(data.train_x)
+
+
+def test_loss_is_the_sum_of_the_point_set_losses():
+    separate, n_separate = _losses(
+        lambda X, values: [
+            dde.icbc.PointSetBC(X, v, component=k) for k, v in enumerate(values)
+        ]
+    )
+    single, n_single = _losses(lambda X, values: [ObservationBC(X, values)])
+    np.testing.assert_allclose(single[0], separate[0], rtol=1e-6)
+    np.testing.assert_allclose(single[1], sum(separate[1:]), rtol=1e-5)
+    assert n_separate - n_single == 4 * 40
+
+
+def test_component_offset():
+    separate, _ = _losses(
+        lambda X, values: [
+            dde.icbc.PointSetBC(X, values[k], component=k) for k in range(1, 4)
+        ]
+    )
+    single, _ = _losses(
+        lambda X, values: [ObservationBC(X, np.hstack(values[1:4]), component=1)]
+    )
+    np.testing.assert_allclose(single[1], sum(separate[1:]), rtol=1e-5)
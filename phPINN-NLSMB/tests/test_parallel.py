@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import torch
+from deepxde.callbacks import Callback, PDEPointResampler
+
+from conftest import poisson_pde
+from nlsmb import AsyncResampler, DataParallel, RADResampler
+
+
+class _Log(Callback):
+    """Appends ``<phase> <pid>`` to ``path`` when training begins."""
+
+    def __init__(self, path, phase):
+        super().__init__()
+        self.path = path
+        self.phase = phase
+
+    def on_train_begin(self):
+        with open(self.path, "a") as f:
+            f.write(f"{self.phase} {os.getpid()}\n")
+
+
+class _Save(Callback):
+    """Saves the domain points of the worker to ``<directory>/<pid>.npy`` when
+    training ends."""
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+
+    def on_train_end(self):
+        np.save(self.directory / f"{os.getpid()}.npy", self.model.data.train_x_all)
+
+
+def _shares(directory):
+    return [np.load(path)[:, 0] for path in sorted(directory.glob("*.npy"))]
+
+
+def _asymmetric(model):
+    # A tanh network with zero biases is odd, so in a symmetric problem the
+    # gradients of the biases are exactly 0, and Adam blows the rounding of the
+    # summation order up into steps of size lr in any direction; fixed random
+    # biases break the symmetry
+    generator = torch.Generator().manual_seed(0)
+    for name, p in model.net.named_parameters():
+        if name.endswith("bias"):
+            p.data = torch.rand(p.shape, generator=generator) - 0.5
+    return model
+
+
+def test_matches_a_single_process(poisson_model):
+    model = _asymmetric(poisson_model(observations=8))
+    model.compile("adam", lr=1e-3, loss="MSE", loss_weights=[1, 1, 10])
+    model.train(iterations=20, display_every=5, verbose=0)
+    expected = [p.detach().clone() for p in model.net.parameters()]
+    losses = np.array(model.losshistory.loss_train)
+
+    model = _asymmetric(poisson_model(observations=8))
+    losshistory, _ = DataParallel(model, 2).train(20, [1, 1, 10], display_every=5)
+    np.testing.assert_allclose(losshistory.loss_train, losses, rtol=1e-5)
+    for a, b in zip(model.net.parameters(), expected):
+        torch.testing.assert_close(a.detach(), b, rtol=1e-5, atol=1e-6)
+
+
+def test_runs_the_callbacks_of_each_phase_in_every_worker(poisson_model, tmp_path):
+    path = tmp_path / "log.txt"
+    model = poisson_model()
+    DataParallel(model, 2).train(
+        4,
+        [1, 1],
+        lbfgs=True,
+        callbacks=[AsyncResampler(period=2), _Log(path, "adam")],
+        lbfgs_callbacks=[_Log(path, "lbfgs")],
+    )
+    lines = [line.split() for line in path.read_text().splitlines()]
+    adam = {pid for phase, pid in lines if phase == "adam"}
+    lbfgs = {pid for phase, pid in lines if phase == "lbfgs"}
+    assert len(lines) == 4
+    assert len(adam) == 2 and adam == lbfgs
+    assert str(os.getpid()) not in adam
+
+
+def test_resampled_shares_stay_disjoint(poisson_model, tmp_path):
+    # The uniform points of the fixture are the same in every draw
+    model = poisson_model(num_domain=64)
+    DataParallel(model, 2).train(
+        2, [1, 1], callbacks=[PDEPointResampler(period=1), _Save(tmp_path)]
+    )
+    a, b = _shares(tmp_path)
+    # 32 collocation points and one of the two boundary points each
+    assert len(a) == len(b) == 33
+    assert not set(a) & set(b)
+
+
+def test_workers_reseed_the_callbacks(poisson_model, tmp_path):
+    model = poisson_model(num_domain=64)
+    pool = np.linspace(-1, 1, 1000)[:, None].astype(np.float32)
+    rad = RADResampler(poisson_pde, pool, period=1, seed=0)
+    DataParallel(model, 2).train(1, [1, 1], callbacks=[rad, _Save(tmp_path)])
+    a, b = _shares(tmp_path)
+    assert len(a) == len(b)
+    assert not np.array_equal(a, b)
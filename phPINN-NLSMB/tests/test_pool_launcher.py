@@ -0,0 +1,89 @@
+import csv
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+pytest.importorskip("hydra")
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+APP = """
+import os
+
+import hydra
+import torch
+from threadpoolctl import threadpool_info, threadpool_limits
+
+# Import the backend before the launcher runs, as the scripts do, so that
+# its thread pool already exists
+torch.set_num_threads(4)
+threadpool_limits(4)
+
+
+def warm(cfg):
+    with open(os.path.join(os.environ["NLSMB_CACHE_DIR"], "warm.txt"), "a") as f:
+        f.write(f"{cfg.x}\\n")
+
+
+@hydra.main(version_base=None, config_path=".", config_name="config")
+def main(cfg):
+    limits = {p["num_threads"] for p in threadpool_info()}
+    return {
+        "x": cfg.x,
+        "torch_threads": torch.get_num_threads(),
+        "pool_threads": max(limits) if limits else 1,
+        "omp": os.environ["OMP_NUM_THREADS"],
+        "cores": len(os.sched_getaffinity(0)),
+    }
+
+
+if __name__ == "__main__":
+    main()
+"""
+
+CONFIG = """
+defaults:
+  - override hydra/launcher: nlsmb_pool
+  - _self_
+
+hydra:
+  sweep:
+    dir: {sweep}
+  launcher:
+    processes: 2
+    threads: 1
+    shared_dir: {shared}
+    warmup: __main__.warm
+
+x: 0
+"""
+
+
+def test_jobs_are_pinned_and_warmed_once(tmp_path):
+    (tmp_path / "app.py").write_text(APP)
+    sweep, shared = tmp_path / "sweep", tmp_path / "shared"
+    shared.mkdir()
+    (tmp_path / "config.yaml").write_text(
+        textwrap.dedent(CONFIG.format(sweep=sweep, shared=shared))
+    )
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop("NLSMB_CACHE_DIR", None)
+    subprocess.run(
+        [sys.executable, "app.py", "--multirun", "x=1,2,3"],
+        cwd=tmp_path,
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+    assert (shared / "warm.txt").read_text().split() == ["1"]
+    with open(sweep / "summary.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["x"] for row in rows] == ["1", "2", "3"]
+    for row in rows:
+        assert row["status"] == "completed"
+        assert row["torch_threads"] == "1"
+        assert row["pool_threads"] == "1"
+        assert row["omp"] == "1"
+        assert row["cores"] == "1"
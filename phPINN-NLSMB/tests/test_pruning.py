@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from deepxde.callbacks import Callback
+
+from conftest import poisson_pde
+from nlsmb import CollocationPruner, pde_residual
+
+
+class _Record(Callback):
+    """Records the training points after every epoch."""
+
+    def __init__(self):
+        super().__init__()
+        self.points = []
+
+    def on_epoch_end(self):
+        self.points.append(self.model.data.train_x_all.copy())
+
+
+def _train(model, pruner, iterations=3):
+    record = _Record()
+    model.compile("adam", lr=1e-3)
+    full = model.data.train_x_all.copy()
+    model.train(iterations=iterations, callbacks=[pruner, record], verbose=0)
+    return full, record.points
+
+
+@pytest.mark.parametrize("fraction", [0.5, 1.0])
+def test_prunes_and_restores(poisson_model, fraction):
+    model = poisson_model(num_domain=256)
+    pruner = CollocationPruner(
+        poisson_pde,
+        period=1,
+        fraction=fraction,
+        keep=0.0,
+        bins=4,
+        min_per_bin=2,
+        seed=0,
+    )
+    full, points = _train(model, pruner)
+    for X in points:
+        assert len(X) < len(full)
+        # Every cell keeps min_per_bin points
+        cells = np.clip(np.floor((X[:, 0] + 1) / 2 * 4), 0, 3)
+        assert np.bincount(cells.astype(int), minlength=4).min() >= 2
+    np.testing.assert_array_equal(model.data.train_x_all, full)
+
+
+def test_keeps_the_largest_residuals(poisson_model):
+    model = poisson_model(num_domain=256)
+    model.compile("adam", lr=1e-3)
+    residual = pde_residual(model, poisson_pde, model.data.train_x_all)
+    top = model.data.train_x_all[np.argsort(residual)[-100:]]
+    pruner = CollocationPruner(poisson_pde, period=1, fraction=0.5, keep=0.0, seed=0)
+    pruner.set_model(model)
+    pruner.on_train_begin()
+    pruner.on_epoch_end()
+    kept = {float(x) for x in model.data.train_x_all[:, 0]}
+    assert all(float(x) in kept for x in top[:, 0])
+    assert len(model.data.train_x_all) < len(residual)
+
+
+@pytest.mark.parametrize("kwargs", [{"fraction": 1.5}, {"fraction": -0.1}, {"keep": 2}])
+def test_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        CollocationPruner(poisson_pde, **kwargs)
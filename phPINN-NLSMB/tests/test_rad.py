@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from conftest import poisson_pde
+from nlsmb import RADResampler
+from nlsmb import rad
+
+
+@pytest.fixture
+def evaluated(monkeypatch):
+    """Replace the residual by ``1 + x**2`` and record the evaluated rows."""
+    calls = []
+
+    def pde_residual(model, operator, X, chunk_size):
+        calls.append(X[:, 0].copy())
+        return 1 + X[:, 0] ** 2
+
+    monkeypatch.setattr(rad, "pde_residual", pde_residual)
+    return calls
+
+
+def test_cdf_of_the_weights(evaluated):
+    pool = np.linspace(-1, 1, 11)[:, None]
+    sampler = RADResampler(poisson_pde, pool, k=2, c=0.5)
+    sampler.update_residuals()
+    weights = (1 + pool[:, 0] ** 2) ** 2
+    weights = weights / weights.mean() + 0.5
+    np.testing.assert_allclose(np.diff(sampler.cdf, prepend=0), weights / weights.sum())
+    assert sampler.cdf[-1] == 1
+
+
+def test_systematic_resampling(evaluated):
+    pool = np.arange(7.0)[:, None]
+    sampler = RADResampler(poisson_pde, pool, c=0, seed=0)
+    sampler.update_residuals()
+    p = np.diff(sampler.cdf, prepend=0)
+    for n in [1, 10, 100, 1001]:
+        points = sampler.sample(n)
+        assert points.shape == (n, 1)
+        counts = np.bincount(points[:, 0].astype(int), minlength=7)
+        # Every point is drawn floor(n p) or ceil(n p) times
+        assert np.all(np.abs(counts - n * p) < 1)
+
+
+def test_refresh_cycles_through_the_pool(evaluated):
+    pool = np.arange(10.0)[:, None]
+    sampler = RADResampler(poisson_pde, pool, refresh=0.3)
+    for _ in range(5):
+        sampler.update_residuals()
+    assert [list(rows) for rows in evaluated] == [
+        list(range(10)),
+        [0, 1, 2],
+        [3, 4, 5],
+        [6, 7, 8],
+        [9, 0, 1],
+    ]
+
+
+def test_resample_keeps_anchors_and_conditions(poisson_model):
+    model = poisson_model(observations=3)
+    model.compile("adam", lr=1e-3)
+    data = model.data
+    anchors = np.array([[0.1], [0.2]], dtype=np.float32)
+    data.add_anchors(anchors)
+    train_x_bc = data.train_x_bc
+    pool = np.random.default_rng(0).uniform(-1, 1, (200, 1)).astype(np.float32)
+    sampler = RADResampler(poisson_pde, pool, period=2, seed=0)
+    model.train(iterations=2, callbacks=[sampler], display_every=1000, verbose=0)
+    assert sampler.residuals.shape == (200,)
+    assert data.train_x_bc is train_x_bc
+    np.testing.assert_array_equal(data.train_x_all[:2], anchors)
+    drawn = data.train_x_all[2:]
+    assert len(drawn) == data.num_domain
+    assert np.isin(drawn, pool).all()
+    np.testing.assert_array_equal(
+        data.train_x, np.vstack((train_x_bc, data.train_x_all))
+    )
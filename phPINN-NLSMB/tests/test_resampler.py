@@ -0,0 +1,50 @@
+import deepxde as dde
+import numpy as np
+
+from nlsmb import AsyncResampler
+
+
+def _train(model, resampler, iterations):
+    model.train(
+        iterations=iterations, callbacks=[resampler], display_every=1000, verbose=0
+    )
+    if isinstance(resampler, AsyncResampler):
+        # Wait for the set prepared after the last resample
+        resampler._next.result()
+
+
+def test_matches_pde_point_resampler(poisson_model):
+    sets = []
+    for resampler in [dde.callbacks.PDEPointResampler(2), AsyncResampler(2)]:
+        model = poisson_model()
+        model.compile("adam", lr=1e-3)
+        _train(model, resampler, 3)
+        sets.append((model.data.train_x, model.data.train_x_bc))
+    for a, b in zip(*sets):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_redraws_when_the_anchors_change(poisson_model, monkeypatch):
+    draws = []
+    draw = AsyncResampler._draw
+
+    def counted(data, transform):
+        draws.append(None if data.anchors is None else len(data.anchors))
+        return draw(data, transform)
+
+    monkeypatch.setattr(AsyncResampler, "_draw", staticmethod(counted))
+    model = poisson_model()
+    model.compile("adam", lr=1e-3)
+    resampler = AsyncResampler(2)
+    _train(model, resampler, 2)
+    assert draws == [None, None]
+    # The prepared set is reused while the anchors are the same
+    _train(model, resampler, 2)
+    assert draws == [None, None, None]
+
+    anchors = np.array([[0.123], [0.456]], dtype=np.float32)
+    model.data.add_anchors(anchors)
+    _train(model, resampler, 2)
+    assert draws == [None, None, None, 2, 2]
+    np.testing.assert_array_equal(model.data.train_x_all[:2], anchors)
+    assert len(model.data.train_x_all) == 64 + 2 + 2
@@ -0,0 +1,38 @@
+import deepxde as dde
+
+from nlsmb import RunCache
+from nlsmb import run_cache
+
+
+def _key(tmp_path, **kwargs):
+    script = tmp_path / "script.py"
+    if not script.exists():
+        script.write_text("iterations = 100\nuse_cache = True\n")
+    return RunCache("case", [str(script)], seed=0, cache_dir=tmp_path, **kwargs).key
+
+
+def test_key_depends_on_the_code(tmp_path, monkeypatch):
+    key = _key(tmp_path)
+    assert _key(tmp_path) == key
+    (tmp_path / "script.py").write_text("iterations = 100\nuse_cache = False\n")
+    assert _key(tmp_path) == key
+    monkeypatch.setattr(run_cache, "_package_digest", lambda: "changed")
+    assert _key(tmp_path) != key
+    monkeypatch.undo()
+    monkeypatch.setattr(dde, "__version__", "0.0.0")
+    assert _key(tmp_path) != key
+    monkeypatch.undo()
+    (tmp_path / "script.py").write_text("iterations = 200\nuse_cache = True\n")
+    assert _key(tmp_path) != key
+
+
+def test_package_digest_covers_the_sources(tmp_path, monkeypatch):
+    key = _key(tmp_path)
+    source = tmp_path / "nlsmb"
+    source.mkdir()
+    (source / "networks.py").write_text("width = 64\n")
+    monkeypatch.setattr(run_cache, "__file__", str(source / "run_cache.py"))
+    first = _key(tmp_path)
+    assert first != key
+    (source / "networks.py").write_text("width = 128\n")
+    assert _key(tmp_path) != first
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import deepxde as dde
+import numpy as np
+import pytest
+from deepxde.callbacks import Callback
+
+from nlsmb import AdamLBFGS, Plateau
+
+
+def _plateau(**kwargs):
+    plateau = Plateau(**kwargs)
+    plateau.model = SimpleNamespace(
+        train_state=SimpleNamespace(step=0, loss_train=None), stop_training=False
+    )
+    plateau.on_train_begin()
+    return plateau
+
+
+def _evaluate(plateau, step, loss):
+    ts = plateau.model.train_state
+    ts.step = step
+    ts.loss_train = np.array([loss])
+    plateau.on_epoch_end()
+    return plateau.model.stop_training
+
+
+def test_plateau_stops_after_patience():
+    plateau = _plateau(patience=30, tol=1e-2, smoothing=0)
+    for step in range(10, 100, 10):
+        assert not _evaluate(plateau, step, 1 / step)
+    # The loss stays flat from step 100, but the window still reaches back to
+    # progress until step 130
+    for step in range(100, 130, 10):
+        assert not _evaluate(plateau, step, 0.01)
+    assert _evaluate(plateau, 130, 0.01)
+    assert plateau.stopped_step == 130
+
+
+def test_plateau_min_steps_and_repeated_losses():
+    plateau = _plateau(patience=10, min_steps=50, smoothing=0)
+    for step in range(10, 50, 10):
+        assert not _evaluate(plateau, step, 1.0)
+    # An epoch without a new evaluation keeps the same loss_train array
+    plateau.model.train_state.step = 60
+    plateau.on_epoch_end()
+    assert plateau.records[-1][0] == 40
+    assert _evaluate(plateau, 60, 1.0)
+
+
+def test_plateau_stops_on_nan():
+    plateau = _plateau(patience=1000)
+    assert _evaluate(plateau, 10, np.nan)
+    assert plateau.stopped_step == 10
+
+
+class _Options(Callback):
+    """Records the L-BFGS iterations per epoch during training."""
+
+    def on_train_begin(self):
+        self.iter_per_step = dde.optimizers.LBFGS_options["iter_per_step"]
+
+
+@pytest.fixture
+def lbfgs_options():
+    options = dde.optimizers.LBFGS_options
+    saved = dict(options)
+    dde.optimizers.config.set_LBFGS_options(maxiter=30)
+    yield options
+    options.update(saved)
+
+
+def test_adam_lbfgs(poisson_model, lbfgs_options):
+    model = poisson_model()
+    switch = AdamLBFGS(model, max_adam=20, min_adam=5, patience=5, check_every=10)
+    record = _Options()
+    switch.train(display_every=5, lbfgs_callbacks=[record])
+    assert 5 <= switch.summary["adam_steps"] < 20
+    assert switch.summary["lbfgs_steps"] > 0
+    assert record.iter_per_step == 10
+    assert lbfgs_options["iter_per_step"] == 1000
+    assert lbfgs_options["fun_per_step"] == 1250
+
+
+class _Fail(Callback):
+    def on_train_begin(self):
+        raise RuntimeError("stop")
+
+
+def test_adam_lbfgs_restores_the_options_on_errors(poisson_model, lbfgs_options):
+    switch = AdamLBFGS(poisson_model(), max_adam=5, min_adam=0, check_every=10)
+    with pytest.raises(RuntimeError):
+        switch.train(display_every=5, lbfgs_callbacks=[_Fail()])
+    assert lbfgs_options["iter_per_step"] == 1000
+    assert lbfgs_options["fun_per_step"] == 1250
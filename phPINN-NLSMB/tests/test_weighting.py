@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from deepxde.callbacks import Callback, PDEPointResampler
+
+from nlsmb import AdaptiveWeights, compare_weightings
+
+GRADS = [np.array([3.0, 4.0]), np.array([0.0, 1.0]), np.array([-2.0, 0.5])]
+
+
+def _update(strategy, weights=(1.0, 1.0, 1.0), num_pde=1):
+    adaptive = AdaptiveWeights(strategy, alpha=0, num_pde=num_pde)
+    adaptive.model = SimpleNamespace(train_state=SimpleNamespace(step=7))
+    adaptive.weights = np.array(weights)
+    adaptive._gradients = lambda loss_fn: GRADS
+    adaptive.update()
+    assert adaptive.model.loss_weights == adaptive.weights.tolist()
+    assert adaptive.history[-1][0] == 7
+    return adaptive.weights
+
+
+def test_grad_norm():
+    weights = _update("grad_norm")
+    norms = np.array([np.linalg.norm(g) for g in GRADS])
+    np.testing.assert_allclose(weights * norms, norms.mean())
+
+
+def test_annealing():
+    weights = _update("annealing", weights=(2.0, 1.0, 1.0))
+    # The PDE term keeps its weight; max |2 * (3, 4)| = 8
+    np.testing.assert_allclose(weights, [2, 8 / 0.5, 8 / 1.25])
+    weights = _update("annealing", weights=(1.0, 3.0, 1.0), num_pde=2)
+    # max |(3, 4) + 3 * (0, 1)| = 7
+    np.testing.assert_allclose(weights, [1, 3, 7 / 1.25])
+
+
+def test_ntk():
+    weights = _update("ntk")
+    traces = np.array([25, 1, 4.25])
+    np.testing.assert_allclose(weights, traces.sum() / traces)
+
+
+def test_smoothing():
+    adaptive = AdaptiveWeights("grad_norm", alpha=0.5, num_pde=1)
+    adaptive.model = SimpleNamespace(train_state=SimpleNamespace(step=0))
+    adaptive.weights = np.ones(3)
+    adaptive._gradients = lambda loss_fn: GRADS
+    adaptive.update()
+    norms = np.array([np.linalg.norm(g) for g in GRADS])
+    np.testing.assert_allclose(adaptive.weights, 0.5 + 0.5 * norms.mean() / norms)
+
+
+@pytest.mark.parametrize("strategy", ["grad_norm", "annealing", "ntk"])
+def test_trains(poisson_model, strategy):
+    model = poisson_model()
+    model.compile("adam", lr=1e-3, loss_weights=[1, 100])
+    adaptive = AdaptiveWeights(strategy, period=2, num_pde=1)
+    model.train(iterations=4, callbacks=[adaptive], verbose=0)
+    assert [step for step, _ in adaptive.history] == [0, 2, 4]
+    assert model.loss_weights == adaptive.weights.tolist()
+    assert np.all(np.isfinite(adaptive.weights))
+
+
+class _Record(Callback):
+    """Records the training points and a random draw when training begins."""
+
+    runs = []
+
+    def on_train_begin(self):
+        self.runs.append((self, self.model.data.train_x_all.copy(), np.random.rand()))
+
+
+def test_compare_weightings_isolates_the_runs(poisson_model):
+    model = poisson_model()
+    _Record.runs = []
+    results = compare_weightings(
+        model,
+        0,
+        3,
+        [1, 100],
+        num_pde=1,
+        display_every=1,
+        callbacks=lambda: [PDEPointResampler(period=1), _Record()],
+    )
+    assert list(results) == ["fixed", "grad_norm", "annealing", "ntk"]
+    assert all(r.step is None for r in results.values())
+    records, points, draws = zip(*_Record.runs)
+    assert len(set(map(id, records))) == 4
+    for X in points[1:]:
+        np.testing.assert_array_equal(X, points[0])
+    assert len(set(draws)) == 1